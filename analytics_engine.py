@@ -0,0 +1,163 @@
+"""
+Single-pass analytics for the /analytics page.
+
+`analyze` loads the selected window (plus the equally long window before
+it, for the period comparison) from daily_rollups with one query, turns the
+rows into NumPy arrays (amount, type, category code, day index) and computes
+the daily trends, category breakdown, weekday totals, period comparison and
+health score from them in one go. Only the top income/expenses need
+individual transactions; the rollups' per-group maxima narrow that query
+down to the few days that can hold them. The results have the same shape as
+the individual helpers in helpers.py return.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from database import db
+from helpers import per_user_cache, score_financial_health, to_day
+
+
+TOP_N = 10
+WEEKDAYS = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
+
+@per_user_cache
+def analyze(user_id, start_date, end_date):
+    """Everything /analytics renders for [start_date, end_date], both days included"""
+    first = np.datetime64(to_day(start_date), 'D')
+    days = max(int((np.datetime64(to_day(end_date), 'D') - first).astype(int)) + 1, 0)
+    period_length = (end_date - start_date).days
+
+    rows = db.execute("""
+        SELECT day, type = 'INCOME', category, total, count, min_amount, max_amount
+        FROM daily_rollups
+        WHERE user_id = ? AND day >= ? AND day <= ?
+    """, user_id, to_day(start_date - timedelta(days=period_length)), to_day(end_date), rows="tuple")
+
+    day_keys, incomes, categories, totals, counts, minimums, maximums = zip(*rows) if rows else ((),) * 7
+    day = np.asarray(day_keys, dtype='datetime64[D]')
+    offset = (day - first).astype(int)
+    income = np.asarray(incomes, dtype=bool)
+    amount = np.asarray(totals, dtype=np.float64)
+    count = np.asarray(counts, dtype=np.int64)
+    lowest = np.asarray(minimums, dtype=np.float64)
+    highest = np.asarray(maximums, dtype=np.float64)
+
+    # Rows in the selected window, and in the window of the same length before it
+    current = (offset >= 0) & (offset < days)
+    previous = (offset >= -period_length) & (offset < 0)
+    expense = current & ~income
+    earned = current & income
+
+    labels = np.arange(first, first + days, dtype='datetime64[D]').astype(str).tolist()
+    spending_trends = {
+        'labels': labels,
+        'income': np.bincount(offset[earned], weights=amount[earned], minlength=days).tolist(),
+        'expenses': np.bincount(offset[expense], weights=amount[expense], minlength=days).tolist()
+    }
+
+    # 1970-01-01 was a Thursday, so days since the epoch + 4 gives 0 for Sunday
+    weekday = (day[expense].astype(int) + 4) % 7
+    time_analysis = {
+        'weekday_labels': WEEKDAYS,
+        'weekday_data': np.bincount(weekday, weights=amount[expense], minlength=7).tolist()
+    }
+
+    current_income, current_expense = amount[earned].sum(), amount[expense].sum()
+    previous_income = amount[previous & income].sum()
+    previous_expense = amount[previous & ~income].sum()
+    comparison = {
+        'current_income': float(current_income),
+        'current_expense': float(current_expense),
+        'previous_income': float(previous_income),
+        'previous_expense': float(previous_expense),
+        'income_change': round(float((current_income - previous_income) / previous_income * 100), 1) if previous_income > 0 else 0,
+        'expense_change': round(float((current_expense - previous_expense) / previous_expense * 100), 1) if previous_expense > 0 else 0
+    }
+
+    budget = db.execute("""
+        SELECT amount FROM budgets
+        WHERE user_id = ? AND period = 'MONTHLY' AND is_active = 1
+    """, user_id)
+    health_score = score_financial_health(
+        float(current_income), float(current_expense), int(count[earned].sum()),
+        budget[0]['amount'] if budget else None, period_length
+    )
+
+    category_analysis = category_breakdown(
+        np.asarray(categories, dtype=object)[expense], amount[expense], count[expense], lowest[expense], highest[expense]
+    )
+
+    top_expenses = top_transactions(user_id, 'EXPENSE', day[expense], highest[expense])
+    top_income = top_transactions(user_id, 'INCOME', day[earned], highest[earned])
+
+    return {
+        'spending_trends': spending_trends,
+        'category_analysis': category_analysis,
+        'comparison': comparison,
+        'time_analysis': time_analysis,
+        'health_score': health_score,
+        'top_expenses': top_expenses,
+        'top_income': top_income
+    }
+
+
+def category_breakdown(categories, totals, counts, lowest, highest):
+    """Total, count, average, min, max and share of each expense category, largest first"""
+    if not len(categories):
+        return []
+
+    names, codes = np.unique(categories.astype(str), return_inverse=True)
+    sums = np.bincount(codes, weights=totals, minlength=len(names))
+    transactions = np.bincount(codes, weights=counts, minlength=len(names)).astype(np.int64)
+    minimums = np.full(len(names), np.inf)
+    maximums = np.full(len(names), -np.inf)
+    np.minimum.at(minimums, codes, lowest)
+    np.maximum.at(maximums, codes, highest)
+    spending = sums.sum()
+
+    return [{
+        'category': str(names[i]),
+        'total': float(sums[i]),
+        'transaction_count': int(transactions[i]),
+        'avg_amount': float(sums[i] / transactions[i]),
+        'max_amount': float(maximums[i]),
+        'min_amount': float(minimums[i]),
+        'percentage': float(sums[i] / spending * 100) if spending > 0 else 0
+    } for i in np.argsort(-sums, kind='stable')]
+
+
+def top_transactions(user_id, transaction_type, days, maxima):
+    """
+    The TOP_N largest transactions of one type, given the day and maximum
+    amount of each of that type's rollup groups in the window.
+
+    The TOP_N-th largest group maximum is a lower bound on every top-N amount
+    (each of those groups holds a transaction at least that large), so only
+    the days with a group reaching it need to be read.
+    """
+    if not len(days):
+        return []
+
+    floor = 0.0
+    if len(maxima) >= TOP_N:
+        floor = float(np.partition(maxima, -TOP_N)[-TOP_N])
+    candidates = np.unique(days[maxima >= floor])
+    bounds = [(str(day), str(day + 1)) for day in candidates]
+
+    values = ", ".join(["(?, ?)"] * len(bounds))
+    rows = db.execute(f"""
+        WITH candidate_days(start, stop) AS (VALUES {values})
+        SELECT name, amount, category, time
+        FROM candidate_days
+        JOIN transactions ON user_id = ? AND time >= candidate_days.start AND time < candidate_days.stop
+        WHERE type = ? AND amount >= ?
+        ORDER BY amount DESC
+        LIMIT ?
+    """, *[bound for pair in bounds for bound in pair], user_id, transaction_type, floor, TOP_N)
+
+    for row in rows:
+        row['formatted_date'] = datetime.fromisoformat(str(row['time'])).strftime('%b %d, %Y')
+    return rows
@@ -1,72 +1,107 @@
-from cs50 import SQL
+from analytics_engine import analyze
+from compression import compress_response, precompress_static, serve_precompressed
+from batch import BATCH_MAX_OPERATIONS, apply_operations
+from importer import IMPORT_FORMATS, import_format, import_transactions, read_records
+from receipts import RECEIPT_MAX_AGE, RECEIPT_SENDFILE, accel_redirect_path, collect_receipts, receipt_etag, store_receipt
+from recurring_engine import expand_recurring, forecast, monthly_recurring_totals
+from database import db
 from datetime import datetime, timedelta
-from faster_whisper import WhisperModel
-from flask import Flask, flash, redirect, render_template, request, session, send_file, abort, jsonify
+from flask import Flask, Response, flash, redirect, render_template, request, session, send_file, abort, jsonify
 from flask_session import Session
-from functools import wraps
-from io import StringIO, BytesIO
+from scheduler import scheduler_stats, start_scheduler
+from speech import SPEECH_MAX_BYTES, SPEECH_SAMPLE_RATE, SpeechRequest, decode_audio
+from transcription import ModelUnavailable, TranscriptionBusy, start_transcription_pool, transcribe, transcription_stats
+from static_assets import apply_cache_policy, static_url
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.security import check_password_hash, generate_password_hash
-from werkzeug.utils import secure_filename
+from werkzeug.serving import is_running_from_reloader
+from werkzeug.utils import secure_filename, send_file as send_file_headers
+from whisper_models import WHISPER_PRELOAD, preload_model
 
-from helpers import apg, usd, login_required, allowed_file, check_budget_warning, get_histogram_data, calculate_trends, get_spending_trends, get_category_analysis, get_period_comparison, get_time_analysis, calculate_financial_health, get_recurring_analysis, calculate_next_date, process_recurring_transactions, load_whisper_model, get_user_financial_data, create_financial_prompt
+from helpers import apg, usd, login_required, read_only, allowed_file, check_budget_warning, get_histogram_data, calculate_trends, get_recurring_analysis, calculate_next_date, get_user_financial_data, create_financial_prompt, to_day, period_bounds, get_period_spending, upgrade_schema, record_rollup, rebuild_rollups, verify_rollups, encode_cursor, decode_cursor, get_transaction_summary, rebuild_search_index, search_query, TRANSACTION_SORTS, bump_data_version, aggregate_cache, csv_chunks
 
 import calendar
-import csv
+import click
 import calendar
 import json
 import os
 import requests
-import tempfile
-import tempfile
 
 
 
-UPLOAD_FOLDER = "Database/Receipts"
 MAX_FILE_SIZE = 5 * 1024 * 1024 
 
-WHISPER_MODEL = "base" 
-USE_FASTER_WHISPER = True
+# Upcoming transactions listed per page of /recurring/preview
+PREVIEW_PER_PAGE = 50
+
+# Longest /api/forecast horizon, in months
+FORECAST_MAX_MONTHS = 24
 
 conversation_history = {}
 
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
 OLLAMA_MODEL = "qwen2.5:3b"
 
-whisper_model = None
-
 # Configure application
 app = Flask(__name__)
 
+# Speech uploads stay in memory and are size-capped (see speech.py)
+app.request_class = SpeechRequest
+
 # Custom filter
 app.jinja_env.filters["usd"] = usd
 
+# Fingerprinted static URLs: {{ static_url('styles.css') }}
+app.jinja_env.globals["static_url"] = static_url
+
 # Configure session to use filesystem (instead of signed cookies)
 app.config["SESSION_PERMANENT"] = False
 app.config["SESSION_TYPE"] = "filesystem"
 Session(app)
 
-# Configure CS50 Library to use SQLite database
-db = SQL("sqlite:///Database/finance.db")
+_initialized = False
+
+
+def init_app():
+    """
+    Set up a serving process: create the tables added since the database was
+    first set up, keep .gz copies of the static text files, fetch the Whisper
+    model files (WHISPER_PRELOAD) and start the background jobs (recurring
+    transactions, receipt GC). Importing the app does none of this, so CLI
+    commands and tests don't start the scheduler. `python app.py` calls it;
+    other servers set INIT_APP=1 or call it from a startup hook.
+    """
+    global _initialized
+    if _initialized:
+        return
+    _initialized = True
+
+    upgrade_schema()
+    precompress_static(app.static_folder)
+    if WHISPER_PRELOAD:
+        preload_model()
+    start_scheduler()
+
+
+if os.environ.get("INIT_APP") == "1":
+    init_app()
+
 
 @app.before_request
-def before_first_request():
-    """Run recurring transactions processor on app startup"""
-    if not hasattr(app, 'recurring_processed'):
-        process_recurring_transactions()
-        app.recurring_processed = True
+def before_request():
+    """Send the precompressed copy of a static file when the client accepts gzip"""
+    return serve_precompressed()
 
 
 @app.after_request
 def after_request(response):
-    """Ensure responses aren't cached"""
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Expires"] = 0
-    response.headers["Pragma"] = "no-cache"
-    return response
+    """Apply the caching policy (see static_assets.py), then gzip text responses"""
+    return compress_response(apply_cache_policy(response))
 
 
 @app.route("/")
 @login_required
+@read_only
 def index():
     """Show dashboard with optimized queries and proper error handling"""
     try:
@@ -80,13 +115,13 @@ def index():
         summary_data = db.execute("""
             SELECT 
                 type,
-                SUM(CASE WHEN time >= ? THEN amount ELSE 0 END) as weekly_total,
-                SUM(CASE WHEN time >= ? THEN amount ELSE 0 END) as monthly_total,
-                SUM(CASE WHEN time >= ? THEN amount ELSE 0 END) as yearly_total
-            FROM transactions
-            WHERE user_id = ?
+                SUM(CASE WHEN day >= ? THEN total ELSE 0 END) as weekly_total,
+                SUM(CASE WHEN day >= ? THEN total ELSE 0 END) as monthly_total,
+                SUM(CASE WHEN day >= ? THEN total ELSE 0 END) as yearly_total
+            FROM daily_rollups
+            WHERE user_id = ? AND day >= ?
             GROUP BY type
-        """, week_ago, month_ago, year_ago, user_id)
+        """, to_day(week_ago), to_day(month_ago), to_day(year_ago), user_id, to_day(year_ago))
         
         weekly_income = weekly_expense = 0
         monthly_income = monthly_expense = 0
@@ -121,8 +156,8 @@ def index():
         category_colors = {cat['name']: cat['color'] for cat in categories}
 
         income_by_category = db.execute("""
-            SELECT category, SUM(amount) as total
-            FROM transactions
+            SELECT category, SUM(total) as total
+            FROM daily_rollups
             WHERE user_id = ? AND type = 'INCOME'
             GROUP BY category
             ORDER BY total DESC
@@ -133,8 +168,8 @@ def index():
         income_colors = [category_colors.get(row['category'], '#28a745') for row in income_by_category]
         
         expense_by_category = db.execute("""
-            SELECT category, SUM(amount) as total
-            FROM transactions
+            SELECT category, SUM(total) as total
+            FROM daily_rollups
             WHERE user_id = ? AND type = 'EXPENSE'
             GROUP BY category
             ORDER BY total DESC
@@ -295,84 +330,75 @@ def add_transaction():
         if 'receipt' in request.files:
             file = request.files['receipt']
             if file and file.filename and allowed_file(file.filename):
-                file.seek(0, os.SEEK_END)
-                file_size = file.tell()
-                file.seek(0)
-                
-                if file_size > MAX_FILE_SIZE:
-                    flash("File size must be less than 5MB", "error")
+                # Streamed to disk and stored under its content hash, shared with identical uploads
+                try:
+                    receipt_path = store_receipt(file.stream, secure_filename(file.filename), MAX_FILE_SIZE)
+                except ValueError as e:
+                    flash(str(e), "error")
                     return render_template("add-transaction.html", categories=categories)
-                
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = secure_filename(file.filename)
-                unique_filename = f"{user_id}_{timestamp}_{filename}"
-                
-                os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-                
-                filepath = os.path.join(UPLOAD_FOLDER, unique_filename)
-                file.save(filepath)
-                
-                receipt_path = filepath
 
                 
         try:
-            if is_recurring:
-                today = datetime.now().date()
+            with db.transaction():
+                if is_recurring:
+                    today = datetime.now().date()
                 
-                recurring_id = db.execute("""INSERT INTO recurring_transactions 
-                    (user_id, name, amount, type, category, frequency, start_date, end_date, next_occurrence, notes)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", 
-                    user_id, 
-                    name, 
-                    amount, 
-                    transaction_type, 
-                    category, 
-                    recurring_frequency,
-                    today,  
-                    recurring_end_date if recurring_end_date else None,
-                    today, 
-                    notes)
+                    recurring_id = db.execute("""INSERT INTO recurring_transactions 
+                        (user_id, name, amount, type, category, frequency, start_date, end_date, next_occurrence, notes)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", 
+                        user_id, 
+                        name, 
+                        amount, 
+                        transaction_type, 
+                        category, 
+                        recurring_frequency,
+                        today,  
+                        recurring_end_date if recurring_end_date else None,
+                        today, 
+                        notes)
                 
-                db.execute("""INSERT INTO transactions 
-                    (user_id, name, amount, type, category, notes, receipt_path, is_recurring, recurring_template_id, time)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", 
-                    user_id, 
-                    name, 
-                    amount, 
-                    transaction_type, 
-                    category, 
-                    notes, 
-                    receipt_path,
-                    1,
-                    recurring_id,
-                    today)
+                    db.execute("""INSERT INTO transactions 
+                        (user_id, name, amount, type, category, notes, receipt_path, is_recurring, recurring_template_id, time)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", 
+                        user_id, 
+                        name, 
+                        amount, 
+                        transaction_type, 
+                        category, 
+                        notes, 
+                        receipt_path,
+                        1,
+                        recurring_id,
+                        today)
+                    record_rollup(user_id, today, transaction_type, category, amount)
                 
-                next_date = calculate_next_date(today, recurring_frequency)
-                db.execute("""
-                    UPDATE recurring_transactions
-                    SET next_occurrence = ?
-                    WHERE id = ?
-                """, next_date, recurring_id)
+                    next_date = calculate_next_date(today, recurring_frequency)
+                    db.execute("""
+                        UPDATE recurring_transactions
+                        SET next_occurrence = ?
+                        WHERE id = ?
+                    """, next_date, recurring_id)
                 
-                flash(f"Recurring {transaction_type.lower()} added successfully!", "success")
-            else:
-                db.execute("""
-                    INSERT INTO transactions 
-                    (user_id, name, amount, type, category, notes, receipt_path, is_recurring, time)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, 
-                    user_id, 
-                    name, 
-                    amount, 
-                    transaction_type, 
-                    category, 
-                    notes, 
-                    receipt_path,
-                    0,
-                    transaction_date
-                )
-
-                flash(f"{transaction_type.capitalize()} added successfully!", "success")
+                    flash(f"Recurring {transaction_type.lower()} added successfully!", "success")
+                else:
+                    db.execute("""
+                        INSERT INTO transactions 
+                        (user_id, name, amount, type, category, notes, receipt_path, is_recurring, time)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, 
+                        user_id, 
+                        name, 
+                        amount, 
+                        transaction_type, 
+                        category, 
+                        notes, 
+                        receipt_path,
+                        0,
+                        transaction_date
+                    )
+                    record_rollup(user_id, transaction_date, transaction_type, category, amount)
+
+                    flash(f"{transaction_type.capitalize()} added successfully!", "success")
             
             if transaction_type == "EXPENSE":
                 check_budget_warning(user_id, amount)
@@ -380,10 +406,7 @@ def add_transaction():
             return redirect("/")
             
         except Exception as e:
-            # Clean up uploaded file if database insert fails
-            if receipt_path and os.path.exists(receipt_path):
-                os.remove(receipt_path)
-            
+            # An uploaded receipt left unreferenced is removed by collect_receipts
             flash(f"Error adding transaction: {str(e)}", "error")
             return render_template("add-transaction.html", categories=categories)
     
@@ -391,6 +414,8 @@ def add_transaction():
     return render_template("add-transaction.html", categories=categories)
 
 @app.route("/analytics")
+@login_required
+@read_only
 def analytics():
     """Detailed analytics and insights"""
     user_id = session["user_id"]
@@ -399,53 +424,25 @@ def analytics():
     end_date_str = request.args.get('end_date', '')
     
     if not start_date_str or not end_date_str:
-        end_date = datetime.now()
+        # Whole days, so the cached aggregates are reused for the rest of the day
+        end_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
         start_date = end_date - timedelta(days=90)
     else:
         start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
         end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
     
-    spending_trends = get_spending_trends(user_id, start_date, end_date)
-    
-    category_analysis = get_category_analysis(user_id, start_date, end_date)
-    
-    comparison = get_period_comparison(user_id, start_date, end_date)
-    
-    time_analysis = get_time_analysis(user_id, start_date, end_date)
-    
-    health_score = calculate_financial_health(user_id, start_date, end_date)
-    
-    top_expenses = db.execute("""
-        SELECT name, amount, category, time
-        FROM transactions
-        WHERE user_id = ? AND type = 'EXPENSE'
-        AND time >= ? AND time <= ?
-        ORDER BY amount DESC
-        LIMIT 10
-    """, user_id, start_date, end_date)
-    
-    top_income = db.execute("""
-        SELECT name, amount, category, time
-        FROM transactions
-        WHERE user_id = ? AND type = 'INCOME'
-        AND time >= ? AND time <= ?
-        ORDER BY amount DESC
-        LIMIT 10
-    """, user_id, start_date, end_date)
-    
-    for t in top_expenses + top_income:
-        t['formatted_date'] = datetime.fromisoformat(str(t['time'])).strftime('%b %d, %Y')
+    report = analyze(user_id, start_date, end_date)
     
     recurring_stats = get_recurring_analysis(user_id)
     
     return render_template("analytics.html",
-        spending_trends=json.dumps(spending_trends),
-        category_analysis=category_analysis,
-        comparison=comparison,
-        time_analysis=json.dumps(time_analysis),
-        health_score=health_score,
-        top_expenses=top_expenses,
-        top_income=top_income,
+        spending_trends=json.dumps(report['spending_trends']),
+        category_analysis=report['category_analysis'],
+        comparison=report['comparison'],
+        time_analysis=json.dumps(report['time_analysis']),
+        health_score=report['health_score'],
+        top_expenses=report['top_expenses'],
+        top_income=report['top_income'],
         recurring_stats=recurring_stats,
         start_date=start_date.strftime('%Y-%m-%d'),
         end_date=end_date.strftime('%Y-%m-%d')
@@ -460,52 +457,68 @@ def export_csv():
     start_date = request.args.get('start_date', '')
     end_date = request.args.get('end_date', '')
     
-    transactions = db.execute("""
-        SELECT name, amount, type, category, time, notes
+    # Streamed in batches straight from the cursor, so memory use doesn't grow with the export
+    batches = db.stream("""
+        SELECT time, name, type, category, amount, COALESCE(notes, '')
         FROM transactions
         WHERE user_id = ?
         AND time >= ? AND time <= ?
         ORDER BY time DESC
     """, user_id, start_date, end_date)
+    chunks = csv_chunks(['Date', 'Name', 'Type', 'Category', 'Amount', 'Notes'], batches)
     
-    # Create CSV
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Date', 'Name', 'Type', 'Category', 'Amount', 'Notes'])
-    
-    for t in transactions:
-        writer.writerow([
-            t['time'],
-            t['name'],
-            t['type'],
-            t['category'],
-            t['amount'],
-            t['notes'] or ''
-        ])
-    
-    output.seek(0)
-    return send_file(
-        BytesIO(output.getvalue().encode()),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'transactions_{start_date}_to_{end_date}.csv'
-    )
+    # Gzipped on the fly by compress_response for clients that accept it
+    headers = {
+        'Content-Disposition': f'attachment; filename="{secure_filename(f"transactions_{start_date}_to_{end_date}.csv")}"'
+    }
+    return Response(chunks, mimetype='text/csv', headers=headers)
+
+@app.route('/api/transactions/import', methods=['POST'])
+@login_required
+def import_transactions_upload():
+    """Bulk import transactions from an uploaded CSV (export columns) or NDJSON file"""
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'error': 'No file provided'}), 400
+    
+    file_format = import_format(upload.filename, request.form.get('format') or request.args.get('format'))
+    if file_format not in IMPORT_FORMATS:
+        return jsonify({'error': f'Unsupported format, use one of: {", ".join(IMPORT_FORMATS)}'}), 400
+    
+    try:
+        result = import_transactions(session["user_id"], read_records(upload.stream, file_format))
+    except Exception as e:
+        print(f"Import error: {e}")
+        return jsonify({'error': 'Import failed, nothing was imported'}), 500
+    
+    return jsonify(result)
+
+@app.route('/api/transactions/batch', methods=['POST'])
+@login_required
+def transactions_batch():
+    """Apply a list of create/update/delete operations in one database transaction"""
+    data = request.get_json(silent=True)
+    if isinstance(data, list):
+        data = {'operations': data}
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'Expected a non-empty list of operations'}), 400
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({'error': f'At most {BATCH_MAX_OPERATIONS} operations per batch'}), 400
+    
+    try:
+        result = apply_operations(session["user_id"], operations, atomic=bool(data.get('atomic')))
+    except Exception as e:
+        print(f"Batch error: {e}")
+        return jsonify({'error': 'Batch failed, nothing was changed'}), 500
+    
+    return jsonify(result), 200 if result['committed'] else 422
 
 @app.route('/api/speech-to-text', methods=['POST'])
 @login_required
 def speech_to_text():
     """Convert speech audio to text using Whisper"""
     try:
-        from helpers import whisper_model as loaded_model
-        
-        if loaded_model is None:
-            print("Whisper model is None!")
-            return jsonify({
-                'error': 'Speech recognition not available',
-                'message': 'Whisper model not loaded. Please restart the server.'
-            }), 503
-
-        
         if 'audio' not in request.files:
             return jsonify({'error': 'No audio file provided'}), 400
         
@@ -516,45 +529,49 @@ def speech_to_text():
         
         print(f"Received audio file: {audio_file.filename}")
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.webm') as temp_audio:
-            audio_file.save(temp_audio.name)
-            temp_path = temp_audio.name
+        # Decoded in memory (see speech.py), no temporary file
+        try:
+            audio, damaged = decode_audio(audio_file.stream)
+        except ValueError as e:
+            return jsonify({'error': 'Invalid audio', 'message': str(e)}), 400
         
-        print(f"Saved to: {temp_path}")
+        print(f"Decoded {len(audio) / SPEECH_SAMPLE_RATE:.1f}s of audio{' (damaged parts skipped)' if damaged else ''}, queued for transcription...")
         
+        # Runs in the transcription worker pool; refused at once when the queue is full
         try:
-            print("Starting transcription...")
-            
-            segments, info = loaded_model.transcribe(  # Use loaded_model instead
-                temp_path,
-                language="en",
-                beam_size=5,
-                vad_filter=True,
-                vad_parameters=dict(min_silence_duration_ms=500)
-            )
-            
-            transcription = " ".join([segment.text for segment in segments]).strip()
-            
-            os.unlink(temp_path)
-            
-            print(f"Transcription: '{transcription}'")
-            
-            if not transcription:
-                return jsonify({
-                    'error': 'No speech detected',
-                    'message': 'Could not detect any speech. Please try again.'
-                }), 400
-            
+            transcription = transcribe(session["user_id"], audio)
+        except TranscriptionBusy as e:
+            response = jsonify({'error': 'Speech recognition busy', 'message': str(e)})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 503
+        except ModelUnavailable:
             return jsonify({
-                'transcription': transcription,
-                'success': True
-            })
-            
-        except Exception as e:
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-            raise e
-            
+                'error': 'Speech recognition not available',
+                'message': 'Whisper model not loaded.'
+            }), 503
+        
+        print(f"Transcription: '{transcription}'")
+        
+        if not transcription:
+            return jsonify({
+                'error': 'No speech detected',
+                'message': 'Could not detect any speech. Please try again.'
+            }), 400
+        
+        result = {
+            'transcription': transcription,
+            'success': True
+        }
+        if damaged:
+            # Part of the recording is missing from the transcription
+            result['warning'] = 'Part of the recording could not be decoded, so the transcription may be incomplete.'
+        return jsonify(result)
+        
+    except RequestEntityTooLarge:
+        return jsonify({
+            'error': 'Audio file too large',
+            'message': f'Recordings can be at most {SPEECH_MAX_BYTES // (1024 * 1024)}MB.'
+        }), 413
     except Exception as e:
         print(f"Speech-to-text error: {e}")
         import traceback
@@ -645,6 +662,38 @@ def ai_chat():
             'response': 'Sorry, something went wrong. Please try again.'
         }), 500
 
+@app.route('/api/cache-stats')
+@login_required
+def cache_stats():
+    """Hit/miss counters of this process's aggregate cache"""
+    return jsonify(aggregate_cache.stats())
+
+@app.route('/api/forecast')
+@login_required
+@read_only
+def api_forecast():
+    """Projected day-by-day balance for the next N months (?months=3, ?discretionary=1)"""
+    months = min(max(request.args.get('months', 3, type=int), 1), FORECAST_MAX_MONTHS)
+    discretionary = request.args.get('discretionary', '0').lower() in ('1', 'true', 'yes')
+    
+    try:
+        return jsonify(forecast(session["user_id"], months, discretionary))
+    except Exception as e:
+        print(f"Forecast error: {e}")
+        return jsonify({'error': 'Could not build the forecast'}), 500
+
+@app.route('/api/scheduler-stats')
+@login_required
+def recurring_scheduler_stats():
+    """Timing metrics of this process's recurring transactions job"""
+    return jsonify(scheduler_stats())
+
+@app.route('/api/transcription-stats')
+@login_required
+def transcription_pool_stats():
+    """Queue depth and latency metrics of this process's transcription pool"""
+    return jsonify(transcription_stats())
+
 @app.route("/budget/get", methods=["GET"])
 @login_required
 def get_budget():
@@ -725,6 +774,8 @@ def save_budget():
                     VALUES (?, ?, ?, 1)
                 """, user_id, category, float(limit))
         
+        bump_data_version(user_id)
+        
         return json.dumps({'success': True, 'message': 'Budget saved successfully'})
 
         
@@ -750,15 +801,9 @@ def budget_status():
     budget_amount = float(budget[0]['amount'])
     start_date = budget[0]['start_date']
     
-    today = datetime.now()
-    month_start = today.replace(day=1)
+    month_start, month_end = period_bounds('MONTHLY')
     
-    monthly_expense = db.execute("""
-        SELECT COALESCE(SUM(amount), 0) as total
-        FROM transactions
-        WHERE user_id = ? AND type = 'EXPENSE'
-        AND time >= ?
-    """, user_id, month_start)[0]['total']
+    monthly_expense = get_period_spending(user_id, 'MONTHLY', (month_start, month_end))
     
     spent = float(monthly_expense)
     remaining = budget_amount - spent
@@ -771,13 +816,13 @@ def budget_status():
     """, user_id)
     
     category_spending = db.execute("""
-        SELECT category, SUM(amount) as total
-        FROM transactions
+        SELECT category, SUM(total) as total
+        FROM daily_rollups
         WHERE user_id = ? AND type = 'EXPENSE'
-        AND time >= ?
+        AND day >= ? AND day < ?
         GROUP BY category
         ORDER BY total DESC
-    """, user_id, month_start)
+    """, user_id, to_day(month_start), to_day(month_end))
     
     limits_map = {cat['category']: float(cat['limit_amount']) for cat in category_limits}
     
@@ -825,6 +870,8 @@ def delete_budget():
             WHERE user_id = ? AND is_active = 1
         """, user_id)
         
+        bump_data_version(user_id)
+        
         return json.dumps({'success': True, 'message': 'Budget removed successfully'})
         
     except Exception as e:
@@ -1006,11 +1053,13 @@ def delete_category_form(category_id):
                 VALUES ('Other', ?, '#6c757d')
             """, category_type)
         
-        db.execute("""
-            UPDATE transactions 
-            SET category = 'Other' 
-            WHERE user_id = ? AND category = ?
-        """, user_id, category_name)
+        with db.transaction():
+            db.execute("""
+                UPDATE transactions 
+                SET category = 'Other' 
+                WHERE user_id = ? AND category = ?
+            """, user_id, category_name)
+            rebuild_rollups(user_id)
         
         db.execute("DELETE FROM categories WHERE id = ?", category_id)
         
@@ -1087,7 +1136,33 @@ def view_receipt(transaction_id):
     if not os.path.exists(receipt_path):
         abort(404)
     
-    return send_file(receipt_path)
+    # Stored paths are relative to the working directory, not the app's root
+    receipt_file = os.path.abspath(receipt_path)
+    
+    # Strong ETag from the content hash: answers If-None-Match with a 304 and Range with a 206
+    if RECEIPT_SENDFILE:
+        # Just the headers and an empty body, X-Sendfile on this response
+        # only (the app's other files are sent as usual); the proxy sends the
+        # file and handles ranges itself
+        response = send_file_headers(receipt_file, request.environ, etag=receipt_etag(receipt_path),
+                                     conditional=False, max_age=RECEIPT_MAX_AGE, use_x_sendfile=True,
+                                     response_class=app.response_class)
+    else:
+        response = send_file(receipt_file, etag=receipt_etag(receipt_path), max_age=RECEIPT_MAX_AGE)
+    response.cache_control.public = None
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    
+    if RECEIPT_SENDFILE:
+        # A 304 leaves the proxy nothing to send
+        response = response.make_conditional(request)
+        target = response.headers.pop("X-Sendfile")
+        if response.status_code == 200:
+            if RECEIPT_SENDFILE == "x-accel-redirect":
+                response.headers["X-Accel-Redirect"] = accel_redirect_path(receipt_path)
+            else:
+                response.headers["X-Sendfile"] = target
+    return response
 
 @app.route("/recurring")
 @login_required
@@ -1186,6 +1261,7 @@ def toggle_recurring(recurring_id):
         "UPDATE recurring_transactions SET is_active = ? WHERE id = ?",
         new_status, recurring_id
     )
+    bump_data_version(user_id)
     
     status_text = "activated" if new_status == 1 else "paused"
     flash(f"Recurring transaction {status_text} successfully", "success")
@@ -1208,6 +1284,7 @@ def delete_recurring(recurring_id):
         return redirect("/recurring")
     
     db.execute("DELETE FROM recurring_transactions WHERE id = ?", recurring_id)
+    bump_data_version(user_id)
     
     flash("Recurring transaction deleted successfully", "success")
     return redirect("/recurring")
@@ -1261,6 +1338,7 @@ def edit_recurring(recurring_id):
             WHERE id = ?
         """, name, amount, category, frequency, 
             end_date if end_date else None, notes, recurring_id)
+        bump_data_version(user_id)
         
         flash("Recurring transaction updated successfully", "success")
         return redirect("/recurring")
@@ -1288,50 +1366,39 @@ def preview_recurring():
         WHERE user_id = ? AND is_active = 1
     """, user_id)
     
-    # Generate preview for next N months
-    preview = []
+    # Every occurrence over the next N months, as arrays
     today = datetime.now().date()
     end_preview = today + timedelta(days=months * 30)
+    index, dates = expand_recurring(recurring_list, end_preview)
+    monthly_totals = monthly_recurring_totals(recurring_list, index, dates)
     
-    for rt in recurring_list:
-        current_date = datetime.fromisoformat(str(rt['next_occurrence'])).date()
-        end_date = datetime.fromisoformat(str(rt['end_date'])).date() if rt['end_date'] else None
-        
-        while current_date <= end_preview:
-            if end_date and current_date > end_date:
-                break
-            
-            preview.append({
-                'name': rt['name'],
-                'amount': float(rt['amount']),
-                'type': rt['type'],
-                'category': rt['category'],
-                'date': current_date,
-                'formatted_date': current_date.strftime('%b %d, %Y')
-            })
-            
-            # Calculate next occurrence - FIXED
-            current_date = calculate_next_date(current_date, rt['frequency'])
+    # Only build rows for the page being shown
+    total_pages = max((len(dates) + PREVIEW_PER_PAGE - 1) // PREVIEW_PER_PAGE, 1)
+    page = min(max(request.args.get('page', 1, type=int), 1), total_pages)
+    shown = slice((page - 1) * PREVIEW_PER_PAGE, page * PREVIEW_PER_PAGE)
     
-    # Sort by date
-    preview.sort(key=lambda x: x['date'])
-    
-    # Calculate monthly totals
-    monthly_totals = {}
-    for item in preview:
-        month_key = item['date'].strftime('%Y-%m')
-        if month_key not in monthly_totals:
-            monthly_totals[month_key] = {'income': 0, 'expense': 0}
-        
-        if item['type'] == 'INCOME':
-            monthly_totals[month_key]['income'] += item['amount']
-        else:
-            monthly_totals[month_key]['expense'] += item['amount']
+    preview = []
+    for i, day in zip(index[shown].tolist(), dates[shown].tolist()):
+        rt = recurring_list[i]
+        preview.append({
+            'name': rt['name'],
+            'amount': float(rt['amount']),
+            'type': rt['type'],
+            'category': rt['category'],
+            'date': day,
+            'formatted_date': day.strftime('%b %d, %Y')
+        })
     
     return render_template("recurring_preview.html",
         preview=preview,
         monthly_totals=monthly_totals,
-        months=months
+        months=months,
+        pagination={
+            'current': page,
+            'total': total_pages,
+            'total_items': len(dates),
+            'per_page': PREVIEW_PER_PAGE
+        }
     )
 
 
@@ -1358,6 +1425,7 @@ def register():
 
 @app.route("/statistics")
 @login_required
+@read_only
 def statistics():
     """Interactive statistics and visualizations"""
     user_id = session["user_id"]
@@ -1421,8 +1489,8 @@ def statistics():
         else:
             # Get earliest transaction year
             earliest = db.execute("""
-                SELECT MIN(time) as first_transaction 
-                FROM transactions 
+                SELECT MIN(day) as first_transaction 
+                FROM daily_rollups 
                 WHERE user_id = ?
             """, user_id)
             if earliest and earliest[0]['first_transaction']:
@@ -1439,16 +1507,16 @@ def statistics():
     
 
     income_by_category = db.execute("""
-        SELECT category, SUM(amount) as total
-        FROM transactions
+        SELECT category, SUM(total) as total
+        FROM daily_rollups
         WHERE user_id = ? AND type = 'INCOME'
         GROUP BY category
         ORDER BY total DESC
     """, user_id)
     
     expense_by_category = db.execute("""
-        SELECT category, SUM(amount) as total
-        FROM transactions
+        SELECT category, SUM(total) as total
+        FROM daily_rollups
         WHERE user_id = ? AND type = 'EXPENSE'
         GROUP BY category
         ORDER BY total DESC
@@ -1485,15 +1553,15 @@ def statistics():
 
 @app.route("/transactions")
 @login_required
+@read_only
 def transactions():
     """Show all transactions"""
     user_id = session["user_id"]
     transaction_type = request.args.get('type', 'all') 
     category = request.args.get('category', 'all')
     date_range = request.args.get('range', '90')
-    sort_by = request.args.get('sort', 'date-desc') 
+    sort_by = request.args.get('sort', '') 
     search = request.args.get('search', '')
-    page = int(request.args.get('page', 1))
     per_page = request.args.get("tppage", 20)
     
     where_clauses = ["user_id = ?"]
@@ -1509,42 +1577,71 @@ def transactions():
 
     if date_range != 'all':
         days = int(date_range)
-        date_limit = datetime.now() - timedelta(days=days)
+        date_limit = to_day(datetime.now() - timedelta(days=days))
         where_clauses.append("time >= ?")
         params.append(date_limit)
     
-    if search:
-        where_clauses.append("(name LIKE ? OR notes LIKE ?)")
-        search_term = f"%{search}%"
-        params.extend([search_term, search_term])
+    match = search_query(search)
+    if match:
+        # The unary + keeps SQLite from walking the user's whole index and
+        # probing the matches; the matched rowids drive the lookup instead
+        where_clauses[0] = "+user_id = ?"
+        where_clauses.append("id IN (SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?)")
+        params.append(match)
     
     where_clause = " AND ".join(where_clauses)
     
-    if sort_by == 'date-desc':
-        order_by = "time DESC"
-    elif sort_by == 'date-asc':
-        order_by = "time ASC"
-    elif sort_by == 'amount-desc':
-        order_by = "amount DESC"
-    elif sort_by == 'amount-asc':
-        order_by = "amount ASC"
+    if sort_by not in TRANSACTION_SORTS or (sort_by == 'relevance' and not match):
+        sort_by = 'relevance' if match else 'date-desc'
+    sort_column, sort_order = TRANSACTION_SORTS[sort_by]
+    descending = sort_order == 'DESC'
+    
+    summary = get_transaction_summary(user_id, where_clause, params)
+    total_transactions = summary['count']
+    total_pages = max((total_transactions + int(per_page) - 1) // int(per_page), 1)
+    
+    # Ranked search joins the matches (with their bm25 rank) instead of filtering on them
+    from_clause = "transactions"
+    if sort_by == 'relevance':
+        from_clause = """transactions JOIN (
+            SELECT rowid as match_id, rank as relevance FROM transactions_fts WHERE transactions_fts MATCH ?
+        ) ON match_id = id"""
+        where_clause = " AND ".join(where_clauses[:-1])
+        params = [match] + params[:-1]
+    
+    cursor = decode_cursor(request.args.get('cursor', ''), sort_by)
+    
+    # Keyset pagination: continue from the (sort key, id) of the row on the edge
+    # of the previous page instead of skipping OFFSET rows. Going back walks the
+    # index the other way and flips the rows afterwards.
+    direction, page = 'next', 1
+    if cursor:
+        direction, key_value, key_id, page = cursor
+        forwards = descending == (direction == 'next')
+        where_clause += f" AND ({sort_column}, id) {'<' if forwards else '>'} (?, ?)"
+        params.extend([key_value, key_id])
     else:
-        order_by = "time DESC"
+        forwards = descending
+    order = "DESC" if forwards else "ASC"
     
-    count_query = f"SELECT COUNT(*) as total FROM transactions WHERE {where_clause}"
-    total_transactions = db.execute(count_query, *params)[0]['total']
-    total_pages = (total_transactions + int(per_page) - 1) // int(per_page)
-    
-    offset = (page - 1) * int(per_page)
     query = f"""
-        SELECT id, name, amount, type, category, time, notes, receipt_path, is_recurring
-        FROM transactions
+        SELECT id, name, amount, type, category, time, notes, receipt_path, is_recurring{', relevance' if sort_by == 'relevance' else ''}
+        FROM {from_clause}
         WHERE {where_clause}
-        ORDER BY {order_by}
-        LIMIT ? OFFSET ?
+        ORDER BY {sort_column} {order}, id {order}
+        LIMIT ?
     """
     
-    transactions = db.execute(query, *params, int(per_page), offset)
+    transactions = db.execute(query, *params, int(per_page) + 1)
+    more = len(transactions) > int(per_page)
+    transactions = transactions[:int(per_page)]
+    if direction == 'prev':
+        transactions.reverse()
+    
+    has_next = more if direction == 'next' else bool(transactions)
+    has_prev = page > 1 and (more or direction == 'next')
+    if direction == 'prev' and not more:
+        page = 1
     
     for transaction in transactions:
         transaction['formatted_amount'] = f"${transaction['amount']:.2f}"
@@ -1553,17 +1650,6 @@ def transactions():
     
     categories = db.execute("SELECT DISTINCT name FROM categories ORDER BY name")
     
-    summary_query = f"""
-        SELECT 
-            COALESCE(SUM(CASE WHEN type = 'INCOME' THEN amount ELSE 0 END), 0) as total_income,
-            COALESCE(SUM(CASE WHEN type = 'EXPENSE' THEN amount ELSE 0 END), 0) as total_expense,
-            COUNT(*) as count
-        FROM transactions
-        WHERE {where_clause}
-    """
-    summary = db.execute(summary_query, *params)[0]
-    summary['net'] = summary['total_income'] - summary['total_expense']
-    
     return render_template("transactions.html",
         transactions=transactions,
         categories=categories,
@@ -1579,7 +1665,9 @@ def transactions():
         pagination={
             'current': page,
             'total': total_pages,
-            'total_items': total_transactions
+            'total_items': total_transactions,
+            'next': encode_cursor(sort_by, 'next', transactions[-1], page + 1) if has_next and transactions else None,
+            'prev': encode_cursor(sort_by, 'prev', transactions[0], page - 1) if has_prev and transactions else None
         }
     )
 
@@ -1598,12 +1686,10 @@ def delete_transaction(transaction_id):
         flash("Transaction not found", "error")
         return redirect("/transactions")
     
-    if transaction[0]['receipt_path']:
-        receipt_path = transaction[0]['receipt_path']
-        if os.path.exists(receipt_path):
-            os.remove(receipt_path)
-    
-    db.execute("DELETE FROM transactions WHERE id = ?", transaction_id)
+    # The receipt file may be shared with other transactions; collect_receipts removes it once it isn't
+    with db.transaction():
+        db.execute("DELETE FROM transactions WHERE id = ?", transaction_id)
+        record_rollup(user_id, transaction[0]['time'], transaction[0]['type'], transaction[0]['category'], -transaction[0]['amount'], -1)
     
     flash("Transaction deleted successfully", "success")
     return redirect("/transactions")
@@ -1643,11 +1729,14 @@ def edit_transaction(transaction_id):
             flash("Invalid amount", "error")
             return redirect(f"/transaction/edit/{transaction_id}")
         
-        db.execute("""
-            UPDATE transactions 
-            SET name = ?, amount = ?, category = ?, notes = ?
-            WHERE id = ?
-        """, name, amount, category, notes, transaction_id)
+        with db.transaction():
+            db.execute("""
+                UPDATE transactions 
+                SET name = ?, amount = ?, category = ?, notes = ?
+                WHERE id = ?
+            """, name, amount, category, notes, transaction_id)
+            record_rollup(user_id, transaction['time'], transaction['type'], transaction['category'], -transaction['amount'], -1)
+            record_rollup(user_id, transaction['time'], transaction['type'], category, amount)
         
         flash("Transaction updated successfully", "success")
         return redirect("/transactions")
@@ -1655,17 +1744,85 @@ def edit_transaction(transaction_id):
     categories = db.execute("SELECT * FROM categories WHERE type = ?", transaction['type'])
     return render_template("edit-transaction.html", transaction=transaction, categories=categories)
 
+@app.cli.command("upgrade-schema")
+def upgrade_schema_command():
+    """Create the tables, indexes and columns added since the database was first set up"""
+    upgrade_schema()
+    print("Schema up to date")
+
+
+@app.cli.command("precompress-static")
+def precompress_static_command():
+    """Write .gz copies of the static CSS/JS files (run as a build step; startup does it too)"""
+    print(f"{precompress_static(app.static_folder)} static files compressed")
+
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    """Recompute the daily_rollups table from transactions"""
+    rebuild_rollups()
+    print("Daily rollups rebuilt")
+
+
+@app.cli.command("rebuild-search-index")
+def rebuild_search_index_command():
+    """Backfill the transactions_fts full-text index from transactions"""
+    rebuild_search_index()
+    print("Search index rebuilt")
+
+
+@app.cli.command("import-transactions")
+@click.argument("user_id", type=int)
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "file_format", type=click.Choice(IMPORT_FORMATS), help="Defaults to the file extension")
+def import_transactions_command(user_id, path, file_format):
+    """Bulk import transactions for a user from a CSV (export columns) or NDJSON file"""
+    with open(path, "rb") as stream:
+        result = import_transactions(user_id, read_records(stream, import_format(path, file_format)))
+    for error in result['errors']:
+        print(f"line {error['line']}: {error['error']}")
+    print(f"{result['imported']} imported, {result['duplicates']} duplicates skipped, {result['invalid']} invalid")
+
+
+@app.cli.command("gc-receipts")
+@click.option("--grace", type=int, default=None, help="Keep unreferenced files modified in the last N seconds")
+def gc_receipts_command(grace):
+    """Delete receipt files no transaction references"""
+    result = collect_receipts(grace)
+    print(f"{result['deleted']} receipt files deleted ({result['freed_bytes']} bytes), {result['kept']} kept")
+
+@app.cli.command("verify-rollups")
+def verify_rollups_command():
+    """Compare daily_rollups against transactions and report mismatches"""
+    mismatches = verify_rollups()
+    for row in mismatches:
+        print(f"user {row['user_id']} {row['day']} {row['type']} {row['category']}: "
+              f"expected {row['expected_total']} ({row['expected_count']}), "
+              f"stored {row['stored_total']} ({row['stored_count']})")
+    print(f"{len(mismatches)} mismatched rollup rows")
+    if mismatches:
+        raise SystemExit(1)
+
+
 if __name__ == '__main__':
     print("="*60)
     print("Financial Tracker Starting...")
     print("="*60)
     
-    whisper_model = load_whisper_model()
-    
-    if whisper_model:
-        print("Voice recognition ready!")
-    else:
-        print("Voice recognition disabled")
+    # The debug reloader runs this block in a watcher process too; only the server it starts sets up
+    if is_running_from_reloader():
+        init_app()
+        
+        # Load the transcription workers' models now instead of on the first voice request
+        try:
+            voice_ready = start_transcription_pool()
+        except Exception as e:
+            print(f"Could not start transcription workers: {e}")
+            voice_ready = False
+        
+        if voice_ready:
+            print("Voice recognition ready!")
+        else:
+            print("Voice recognition disabled")
     
     print("\nWarming up AI model...")
     try:
@@ -0,0 +1,141 @@
+"""
+Batches of create, update and delete operations on a user's transactions.
+
+apply_operations runs a whole batch in one database transaction, each
+operation in a savepoint of its own, so an operation that fails is undone
+and reported without affecting the others (or, with `atomic`, undoes the
+whole batch). Records are validated like imported ones (see
+importer.parse_record). The daily rollups are updated once for the batch
+and the budget is checked once, after the last operation, rather than
+after every change.
+
+Operations look like:
+
+    {"op": "create", "name": "Coffee", "amount": 3.5, "category": "Food", "date": "2026-01-09"}
+    {"op": "update", "id": 42, "amount": 4.0}
+    {"op": "delete", "id": 43}
+
+An update changes only the fields it gives (name, amount, category, type,
+date, notes); a create may leave out type, which follows the category.
+"""
+
+from database import db
+from helpers import budget_warning, record_rollups, refresh_rollup_groups
+from importer import parse_record
+
+
+BATCH_MAX_OPERATIONS = 1000
+
+BATCH_OPERATIONS = ('create', 'update', 'delete')
+
+TRANSACTION_FIELDS = ('name', 'amount', 'category', 'type', 'date', 'notes')
+
+
+class BatchAborted(Exception):
+    """Raised inside the batch's transaction to roll back every operation of an atomic batch"""
+
+
+def apply_operations(user_id, operations, atomic=False):
+    """
+    Apply the operations in order for user_id. Returns the result of each
+    operation, counts of applied and failed ones, whether anything was
+    committed, and the budget warning after the batch (see budget_warning).
+    """
+    categories = {row['name']: row['type'] for row in db.execute("SELECT name, type FROM categories")}
+    ids = {op.get('id') for op in operations if isinstance(op, dict) and op.get('op') in ('update', 'delete')}
+    ids = [transaction_id for transaction_id in ids if isinstance(transaction_id, int)]
+
+    results, rollups, removed = [], [], []
+    try:
+        with db.transaction():
+            # Rows the batch touches, read under the write lock so no other
+            # writer changes them first, and kept current as operations change them
+            existing = {}
+            if ids:
+                placeholders = ", ".join(["?"] * len(ids))
+                existing = {
+                    row['id']: row for row in db.execute(f"""
+                        SELECT id, name, amount, type, category, notes, time
+                        FROM transactions
+                        WHERE user_id = ? AND id IN ({placeholders})
+                    """, user_id, *ids)
+                }
+
+            for index, op in enumerate(operations):
+                try:
+                    with db.transaction():
+                        result, changes = apply_operation(user_id, op, categories, existing)
+                except ValueError as e:
+                    results.append({'index': index, 'op': op.get('op') if isinstance(op, dict) else None,
+                                    'status': 'error', 'error': str(e)})
+                    continue
+                result['index'] = index
+                results.append(result)
+                rollups.extend(changes)
+                removed.extend(change[:4] for change in changes if change[5] < 0)
+
+            if atomic and any(result['status'] == 'error' for result in results):
+                raise BatchAborted()
+
+            if rollups:
+                record_rollups(rollups)
+                refresh_rollup_groups(removed)
+        committed = True
+    except BatchAborted:
+        committed = False
+
+    failed = sum(1 for result in results if result['status'] == 'error')
+    return {
+        'results': results,
+        'applied': len(results) - failed if committed else 0,
+        'failed': failed,
+        'committed': committed,
+        'budget': budget_warning(user_id) if committed and rollups else None
+    }
+
+
+def apply_operation(user_id, op, categories, existing):
+    """Apply one operation; returns its result and its rollup changes, or raises ValueError"""
+    if not isinstance(op, dict) or op.get('op') not in BATCH_OPERATIONS:
+        raise ValueError(f"op must be one of: {', '.join(BATCH_OPERATIONS)}")
+
+    if op['op'] == 'create':
+        time, name, amount, transaction_type, category, notes = parse_record(op, categories)
+        transaction_id = db.execute("""
+            INSERT INTO transactions (user_id, name, amount, type, category, notes, is_recurring, time)
+            VALUES (?, ?, ?, ?, ?, ?, 0, ?)
+        """, user_id, name, amount, transaction_type, category, notes, time)
+        return (
+            {'op': 'create', 'status': 'created', 'id': transaction_id},
+            [(user_id, time, transaction_type, category, amount, 1)]
+        )
+
+    transaction = existing.get(op.get('id'))
+    if not transaction:
+        raise ValueError("transaction not found")
+    removal = (user_id, transaction['time'], transaction['type'], transaction['category'], -transaction['amount'], -1)
+
+    if op['op'] == 'delete':
+        db.execute("DELETE FROM transactions WHERE id = ?", transaction['id'])
+        del existing[transaction['id']]
+        # Its receipt file, if no longer referenced, is left to collect_receipts
+        return {'op': 'delete', 'status': 'deleted', 'id': transaction['id']}, [removal]
+
+    fields = {key: op[key] for key in TRANSACTION_FIELDS if key in op}
+    # Unless the update gives a type, a new category must be of the transaction's current type
+    record = {
+        'name': transaction['name'], 'amount': transaction['amount'], 'category': transaction['category'],
+        'type': transaction['type'], 'date': transaction['time'], 'notes': transaction['notes'], **fields
+    }
+    time, name, amount, transaction_type, category, notes = parse_record(record, categories)
+    db.execute("""
+        UPDATE transactions
+        SET name = ?, amount = ?, type = ?, category = ?, notes = ?, time = ?
+        WHERE id = ?
+    """, name, amount, transaction_type, category, notes, time, transaction['id'])
+    existing[transaction['id']] = dict(transaction, name=name, amount=amount, type=transaction_type,
+                                       category=category, notes=notes, time=time)
+    return (
+        {'op': 'update', 'status': 'updated', 'id': transaction['id']},
+        [removal, (user_id, time, transaction_type, category, amount, 1)]
+    )
@@ -0,0 +1,70 @@
+"""Benchmark /analytics: the per-widget helper queries vs the NumPy engine.
+
+    python benchmarks/analytics.py [rows ...]
+
+Times one uncached computation of everything /analytics shows, for a 90-day
+and a 365-day window, both the old way (one helper or query per widget) and
+with analytics_engine.analyze, and reports the number of queries issued.
+"""
+
+from datetime import datetime, timedelta
+
+from common import QueryCounter, make_database, seed_transactions, sizes_from_argv, timed
+
+
+USER_ID = 1
+
+
+def per_widget(helpers, db, start_date, end_date):
+    """What /analytics ran before the engine: one helper or query per widget"""
+    helpers.get_spending_trends.__wrapped__(USER_ID, start_date, end_date)
+    helpers.get_category_analysis.__wrapped__(USER_ID, start_date, end_date)
+    helpers.get_period_comparison.__wrapped__(USER_ID, start_date, end_date)
+    helpers.get_time_analysis.__wrapped__(USER_ID, start_date, end_date)
+    helpers.calculate_financial_health.__wrapped__(USER_ID, start_date, end_date)
+    for kind in ('EXPENSE', 'INCOME'):
+        db.execute("""
+            SELECT name, amount, category, time
+            FROM transactions
+            WHERE user_id = ? AND type = ?
+            AND time >= ? AND time < ?
+            ORDER BY amount DESC
+            LIMIT 10
+        """, USER_ID, kind, helpers.to_day(start_date), helpers.to_day(end_date + timedelta(days=1)))
+
+
+def main():
+    path = make_database()
+    import analytics_engine
+    import helpers
+
+    helpers.upgrade_schema()
+    counter = QueryCounter(helpers.db)
+    helpers.db = analytics_engine.db = counter
+    end_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    seeded = 0
+
+    print(f"{'rows':>9} {'window':>7} {'old q':>6} {'old ms':>9} {'new q':>6} {'new ms':>9}")
+    for size in sizes_from_argv([10_000, 100_000, 1_000_000]):
+        seed_transactions(path, USER_ID, size - seeded, seed=size)
+        seeded = size
+        helpers.rebuild_rollups()
+
+        for window in (90, 365):
+            start_date = end_date - timedelta(days=window)
+
+            counter.count = 0
+            per_widget(helpers, counter, start_date, end_date)
+            old_queries = counter.count
+            old_ms = timed(lambda: per_widget(helpers, counter, start_date, end_date))
+
+            counter.count = 0
+            analytics_engine.analyze.__wrapped__(USER_ID, start_date, end_date)
+            new_queries = counter.count
+            new_ms = timed(lambda: analytics_engine.analyze.__wrapped__(USER_ID, start_date, end_date))
+
+            print(f"{size:>9} {window:>6}d {old_queries:>6} {old_ms:>9.2f} {new_queries:>6} {new_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark the bulk transaction import.
+
+    python benchmarks/bulk_import.py [rows]
+
+Writes a CSV of 1M random transactions in the export format and imports it
+for a new user with importer.import_transactions (what the upload endpoint
+and `flask import-transactions` run). It then imports the same file again,
+which should find every record a duplicate, and checks the rollups and the
+search index.
+"""
+
+from datetime import datetime, timedelta
+
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+from common import EXPENSE_CATEGORIES, INCOME_CATEGORIES, make_database
+
+
+USER_ID = 1
+
+
+def write_csv(path, count, seed=42):
+    """Random transactions over three years, in the columns export_csv writes"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(['Date', 'Name', 'Type', 'Category', 'Amount', 'Notes'])
+        for i in range(count):
+            is_income = rng.random() < 0.15
+            writer.writerow([
+                (now - timedelta(seconds=rng.randrange(3 * 365 * 24 * 3600))).strftime('%Y-%m-%d %H:%M:%S'),
+                f"Imported {i}",
+                'INCOME' if is_income else 'EXPENSE',
+                rng.choice(INCOME_CATEGORIES if is_income else EXPENSE_CATEGORIES),
+                round(rng.uniform(1, 2000 if is_income else 200), 2),
+                rng.choice(["", "weekly shop", "paid in cash"])
+            ])
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    make_database()
+    source = os.path.join(tempfile.gettempdir(), f"finance-import-{os.getpid()}.csv")
+    write_csv(source, rows)
+
+    import helpers
+    import importer
+
+    helpers.upgrade_schema()
+    helpers.db.execute("INSERT INTO users (id, username, hash) VALUES (?, 'bench', 'x')", USER_ID)
+
+    try:
+        for label in ("first import", "re-import"):
+            began = time.perf_counter()
+            with open(source, "rb") as stream:
+                result = importer.import_transactions(USER_ID, importer.read_records(stream, "csv"))
+            seconds = time.perf_counter() - began
+            print(f"{label:>12}: {seconds:6.1f}s, {rows / seconds:8.0f} rows/s, "
+                  f"{result['imported']} imported, {result['duplicates']} duplicates, {result['invalid']} invalid")
+    finally:
+        os.remove(source)
+
+    indexed = helpers.db.execute("SELECT COUNT(*) as count FROM transactions_fts WHERE transactions_fts MATCH 'imported'")[0]['count']
+    print(f"search index: {indexed} rows, rollup mismatches: {len(helpers.verify_rollups())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Shared setup for the benchmark scripts in this directory.
+
+Every benchmark builds a throwaway copy of the database (same schema as the
+README) inside a temporary directory and changes into it, so the app modules
+pick up ``Database/finance.db`` from there instead of the real one.
+"""
+
+from datetime import datetime, timedelta
+
+import atexit
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    username TEXT NOT NULL UNIQUE,
+    hash TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    type TEXT NOT NULL CHECK(type IN ('EXPENSE', 'INCOME')),
+    icon TEXT,
+    color TEXT
+);
+
+CREATE TABLE transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    amount NUMERIC NOT NULL CHECK(amount > 0),
+    type TEXT NOT NULL CHECK(type IN ('EXPENSE', 'INCOME')),
+    category TEXT NOT NULL,
+    time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    notes TEXT,
+    receipt_path VARCHAR(255),
+    is_recurring INTEGER DEFAULT 0 CHECK(is_recurring IN (0, 1)),
+    recurring_template_id INTEGER,
+    FOREIGN KEY(user_id) REFERENCES users(id),
+    FOREIGN KEY(recurring_template_id) REFERENCES recurring_transactions(id)
+);
+
+CREATE INDEX idx_user_transactions ON transactions(user_id, time DESC);
+CREATE INDEX idx_transaction_type ON transactions(user_id, type);
+CREATE INDEX idx_transaction_category ON transactions(user_id, category);
+CREATE INDEX idx_recurring_template ON transactions(recurring_template_id);
+
+CREATE TABLE recurring_transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    amount NUMERIC NOT NULL CHECK(amount > 0),
+    type TEXT NOT NULL CHECK(type IN ('EXPENSE', 'INCOME')),
+    category TEXT NOT NULL,
+    frequency TEXT NOT NULL CHECK(frequency IN ('DAILY', 'WEEKLY', 'BIWEEKLY', 'MONTHLY', 'YEARLY')),
+    start_date DATE NOT NULL,
+    end_date DATE,
+    next_occurrence DATE NOT NULL,
+    is_active INTEGER DEFAULT 1 CHECK(is_active IN (0, 1)),
+    notes TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY(user_id) REFERENCES users(id)
+);
+
+CREATE INDEX idx_recurring_active ON recurring_transactions(is_active, next_occurrence);
+CREATE INDEX idx_user_recurring ON recurring_transactions(user_id);
+
+CREATE TABLE budgets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    amount NUMERIC NOT NULL CHECK(amount > 0),
+    period TEXT NOT NULL CHECK(period IN ('WEEKLY', 'MONTHLY', 'YEARLY')),
+    start_date DATE NOT NULL,
+    end_date DATE,
+    is_active INTEGER DEFAULT 1 CHECK(is_active IN (0, 1)),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY(user_id) REFERENCES users(id)
+);
+
+CREATE UNIQUE INDEX idx_active_budget ON budgets(user_id, period) WHERE is_active = 1;
+CREATE INDEX idx_user_budgets ON budgets(user_id);
+
+CREATE TABLE category_budgets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    limit_amount NUMERIC NOT NULL,
+    is_active INTEGER DEFAULT 1 CHECK(is_active IN (0, 1)),
+    FOREIGN KEY(user_id) REFERENCES users(id)
+);
+"""
+
+EXPENSE_CATEGORIES = ['Food', 'Transport', 'Bills', 'Entertainment', 'Shopping', 'Healthcare', 'Other']
+INCOME_CATEGORIES = ['Salary', 'Freelance', 'Investment', 'Gift']
+
+
+def make_database(directory=None):
+    """Create an empty database in a temporary directory and chdir into it"""
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix="finance-bench-")
+        atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    os.makedirs(os.path.join(directory, "Database"), exist_ok=True)
+    path = os.path.join(directory, "Database", "finance.db")
+
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    connection.executemany(
+        "INSERT INTO categories (name, type, color) VALUES (?, 'EXPENSE', '#dc3545')",
+        [(c,) for c in EXPENSE_CATEGORIES]
+    )
+    connection.executemany(
+        "INSERT INTO categories (name, type, color) VALUES (?, 'INCOME', '#28a745')",
+        [(c,) for c in INCOME_CATEGORIES if c not in EXPENSE_CATEGORIES]
+    )
+    connection.commit()
+    connection.close()
+
+    os.chdir(directory)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    return path
+
+
+def seed_transactions(path, user_id, count, years=3, seed=42):
+    """Insert `count` random transactions for `user_id` spread over `years`"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    span = int(years * 365 * 24 * 3600)
+
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "INSERT OR IGNORE INTO users (id, username, hash) VALUES (?, ?, 'x')",
+        (user_id, f"bench{user_id}")
+    )
+
+    def rows():
+        for i in range(count):
+            is_income = rng.random() < 0.15
+            when = now - timedelta(seconds=rng.randrange(span))
+            yield (
+                user_id,
+                f"Transaction {i}",
+                round(rng.uniform(1, 2000 if is_income else 200), 2),
+                'INCOME' if is_income else 'EXPENSE',
+                rng.choice(INCOME_CATEGORIES if is_income else EXPENSE_CATEGORIES),
+                when.strftime('%Y-%m-%d %H:%M:%S'),
+                rng.choice([None, "weekly shop", "paid in cash", "shared with friends"])
+            )
+
+    connection.executemany("""
+        INSERT INTO transactions (user_id, name, amount, type, category, time, notes)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows())
+    connection.commit()
+    connection.close()
+
+
+class QueryCounter:
+    """Wrap a db object and count calls to execute()"""
+
+    def __init__(self, db):
+        self.db = db
+        self.count = 0
+
+    def execute(self, *args, **kwargs):
+        self.count += 1
+        return self.db.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+def timed(fn, repeat=5):
+    """Return the median wall time of `fn()` in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def percentile(samples, pct):
+    """Return the `pct` percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def sizes_from_argv(default):
+    """Row counts to benchmark, overridable as command line arguments"""
+    return [int(arg) for arg in sys.argv[1:]] or default
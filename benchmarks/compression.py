@@ -0,0 +1,86 @@
+"""Benchmark response compression: bytes sent and time to deliver representative pages.
+
+    python benchmarks/compression.py [rows]
+
+Seeds one user with three years of transactions (50,000 by default) and
+requests each page with and without `Accept-Encoding: gzip`. Reports the
+body size, the median server time (so the cost of compressing shows up),
+and the estimated time to deliver the response over a slow link (1.6
+Mbit/s, 150 ms round trip) and a fast one (20 Mbit/s, 40 ms): server time,
+one round trip and the body's transfer time. Static files come from their
+precompressed .gz copies.
+"""
+
+import os
+import re
+
+from common import make_database, seed_transactions, sizes_from_argv, timed
+
+
+USER_ID = 1
+
+PAGES = [
+    "/",
+    "/analytics?start_date=2000-01-01&end_date=2100-01-01",
+    "/statistics?view=daily",
+    "/statistics?view=annual&period=all",
+    "/transactions",
+    "/api/forecast?months=24",
+    "/analytics/export/csv?start_date=2000-01-01&end_date=2100-01-01",
+]
+
+# (name, bits per second, round trip seconds)
+LINKS = [("slow", 1.6e6, 0.150), ("fast", 20e6, 0.040)]
+
+
+def fetch(client, url, gzip):
+    """Bytes of the body as sent"""
+    headers = {'Accept-Encoding': 'gzip'} if gzip else {}
+    response = client.get(url, headers=headers, buffered=False)
+    sent = sum(len(chunk) for chunk in response.response)
+    response.close()
+    return sent
+
+
+def main():
+    os.environ.setdefault("RECURRING_INTERVAL", "0")
+    os.environ.setdefault("RECEIPT_GC_INTERVAL", "0")
+    path = make_database()
+    rows = sizes_from_argv([50_000])[0]
+    seed_transactions(path, USER_ID, rows)
+
+    import app as application
+    application.init_app()
+
+    client = application.app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = USER_ID
+
+    html = client.get("/").get_data(as_text=True)
+    static = [url for url in re.findall(r'(?:src|href)="(/static/[^"]+)"', html) if '.css' in url or '.js' in url]
+
+    print(f"{rows} transactions")
+    print(f"{'page':<44} {'KB plain':>9} {'KB gzip':>8} {'ratio':>6} {'ms plain':>9} {'ms gzip':>8}"
+          + "".join(f" {name + ' plain':>11} {name + ' gzip':>10}" for name, _, _ in LINKS))
+    totals = [0.0] * (2 + 2 * len(LINKS))
+    for url in PAGES + sorted(set(static)):
+        plain, packed = fetch(client, url, False), fetch(client, url, True)
+        plain_ms = timed(lambda: fetch(client, url, False))
+        packed_ms = timed(lambda: fetch(client, url, True))
+        delivery = []
+        for _, bits, rtt in LINKS:
+            delivery += [
+                plain_ms + (rtt + plain * 8 / bits) * 1000,
+                packed_ms + (rtt + packed * 8 / bits) * 1000,
+            ]
+        for i, value in enumerate([plain, packed] + delivery):
+            totals[i] += value
+        print(f"{url.split('?v=')[0][:44]:<44} {plain / 1024:>9.1f} {packed / 1024:>8.1f} {plain / max(packed, 1):>6.1f}"
+              f" {plain_ms:>9.1f} {packed_ms:>8.1f}" + "".join(f" {ms:>11.0f}" if i % 2 == 0 else f" {ms:>10.0f}" for i, ms in enumerate(delivery)))
+
+    print(f"{'total':<44} {totals[0] / 1024:>9.1f} {totals[1] / 1024:>8.1f} {totals[0] / totals[1]:>6.1f} {'':>9} {'':>8}"
+          + "".join(f" {ms:>11.0f}" if i % 2 == 0 else f" {ms:>10.0f}" for i, ms in enumerate(totals[2:])))
+
+
+if __name__ == "__main__":
+    main()
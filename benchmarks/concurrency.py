@@ -0,0 +1,105 @@
+"""Benchmark dashboard reads under concurrent writes for each connection profile.
+
+    python benchmarks/concurrency.py [rows]
+
+Reader threads render the dashboard aggregates inside db.read_only() while
+writer threads add transactions the way /add does. Reports p50/p99 latency
+and throughput for reads and writes with the rollback-journal and WAL
+profiles.
+"""
+
+from datetime import datetime, timedelta
+
+import random
+import sys
+import threading
+import time
+
+from common import make_database, percentile, seed_transactions
+
+
+READERS = 8
+WRITERS = 2
+DURATION = 5.0
+USER_IDS = range(1, 11)
+
+
+def run(profile, rows):
+    path = make_database()
+    for user_id in USER_IDS:
+        seed_transactions(path, user_id, rows // len(USER_IDS), seed=user_id)
+
+    import helpers
+    from database import SQL
+
+    helpers.db = db = SQL("sqlite:///" + path, profile=profile)
+    helpers.upgrade_schema()
+    helpers.rebuild_rollups()
+
+    today = datetime.now()
+    start = today - timedelta(days=90)
+    week_start = today - timedelta(days=today.weekday())
+    labels = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+    reads, writes, errors = [], [], []
+    stop = time.perf_counter() + DURATION
+
+    def reader(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < stop:
+            user_id = rng.choice(USER_IDS)
+            began = time.perf_counter()
+            try:
+                with db.read_only():
+                    helpers.get_histogram_data(user_id, 'daily', week_start, today, labels)
+                    helpers.get_spending_trends(user_id, start, today)
+                    helpers.get_period_comparison(user_id, start, today)
+                    helpers.calculate_trends(user_id)
+            except RuntimeError as e:
+                errors.append(str(e))
+                continue
+            reads.append((time.perf_counter() - began) * 1000)
+
+    def writer(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < stop:
+            user_id = rng.choice(USER_IDS)
+            amount = round(rng.uniform(1, 100), 2)
+            began = time.perf_counter()
+            try:
+                with db.transaction():
+                    db.execute("""
+                        INSERT INTO transactions (user_id, name, amount, type, category, time)
+                        VALUES (?, 'Bench', ?, 'EXPENSE', 'Food', ?)
+                    """, user_id, amount, today)
+                    helpers.record_rollup(user_id, today, 'EXPENSE', 'Food', amount)
+            except RuntimeError as e:
+                errors.append(str(e))
+                continue
+            writes.append((time.perf_counter() - began) * 1000)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(READERS)]
+    threads += [threading.Thread(target=writer, args=(100 + i,)) for i in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    db.close()
+
+    for kind, samples in (("read", reads), ("write", writes)):
+        print(f"{profile:>9} {kind:>6} {len(samples) / DURATION:>8.1f} "
+              f"{percentile(samples, 50):>9.2f} {percentile(samples, 99):>9.2f}")
+    if errors:
+        print(f"{profile:>9} {len(errors)} failed operations, e.g. {errors[0]}")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"{READERS} readers, {WRITERS} writers, {DURATION:.0f}s per profile, {rows} rows")
+    print(f"{'profile':>9} {'op':>6} {'ops/s':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for profile in ("rollback", "wal"):
+        run(profile, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark the sqlite3 data access layer against cs50.SQL.
+
+    python benchmarks/data_access.py [rows ...]
+
+Renders the dashboard pages once to record the statements they issue, then
+replays that query set through cs50.SQL and through database.SQL (dict and
+tuple rows) and reports the time per pass.
+"""
+
+from common import make_database, seed_transactions, sizes_from_argv, timed
+
+
+USER_ID = 1
+PAGES = ["/", "/statistics", "/statistics?view=monthly", "/analytics", "/budget/status", "/transactions"]
+
+
+def record_dashboard_queries(app_module):
+    """Statements (sql, args) issued while rendering the dashboard pages"""
+    import helpers
+
+    statements = []
+    real_db = app_module.db
+
+    class Recorder:
+        def execute(self, sql, *args, **kwargs):
+            statements.append((sql, args))
+            return real_db.execute(sql, *args, **kwargs)
+
+        def __getattr__(self, name):
+            return getattr(real_db, name)
+
+    app_module.db = helpers.db = Recorder()
+    try:
+        client = app_module.app.test_client()
+        with client.session_transaction() as sess:
+            sess["user_id"] = USER_ID
+        for page in PAGES:
+            client.get(page)
+    finally:
+        app_module.db = helpers.db = real_db
+
+    return [(sql, args) for sql, args in statements if sql.lstrip().upper().startswith(("SELECT", "WITH"))]
+
+
+def main():
+    path = make_database()
+    seeded = 0
+
+    import app as app_module
+    app_module.upgrade_schema()
+    from cs50 import SQL as CS50SQL
+    from database import SQL
+
+    cs50_db = CS50SQL("sqlite:///Database/finance.db")
+    dict_db = SQL("sqlite:///Database/finance.db")
+    tuple_db = SQL("sqlite:///Database/finance.db", rows="tuple")
+
+    print(f"{'rows':>9} {'queries':>8} {'cs50 ms':>9} {'dict ms':>9} {'tuple ms':>9} {'speedup':>8}")
+    for size in sizes_from_argv([10_000, 100_000]):
+        seed_transactions(path, USER_ID, size - seeded, seed=size)
+        seeded = size
+        app_module.rebuild_rollups()
+
+        queries = record_dashboard_queries(app_module)
+
+        def replay(db):
+            for sql, args in queries:
+                db.execute(sql, *args)
+
+        cs50_ms = timed(lambda: replay(cs50_db))
+        dict_ms = timed(lambda: replay(dict_db))
+        tuple_ms = timed(lambda: replay(tuple_db))
+        print(f"{size:>9} {len(queries):>8} {cs50_ms:>9.2f} {dict_ms:>9.2f} {tuple_ms:>9.2f} {cs50_ms / dict_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark /analytics/export/csv: building the file in memory vs streaming it.
+
+    python benchmarks/export.py [rows ...]
+
+Seeds one user and exports every transaction three ways:
+- the old way: every row fetched, written to a StringIO, then copied into a BytesIO
+- the streaming route
+- the streaming route with gzip
+
+Reports the wall time, the bytes sent and the peak Python memory traced
+while the response is produced. Only the old way's peak should grow with
+the number of rows.
+"""
+
+from io import BytesIO, StringIO
+
+import csv
+import os
+import time
+import tracemalloc
+
+from common import make_database, seed_transactions, sizes_from_argv
+
+
+USER_ID = 1
+URL = "/analytics/export/csv?start_date=2000-01-01&end_date=2100-01-01"
+
+
+def in_memory(db):
+    """What export_csv did before: three full copies of the export"""
+    transactions = db.execute("""
+        SELECT name, amount, type, category, time, notes
+        FROM transactions
+        WHERE user_id = ?
+        AND time >= ? AND time <= ?
+        ORDER BY time DESC
+    """, USER_ID, "2000-01-01", "2100-01-01")
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['Date', 'Name', 'Type', 'Category', 'Amount', 'Notes'])
+    for t in transactions:
+        writer.writerow([t['time'], t['name'], t['type'], t['category'], t['amount'], t['notes'] or ''])
+    return len(BytesIO(output.getvalue().encode()).getvalue())
+
+
+def streamed(client, gzip):
+    """Read the streaming response chunk by chunk, keeping only the byte count"""
+    headers = {'Accept-Encoding': 'gzip'} if gzip else {}
+    response = client.get(URL, headers=headers, buffered=False)
+    sent = sum(len(chunk) for chunk in response.response)
+    response.close()
+    return sent
+
+
+def measure(fn):
+    """(seconds, bytes, peak traced MB) of one call; the time comes from a separate untraced call"""
+    began = time.perf_counter()
+    sent = fn()
+    seconds = time.perf_counter() - began
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, sent, peak / 1024 / 1024
+
+
+def main():
+    os.environ.setdefault("RECURRING_INTERVAL", "0")
+    path = make_database()
+    seeded = 0
+
+    import app as application
+    application.upgrade_schema()
+
+    client = application.app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = USER_ID
+
+    print(f"{'rows':>9} {'mode':>10} {'seconds':>8} {'MB sent':>8} {'peak MB':>8}")
+    for size in sizes_from_argv([100_000, 1_000_000]):
+        seed_transactions(path, USER_ID, size - seeded, seed=size)
+        seeded = size
+        for mode, fn in [
+            ("in memory", lambda: in_memory(application.db)),
+            ("streamed", lambda: streamed(client, gzip=False)),
+            ("gzip", lambda: streamed(client, gzip=True)),
+        ]:
+            seconds, sent, peak = measure(fn)
+            print(f"{size:>9} {mode:>10} {seconds:>8.2f} {sent / 1024 / 1024:>8.1f} {peak:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
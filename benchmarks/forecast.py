@@ -0,0 +1,63 @@
+"""Benchmark /api/forecast for users with many recurring templates.
+
+    python benchmarks/forecast.py [templates ...]
+
+Seeds one user with 100k transactions and the given number of active
+recurring templates (mixed frequencies). It times an uncached 3-month and
+12-month forecast with the discretionary estimate, then a cached call.
+"""
+
+from datetime import date, timedelta
+
+import random
+import sqlite3
+
+from common import make_database, seed_transactions, sizes_from_argv, timed
+
+
+USER_ID = 1
+FREQUENCIES = ['DAILY', 'WEEKLY', 'BIWEEKLY', 'MONTHLY', 'YEARLY']
+
+
+def seed_templates(path, count, seed=42):
+    """Replace the user's templates with `count` active ones"""
+    rng = random.Random(seed)
+    today = date.today()
+    connection = sqlite3.connect(path)
+    connection.execute("DELETE FROM recurring_transactions")
+    connection.executemany("""
+        INSERT INTO recurring_transactions
+        (user_id, name, amount, type, category, frequency, start_date, end_date, next_occurrence)
+        VALUES (?, ?, ?, ?, 'Bills', ?, ?, ?, ?)
+    """, [(
+        USER_ID, f"Template {i}", round(rng.uniform(1, 500), 2),
+        'INCOME' if rng.random() < 0.2 else 'EXPENSE', rng.choice(FREQUENCIES), today,
+        today + timedelta(days=rng.randrange(400)) if rng.random() < 0.2 else None,
+        today + timedelta(days=rng.randrange(1, 31))
+    ) for i in range(count)])
+    connection.commit()
+    connection.close()
+
+
+def main():
+    path = make_database()
+    seed_transactions(path, USER_ID, 100_000)
+
+    import helpers
+    import recurring_engine
+
+    helpers.upgrade_schema()
+
+    print(f"{'templates':>9} {'3 months ms':>12} {'12 months ms':>13} {'cached ms':>10}")
+    for size in sizes_from_argv([10, 100, 1_000, 5_000]):
+        seed_templates(path, size)
+        helpers.bump_data_version(USER_ID)
+        quarter_ms = timed(lambda: recurring_engine.forecast.__wrapped__(USER_ID, 3, True))
+        year_ms = timed(lambda: recurring_engine.forecast.__wrapped__(USER_ID, 12, True))
+        recurring_engine.forecast(USER_ID, 12, True)
+        cached_ms = timed(lambda: recurring_engine.forecast(USER_ID, 12, True))
+        print(f"{size:>9} {quarter_ms:>12.2f} {year_ms:>13.2f} {cached_ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
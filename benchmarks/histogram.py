@@ -0,0 +1,172 @@
+"""Benchmark get_histogram_data: per-bucket queries vs one grouped query.
+
+    python benchmarks/histogram.py [rows ...]
+
+Reports the number of queries and the median latency of every /statistics
+view for a single user holding 10k, 100k and 1M transactions.
+"""
+
+from datetime import date, datetime, time, timedelta
+
+from common import QueryCounter, make_database, seed_transactions, sizes_from_argv, timed
+
+
+USER_ID = 1
+
+
+def views(today):
+    """(view, start_date, labels) for the current period of every view"""
+    return [
+        ('daily', today - timedelta(days=today.weekday()),
+         ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']),
+        ('weekly', today.replace(day=1),
+         ['Week 1', 'Week 2', 'Week 3', 'Week 4', 'Week 5']),
+        ('monthly', today.replace(month=1, day=1),
+         ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']),
+        ('annual', today.replace(year=today.year - 10, month=1, day=1),
+         [str(today.year - i) for i in range(10, -1, -1)]),
+    ]
+
+
+def legacy_histogram(db, user_id, view, start_date, end_date, labels):
+    """The baseline get_histogram_data, verbatim except for the session lookup: two SUM queries per bucket"""
+    
+    if view == 'daily':
+        income_data = []
+        expense_data = []
+        current = start_date
+        
+        for label in labels:
+            day_end = current + timedelta(days=1)
+            
+            income = db.execute("""
+                SELECT COALESCE(SUM(amount), 0) as total
+                FROM transactions
+                WHERE user_id = ? AND type = 'INCOME'
+                AND time >= ? AND time < ?
+            """, user_id, current, day_end)[0]['total']
+            
+            expense = db.execute("""
+                SELECT COALESCE(SUM(amount), 0) as total
+                FROM transactions
+                WHERE user_id = ? AND type = 'EXPENSE'
+                AND time >= ? AND time < ?
+            """, user_id, current, day_end)[0]['total']
+            
+            income_data.append(float(income))
+            expense_data.append(float(expense))
+            current = day_end
+            
+    elif view == 'weekly':
+        income_data = []
+        expense_data = []
+        
+        for week_num in range(len(labels)):
+            week_start = start_date + timedelta(weeks=week_num)
+            week_end = week_start + timedelta(days=7)
+            
+            income = db.execute("""
+                SELECT COALESCE(SUM(amount), 0) as total
+                FROM transactions
+                WHERE user_id = ? AND type = 'INCOME'
+                AND time >= ? AND time < ?
+            """, user_id, week_start, week_end)[0]['total']
+            
+            expense = db.execute("""
+                SELECT COALESCE(SUM(amount), 0) as total
+                FROM transactions
+                WHERE user_id = ? AND type = 'EXPENSE'
+                AND time >= ? AND time < ?
+            """, user_id, week_start, week_end)[0]['total']
+            
+            income_data.append(float(income))
+            expense_data.append(float(expense))
+            
+    elif view == 'monthly':
+        income_data = []
+        expense_data = []
+        
+        for month in range(1, 13):
+            month_start = start_date.replace(month=month, day=1)
+            
+            income = db.execute("""
+                SELECT COALESCE(SUM(amount), 0) as total
+                FROM transactions
+                WHERE user_id = ? AND type = 'INCOME'
+                AND strftime('%Y-%m', time) = ?
+            """, user_id, month_start.strftime('%Y-%m'))[0]['total']
+            
+            expense = db.execute("""
+                SELECT COALESCE(SUM(amount), 0) as total
+                FROM transactions
+                WHERE user_id = ? AND type = 'EXPENSE'
+                AND strftime('%Y-%m', time) = ?
+            """, user_id, month_start.strftime('%Y-%m'))[0]['total']
+            
+            income_data.append(float(income))
+            expense_data.append(float(expense))
+            
+    else:  # annual
+        income_data = []
+        expense_data = []
+        
+        for year_label in labels:
+            income = db.execute("""
+                SELECT COALESCE(SUM(amount), 0) as total
+                FROM transactions
+                WHERE user_id = ? AND type = 'INCOME'
+                AND strftime('%Y', time) = ?
+            """, user_id, year_label)[0]['total']
+            
+            expense = db.execute("""
+                SELECT COALESCE(SUM(amount), 0) as total
+                FROM transactions
+                WHERE user_id = ? AND type = 'EXPENSE'
+                AND strftime('%Y', time) = ?
+            """, user_id, year_label)[0]['total']
+            
+            income_data.append(float(income))
+            expense_data.append(float(expense))
+    
+    return {
+        'labels': labels,
+        'income': income_data,
+        'expenses': expense_data
+    }
+
+
+def main():
+    path = make_database()
+    import helpers
+
+    helpers.upgrade_schema()
+    counter = QueryCounter(helpers.db)
+    helpers.db = counter
+    # From midnight, so the baseline's bucket edges (start_date plus whole days) match the new day buckets
+    today = datetime.combine(date.today(), time())
+    seeded = 0
+
+    print(f"{'rows':>9} {'view':>8} {'old q':>6} {'old ms':>9} {'new q':>6} {'new ms':>9}")
+    for size in sizes_from_argv([10_000, 100_000, 1_000_000]):
+        seed_transactions(path, USER_ID, size - seeded, seed=size)
+        seeded = size
+        helpers.rebuild_rollups()
+
+        for view, start_date, labels in views(today):
+            counter.count = 0
+            old = legacy_histogram(counter, USER_ID, view, start_date, today, labels)
+            old_queries = counter.count
+            old_ms = timed(lambda: legacy_histogram(counter, USER_ID, view, start_date, today, labels))
+
+            counter.count = 0
+            new = helpers.get_histogram_data(USER_ID, view, start_date, today, labels)
+            new_queries = counter.count
+            new_ms = timed(lambda: helpers.get_histogram_data(USER_ID, view, start_date, today, labels))
+
+            assert all(abs(a - b) < 0.01 for a, b in zip(old['income'] + old['expenses'],
+                                                           new['income'] + new['expenses']))
+            print(f"{size:>9} {view:>8} {old_queries:>6} {old_ms:>9.2f} {new_queries:>6} {new_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Benchmark /recurring/preview: stepping with calculate_next_date vs recurring_engine.
+
+    python benchmarks/preview.py [templates ...]
+
+For a user with the given number of active templates (mixed frequencies),
+times building a 12-month preview the old way: one dict per occurrence,
+sorted, then bucketed by month. It compares that with expand_recurring plus
+monthly_recurring_totals plus building the rows of one 50-item page.
+"""
+
+from datetime import date, datetime, timedelta
+
+import random
+
+from common import make_database, sizes_from_argv, timed
+
+
+MONTHS = 12
+PER_PAGE = 50
+FREQUENCIES = ['DAILY', 'WEEKLY', 'BIWEEKLY', 'MONTHLY', 'YEARLY']
+
+
+def make_templates(count, seed=42):
+    rng = random.Random(seed)
+    today = date.today()
+    return [{
+        'name': f"Template {i}",
+        'amount': round(rng.uniform(1, 500), 2),
+        'type': 'INCOME' if rng.random() < 0.2 else 'EXPENSE',
+        'category': 'Bills',
+        'frequency': rng.choice(FREQUENCIES),
+        'next_occurrence': str(today + timedelta(days=rng.randrange(31))),
+        'end_date': str(today + timedelta(days=rng.randrange(400))) if rng.random() < 0.2 else None
+    } for i in range(count)]
+
+
+def stepped(helpers, templates, end_preview):
+    """What preview_recurring did before: one calculate_next_date call and dict per occurrence"""
+    preview = []
+    for rt in templates:
+        current_date = datetime.fromisoformat(str(rt['next_occurrence'])).date()
+        end_date = datetime.fromisoformat(str(rt['end_date'])).date() if rt['end_date'] else None
+        while current_date <= end_preview:
+            if end_date and current_date > end_date:
+                break
+            preview.append({
+                'name': rt['name'], 'amount': float(rt['amount']), 'type': rt['type'],
+                'category': rt['category'], 'date': current_date,
+                'formatted_date': current_date.strftime('%b %d, %Y')
+            })
+            current_date = helpers.calculate_next_date(current_date, rt['frequency'])
+    preview.sort(key=lambda x: x['date'])
+
+    monthly_totals = {}
+    for item in preview:
+        totals = monthly_totals.setdefault(item['date'].strftime('%Y-%m'), {'income': 0, 'expense': 0})
+        totals['income' if item['type'] == 'INCOME' else 'expense'] += item['amount']
+    return len(preview)
+
+
+def vectorized(engine, templates, end_preview):
+    """expand_recurring + monthly totals + the rows of the first page"""
+    index, dates = engine.expand_recurring(templates, end_preview)
+    engine.monthly_recurring_totals(templates, index, dates)
+    preview = []
+    for i, day in zip(index[:PER_PAGE].tolist(), dates[:PER_PAGE].tolist()):
+        rt = templates[i]
+        preview.append({
+            'name': rt['name'], 'amount': float(rt['amount']), 'type': rt['type'],
+            'category': rt['category'], 'date': day, 'formatted_date': day.strftime('%b %d, %Y')
+        })
+    return len(dates)
+
+
+def main():
+    make_database()
+    import helpers
+    import recurring_engine
+
+    end_preview = date.today() + timedelta(days=MONTHS * 30)
+    print(f"{'templates':>9} {'occurrences':>12} {'stepped ms':>11} {'vector ms':>10}")
+    for size in sizes_from_argv([10, 100, 1_000, 10_000]):
+        templates = make_templates(size)
+        occurrences = vectorized(recurring_engine, templates, end_preview)
+        assert occurrences == stepped(helpers, templates, end_preview)
+        old_ms = timed(lambda: stepped(helpers, templates, end_preview))
+        new_ms = timed(lambda: vectorized(recurring_engine, templates, end_preview))
+        print(f"{size:>9} {occurrences:>12} {old_ms:>11.2f} {new_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
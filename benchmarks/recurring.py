@@ -0,0 +1,181 @@
+"""Benchmark recurring transaction catch-up.
+
+    python benchmarks/recurring.py [templates] [workers]
+
+Seeds 100k recurring templates across 5,000 users, each up to 60 days
+behind with a mix of frequencies and end dates. It first times one pass of
+the old processing loop, which creates a single occurrence per template,
+with its own statements and transaction per template. Then it times
+process_recurring_transactions catching up everything that is still
+missing. It reports occurrences per second for both, and checks that
+nothing is left due and that the rollups still match.
+
+The same catch-up also runs on copies of the database with several worker
+processes, first splitting the templates into shards by user and then
+with every worker competing for all of them. The second case should
+still create each occurrence exactly once.
+"""
+
+from datetime import date, timedelta
+
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from common import ROOT, make_database
+
+
+USERS = 5_000
+MAX_LAG_DAYS = 60
+FREQUENCIES = ['DAILY', 'WEEKLY', 'BIWEEKLY', 'MONTHLY', 'YEARLY']
+
+
+def seed_templates(path, count, seed=42):
+    """Insert `count` due templates spread across USERS users"""
+    rng = random.Random(seed)
+    today = date.today()
+
+    connection = sqlite3.connect(path)
+    connection.executemany(
+        "INSERT INTO users (id, username, hash) VALUES (?, ?, 'x')",
+        [(user_id, f"bench{user_id}") for user_id in range(1, USERS + 1)]
+    )
+
+    def rows():
+        for i in range(count):
+            next_occurrence = today - timedelta(days=rng.randrange(MAX_LAG_DAYS))
+            end_date = next_occurrence + timedelta(days=rng.randrange(90)) if rng.random() < 0.2 else None
+            yield (
+                rng.randint(1, USERS), f"Template {i}", round(rng.uniform(1, 500), 2),
+                'EXPENSE', 'Bills', rng.choice(FREQUENCIES),
+                next_occurrence, end_date, next_occurrence
+            )
+
+    connection.executemany("""
+        INSERT INTO recurring_transactions
+        (user_id, name, amount, type, category, frequency, start_date, end_date, next_occurrence)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows())
+    connection.commit()
+    connection.close()
+
+
+def legacy_pass(helpers):
+    """The loop process_recurring_transactions used to run: one occurrence per template"""
+    today = date.today()
+    due = helpers.db.execute("""
+        SELECT * FROM recurring_transactions
+        WHERE is_active = 1 AND next_occurrence <= ?
+    """, today)
+
+    for rt in due:
+        with helpers.db.transaction():
+            helpers.db.execute("""
+                INSERT INTO transactions
+                (user_id, name, amount, type, category, notes, is_recurring, recurring_template_id, time)
+                VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)
+            """, rt['user_id'], rt['name'], rt['amount'], rt['type'], rt['category'],
+                rt['notes'], rt['id'], rt['next_occurrence'])
+            helpers.record_rollup(rt['user_id'], rt['next_occurrence'], rt['type'], rt['category'], rt['amount'])
+
+            current = date.fromisoformat(str(rt['next_occurrence']))
+            helpers.db.execute(
+                "UPDATE recurring_transactions SET next_occurrence = ? WHERE id = ?",
+                helpers.calculate_next_date(current, rt['frequency']), rt['id']
+            )
+    return len(due)
+
+
+def copy_database(path):
+    """Back up the database into a new temporary directory and return that directory"""
+    directory = tempfile.mkdtemp(prefix="finance-bench-")
+    os.makedirs(os.path.join(directory, "Database"))
+    source = sqlite3.connect(path)
+    target = sqlite3.connect(os.path.join(directory, "Database", "finance.db"))
+    source.backup(target)
+    target.close()
+    source.close()
+    return directory
+
+
+def worker(directory, shard, shards):
+    """Run process_recurring_transactions in a fresh process against the copy in `directory`"""
+    os.chdir(directory)
+    sys.path.insert(0, ROOT)
+    import helpers
+
+    began = time.time()
+    created = helpers.process_recurring_transactions(shard=shard, shards=shards)
+    return created, began, time.time()
+
+
+def parallel(path, workers, sharded):
+    """Catch up a copy of the database with `workers` processes; returns (created, seconds, duplicates)"""
+    directory = copy_database(path)
+    jobs = [(directory, shard, workers) if sharded else (directory, 0, 1) for shard in range(workers)]
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        results = pool.starmap(worker, jobs)
+
+    connection = sqlite3.connect(os.path.join(directory, "Database", "finance.db"))
+    duplicates = connection.execute("""
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM transactions WHERE recurring_template_id IS NOT NULL
+            GROUP BY recurring_template_id, time HAVING COUNT(*) > 1
+        )
+    """).fetchone()[0]
+    connection.close()
+
+    created = sum(result[0] for result in results)
+    seconds = max(result[2] for result in results) - min(result[1] for result in results)
+    return created, seconds, duplicates
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    path = make_database()
+    seed_templates(path, count)
+
+    import helpers
+
+    helpers.upgrade_schema()
+
+    began = time.perf_counter()
+    legacy_created = legacy_pass(helpers)
+    legacy_s = time.perf_counter() - began
+
+    runs = {
+        f'{workers} sharded': parallel(path, workers, sharded=True),
+        f'{workers} competing': parallel(path, workers, sharded=False)
+    }
+
+    began = time.perf_counter()
+    created = helpers.process_recurring_transactions()
+    batch_s = time.perf_counter() - began
+
+    print(f"{count} templates across {USERS} users")
+    print(f"{'mode':>14} {'created':>9} {'seconds':>8} {'per sec':>9}")
+    print(f"{'one per pass':>14} {legacy_created:>9} {legacy_s:>8.2f} {legacy_created / legacy_s:>9.0f}")
+    print(f"{'catch-up':>14} {created:>9} {batch_s:>8.2f} {created / batch_s:>9.0f}")
+    for mode, (parallel_created, seconds, duplicates) in runs.items():
+        print(f"{mode:>14} {parallel_created:>9} {seconds:>8.2f} {parallel_created / seconds:>9.0f}  duplicates: {duplicates}")
+
+    left = helpers.db.execute("""
+        SELECT COUNT(*) as count FROM recurring_transactions
+        WHERE is_active = 1 AND next_occurrence <= ?
+        AND (end_date IS NULL OR next_occurrence <= end_date)
+    """, date.today())[0]['count']
+    past_end = helpers.db.execute("""
+        SELECT COUNT(*) as count FROM transactions
+        JOIN recurring_transactions r ON r.id = recurring_template_id
+        WHERE r.end_date IS NOT NULL AND transactions.time > r.end_date
+    """)[0]['count']
+    print(f"still due: {left}, created after end_date: {past_end}, rollup mismatches: {len(helpers.verify_rollups())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Benchmark /transactions search: LIKE scans vs the transactions_fts index.
+
+    python benchmarks/search.py [rows]
+
+Seeds one user with 1M transactions, backfills the full-text index, then
+times the first page and the summary of a search the way /transactions
+runs them, with the old `LIKE '%term%'` filter, the FTS5 filter and FTS5
+ranked by relevance.
+"""
+
+import sys
+import time
+
+from common import make_database, seed_transactions, timed
+
+
+USER_ID = 1
+TERMS = ["cash", "shop", "shared friends", "Transaction 4242", "nothing"]
+PER_PAGE = 20
+
+
+def like_search(db, term):
+    where = "user_id = ? AND (name LIKE ? OR notes LIKE ?)"
+    params = [USER_ID, f"%{term}%", f"%{term}%"]
+    return run(db, "transactions", where, params, "time DESC, id DESC")
+
+
+def fts_search(db, term):
+    from helpers import search_query
+
+    where = "+user_id = ? AND id IN (SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?)"
+    return run(db, "transactions", where, [USER_ID, search_query(term)], "time DESC, id DESC")
+
+
+def ranked_search(db, term):
+    from helpers import search_query
+
+    match = search_query(term)
+    rows = db.execute("""
+        SELECT id, name, amount, time, relevance
+        FROM transactions JOIN (
+            SELECT rowid as match_id, rank as relevance FROM transactions_fts WHERE transactions_fts MATCH ?
+        ) ON match_id = id
+        WHERE +user_id = ?
+        ORDER BY relevance, id
+        LIMIT ?
+    """, match, USER_ID, PER_PAGE)
+    count = db.execute(
+        "SELECT COUNT(*) as count FROM transactions WHERE +user_id = ? "
+        "AND id IN (SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?)",
+        USER_ID, match
+    )[0]['count']
+    return count, rows
+
+
+def run(db, from_clause, where, params, order):
+    """First page plus the summary count, as /transactions issues them"""
+    rows = db.execute(f"""
+        SELECT id, name, amount, time FROM {from_clause}
+        WHERE {where} ORDER BY {order} LIMIT ?
+    """, *params, PER_PAGE)
+    count = db.execute(f"SELECT COUNT(*) as count FROM {from_clause} WHERE {where}", *params)[0]['count']
+    return count, rows
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    path = make_database()
+    seed_transactions(path, USER_ID, rows)
+
+    import helpers
+
+    began = time.perf_counter()
+    helpers.upgrade_schema()
+    print(f"{rows} rows, schema upgrade and index backfill {time.perf_counter() - began:.1f}s")
+
+    print(f"{'term':>18} {'like n':>8} {'like ms':>9} {'fts n':>8} {'fts ms':>9} {'ranked ms':>10}")
+    for term in TERMS:
+        like_count, _ = like_search(helpers.db, term)
+        fts_count, _ = fts_search(helpers.db, term)
+        like_ms = timed(lambda: like_search(helpers.db, term))
+        fts_ms = timed(lambda: fts_search(helpers.db, term))
+        ranked_ms = timed(lambda: ranked_search(helpers.db, term))
+        print(f"{term:>18} {like_count:>8} {like_ms:>9.2f} {fts_count:>8} {fts_ms:>9.2f} {ranked_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Benchmark micro-batched transcription against one clip at a time.
+
+    python benchmarks/speech_batching.py speech.wav [clips per client]
+
+Needs the Whisper model (downloaded on first use, see whisper_models.py)
+and a short recording of someone speaking, decoded with speech.decode_audio
+the way /api/speech-to-text does. Starts the transcription workers once,
+then has 1, 4 and 16 clients each send the clip a few times in a row (4 by
+default) through transcription.transcribe, first with batching off
+(TRANSCRIBE_BATCH_SIZE=1) and then batched. Reports clips per second, p50
+and p95 latency per clip, and the mean batch size.
+"""
+
+import sys
+import threading
+import time
+
+from common import ROOT, percentile
+
+
+CLIENTS = [1, 4, 16]
+
+
+def run(transcription, audio, clients, per_client):
+    """(clips per second, latencies in ms, mean batch size) with `clients` concurrent senders"""
+    latencies, errors = [], []
+    before = transcription.transcription_stats()
+
+    def client(user_id):
+        for _ in range(per_client):
+            began = time.perf_counter()
+            try:
+                transcription.transcribe(user_id, audio, timeout=600)
+            except Exception as e:
+                errors.append(repr(e))
+                continue
+            latencies.append((time.perf_counter() - began) * 1000)
+
+    began = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(user_id,)) for user_id in range(1, clients + 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    if errors:
+        print(f"  {len(errors)} failed, e.g. {errors[0]}")
+    after = transcription.transcription_stats()
+    batches = after['batches'] - before['batches']
+    mean_batch = (after['batched_clips'] - before['batched_clips']) / batches if batches else 1.0
+    return len(latencies) / elapsed, latencies, mean_batch
+
+
+def main():
+    if len(sys.argv) < 2:
+        raise SystemExit(__doc__)
+    per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    import transcription
+    from speech import SPEECH_SAMPLE_RATE, decode_audio
+
+    with open(sys.argv[1], 'rb') as f:
+        audio, _ = decode_audio(f)
+    print(f"{len(audio) / SPEECH_SAMPLE_RATE:.1f}s clip, {transcription.TRANSCRIBE_WORKERS} worker(s), {per_client} clips per client")
+
+    # Room for every client's clip, one per user
+    transcription.TRANSCRIBE_QUEUE_SIZE = max(CLIENTS)
+    if not transcription.start_transcription_pool():
+        raise SystemExit("Whisper model could not be loaded")
+
+    batch_size = max(transcription.TRANSCRIBE_BATCH_SIZE, 2)
+    modes = [("one at a time", 1), (f"batched (<= {batch_size}, {transcription.TRANSCRIBE_BATCH_WAIT_MS:g} ms)", batch_size)]
+
+    print(f"{'mode':<28} {'clients':>7} {'clips/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'batch':>6}")
+    for name, size in modes:
+        transcription.TRANSCRIBE_BATCH_SIZE = size
+        # Warm this path up before timing it
+        transcription.transcribe(0, audio, timeout=600)
+        for clients in CLIENTS:
+            throughput, latencies, mean_batch = run(transcription, audio, clients, per_client)
+            print(f"{name:<28} {clients:>7} {throughput:>8.2f} {percentile(latencies, 50):>8.0f} {percentile(latencies, 95):>8.0f} {mean_batch:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+In-process cache for per-user aggregates.
+
+Entries are indexed by user, so everything cached for a user can be dropped
+without looking at anyone else's. They are evicted least-recently-used first
+once there are too many of them or their estimated size passes a memory cap.
+Each entry also expires after a fixed time to live.
+"""
+
+from collections import OrderedDict
+from time import monotonic
+
+import sys
+import threading
+
+
+MISSING = object()
+
+
+def sizeof(value):
+    """Rough size in bytes of a cached value, following lists, tuples and dicts"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(sizeof(item) for item in value)
+    return size
+
+
+class AggregateCache:
+    """LRU cache with a time to live, an entry limit and a memory cap"""
+
+    def __init__(self, max_entries=4096, ttl=300, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        # user_id -> the (user_id, key) entries cached for them
+        self._users = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, user_id, key):
+        """Return the cached value for (user_id, key), or MISSING"""
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is None:
+                self.misses += 1
+                return MISSING
+
+            expires, size, value = entry
+            if monotonic() >= expires:
+                self._remove((user_id, key))
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+
+            self._entries.move_to_end((user_id, key))
+            self.hits += 1
+            return value
+
+    def put(self, user_id, key, value):
+        """Cache value for (user_id, key), evicting old entries to stay within the limits"""
+        size = sizeof(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if (user_id, key) in self._entries:
+                self._remove((user_id, key))
+            self._entries[(user_id, key)] = (monotonic() + self.ttl, size, value)
+            self._users.setdefault(user_id, set()).add((user_id, key))
+            self.bytes += size
+
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def forget(self, user_id=None):
+        """Drop every entry for one user, or for everyone"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+                self._users.clear()
+                self.bytes = 0
+                return
+            for entry in list(self._users.get(user_id, ())):
+                self._remove(entry)
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+    def _remove(self, entry):
+        """Delete one entry; the caller holds the lock"""
+        _, size, _ = self._entries.pop(entry)
+        self.bytes -= size
+        keys = self._users[entry[0]]
+        keys.discard(entry)
+        if not keys:
+            del self._users[entry[0]]
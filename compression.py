@@ -0,0 +1,104 @@
+"""
+Gzip compression of responses.
+
+compress_response runs after every request. It gzips HTML, JSON, CSV and
+the other text types when the client accepts gzip. Buffered responses are
+compressed only from GZIP_MIN_SIZE bytes, where the saving is worth the CPU.
+Streamed responses (the CSV export) are compressed chunk by chunk as they
+are sent, since their size isn't known up front.
+Responses that are already encoded, partial, or files sent straight from
+disk are left alone.
+
+Static text files are compressed once instead, into .gz siblings
+(precompress_static, run at startup and by `flask precompress-static`), and
+serve_precompressed sends the .gz file to clients that accept it.
+"""
+
+from flask import current_app, request, send_file
+from werkzeug.security import safe_join
+
+import gzip
+import mimetypes
+import os
+
+from helpers import gzip_chunks
+
+
+GZIP_MIN_SIZE = int(os.environ.get("GZIP_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/csv', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml'
+}
+
+# Static files worth keeping a .gz copy of
+PRECOMPRESS_EXTENSIONS = ('.css', '.js', '.json', '.svg', '.txt', '.html')
+
+
+def compress_response(response):
+    """Gzip the response if the client accepts it and it's worth compressing"""
+    if (
+        response.status_code < 200 or response.status_code in (204, 206, 304)
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or 'Content-Encoding' in response.headers
+        or 'no-transform' in response.headers.get('Cache-Control', '')
+        or response.direct_passthrough
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if not request.accept_encodings['gzip']:
+        return response
+
+    if response.is_streamed:
+        response.response = gzip_chunks(response.iter_encoded(), GZIP_LEVEL)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < GZIP_MIN_SIZE:
+            return response
+        response.set_data(gzip.compress(data, GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def precompress_static(folder):
+    """Write a .gz copy of every compressible static file that lacks an up-to-date one; returns how many"""
+    written = 0
+    for directory, _, files in os.walk(folder):
+        for name in files:
+            if not name.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            path = os.path.join(directory, name)
+            compressed = path + '.gz'
+            if os.path.exists(compressed) and os.stat(compressed).st_mtime >= os.stat(path).st_mtime:
+                continue
+            with open(path, 'rb') as source:
+                data = gzip.compress(source.read(), 9, mtime=0)
+            # Written beside the target and renamed, so a concurrent request never sees half a file
+            with open(compressed + '.tmp', 'wb') as out:
+                out.write(data)
+            os.replace(compressed + '.tmp', compressed)
+            written += 1
+    return written
+
+
+def serve_precompressed():
+    """For a static file request from a gzip client, the .gz sibling if it's up to date, else None"""
+    if request.endpoint != 'static' or request.range or not request.accept_encodings['gzip']:
+        return None
+
+    path = safe_join(current_app.static_folder, request.view_args['filename'])
+    if path is None:
+        return None
+    compressed = path + '.gz'
+    if not os.path.isfile(path) or not os.path.isfile(compressed) or os.stat(compressed).st_mtime < os.stat(path).st_mtime:
+        return None
+
+    # Typed as the original file; send_file's ETag comes from the .gz file, so it differs from the plain one
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    response = send_file(os.path.abspath(compressed), mimetype=mimetype, conditional=True)
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
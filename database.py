@@ -0,0 +1,368 @@
+"""
+Thin data access layer on top of sqlite3.
+
+`SQL.execute` takes the same arguments and returns the same values as
+cs50.SQL.execute, so routes can keep calling `db.execute(sql, *args)`:
+
+- statements that return columns (SELECT, WITH, PRAGMA, ...) give a list of rows
+- INSERT gives the new row id (or None), UPDATE/DELETE the number of rows changed
+- constraint violations raise ValueError, other database errors RuntimeError
+
+Unlike cs50 it does not parse every statement with sqlparse or go through
+SQLAlchemy. Reads run on a connection checked out of a bounded pool for
+the statement and returned right after, each connection keeping its own
+prepared statement cache. Writes go through one shared writer connection, one at a
+time, so they never fight over SQLite's write lock. Callers can also ask
+for tuple or namedtuple rows, run executemany, and group statements into a
+transaction. A `db.read_only()` block checks a connection out of a
+separate pool of `mode=ro` connections and runs all of its statements on
+it, returning it when the block exits. `db.stream` walks a large result
+in batches on its own read-only connection, without loading all of it.
+
+Connections are set up from a pragma profile (see CONNECTION_PROFILES),
+chosen with the SQLITE_PROFILE environment variable.
+"""
+
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date, datetime, time
+from functools import lru_cache
+
+import os
+import sqlite3
+import threading
+
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///Database/finance.db")
+
+# Prepared statements kept per connection (sqlite3's own LRU cache)
+STATEMENT_CACHE_SIZE = 256
+
+CONNECTION_PROFILES = {
+    # SQLite's defaults: rollback journal, readers and the writer block each other
+    "rollback": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+    # Write-ahead log: readers keep reading while a write commits
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+CONNECTION_PROFILE = os.environ.get("SQLITE_PROFILE", "wal")
+
+# Reader connections kept open at most; a statement waits for a free one
+READ_POOL_SIZE = int(os.environ.get("SQLITE_READ_POOL_SIZE", 8))
+# The same for the mode=ro connections read_only() blocks use
+READONLY_POOL_SIZE = int(os.environ.get("SQLITE_READONLY_POOL_SIZE", 8))
+# Seconds a statement waits for a pooled connection before giving up
+POOL_TIMEOUT = float(os.environ.get("SQLITE_POOL_TIMEOUT", 30))
+
+# Rows fetched at a time by SQL.stream
+STREAM_BATCH_SIZE = 2000
+
+# Statements that never write and can run on a reader connection
+READ_COMMANDS = {"SELECT", "EXPLAIN", "VALUES"}
+
+# Store dates the same way cs50 did so existing rows and new rows compare equal
+sqlite3.register_adapter(datetime, lambda value: value.strftime("%Y-%m-%d %H:%M:%S"))
+sqlite3.register_adapter(date, lambda value: value.strftime("%Y-%m-%d"))
+sqlite3.register_adapter(time, lambda value: value.strftime("%H:%M:%S"))
+
+
+@lru_cache(maxsize=1024)
+def _command(sql):
+    """First keyword of a statement, upper-cased"""
+    stripped = sql.lstrip()
+    return stripped.split(None, 1)[0].upper() if stripped else ""
+
+
+@lru_cache(maxsize=1024)
+def _is_read(sql):
+    """Whether a statement only reads"""
+    command = _command(sql)
+    if command == "WITH":
+        upper = sql.upper()
+        return not any(keyword in upper for keyword in ("INSERT", "UPDATE", "DELETE", "REPLACE"))
+    return command in READ_COMMANDS
+
+
+@lru_cache(maxsize=256)
+def _row_class(columns):
+    """Namedtuple type for a result with the given column names"""
+    return namedtuple("Row", columns, rename=True)
+
+
+class ConnectionPool:
+    """
+    At most `size` connections, opened on demand by `connect`. A connection
+    is checked out for a statement (or a block) and checked back in after,
+    so the number open doesn't grow with the number of threads.
+    """
+
+    def __init__(self, connect, size, timeout=POOL_TIMEOUT):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0
+        self._closed = False
+        self._available = threading.Condition()
+
+    @contextmanager
+    def connection(self):
+        """Check a connection out for the block"""
+        connection = self.checkout()
+        try:
+            yield connection
+        finally:
+            self.checkin(connection)
+
+    def checkout(self):
+        """An idle connection, a new one if there's room, or the next one checked in"""
+        with self._available:
+            if not self._available.wait_for(lambda: self._idle or self._open < self.size, self.timeout):
+                raise RuntimeError(f"no database connection free after {self.timeout:g}s")
+            if self._idle:
+                return self._idle.pop()
+            self._open += 1
+        try:
+            return self._connect()
+        except BaseException:
+            with self._available:
+                self._open -= 1
+                self._available.notify()
+            raise
+
+    def checkin(self, connection):
+        """Return a checked-out connection; after close() it is closed instead"""
+        with self._available:
+            if self._closed:
+                self._open -= 1
+                connection.close()
+            else:
+                self._idle.append(connection)
+            self._available.notify()
+
+    def close(self):
+        """Close the idle connections; the checked-out ones are closed as they come back"""
+        with self._available:
+            self._closed = True
+            for connection in self._idle:
+                connection.close()
+            self._open -= len(self._idle)
+            self._idle = []
+
+
+class SQL:
+    """SQLite database with a cs50-compatible execute()"""
+
+    def __init__(self, url, rows="dict", profile=None):
+        if not url.startswith("sqlite:///"):
+            raise RuntimeError(f"unsupported database url: {url}")
+        self.path = url[len("sqlite:///"):]
+        self.rows = rows
+        self.profile = CONNECTION_PROFILES[profile or CONNECTION_PROFILE]
+        self._local = threading.local()
+        # Read-only connections opened outside the pool (streams), to close with the rest
+        self._connections = []
+        self._lock = threading.Lock()
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._readers = ConnectionPool(self._connect, READ_POOL_SIZE)
+        self._readonly = ConnectionPool(self._connect_readonly, READONLY_POOL_SIZE)
+
+    def _connect(self, readonly=False):
+        """Open a new connection to the database file and apply the pragma profile"""
+        mode = "ro" if readonly else "rw"
+        try:
+            connection = sqlite3.connect(
+                f"file:{self.path}?mode={mode}",
+                uri=True,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE
+            )
+        except sqlite3.OperationalError:
+            raise RuntimeError(f"does not exist: {self.path}") from None
+
+        for pragma, value in self.profile.items():
+            # The journal mode is a property of the file, set by the writer
+            if pragma == "journal_mode" and readonly:
+                continue
+            connection.execute(f"PRAGMA {pragma} = {value}")
+        return connection
+
+    def _connect_readonly(self):
+        """A new mode=ro connection, once the writer has set up the journal"""
+        self.writer()
+        return self._connect(readonly=True)
+
+    def writer(self):
+        """The single connection every write goes through"""
+        if self._writer is None:
+            with self._write_lock:
+                if self._writer is None:
+                    self._writer = self._connect()
+        return self._writer
+
+    @contextmanager
+    def connection(self):
+        """The connection this thread's next read should use, for the block"""
+        if getattr(self._local, "write_depth", 0):
+            yield self.writer()
+            return
+
+        connection = getattr(self._local, "readonly_connection", None)
+        if connection is not None:
+            yield connection
+            return
+
+        with self._readers.connection() as connection:
+            yield connection
+
+    def execute(self, sql, *args, rows=None):
+        """Run one statement and return its result the way cs50.SQL does"""
+        if _is_read(sql) or getattr(self._local, "readonly_connection", None) is not None:
+            with self.connection() as connection:
+                cursor = self._run(connection.execute, sql, args)
+                if cursor.description is not None:
+                    return self._rows(cursor, rows or self.rows)
+        else:
+            with self._write_lock:
+                cursor = self._run(self.writer().execute, sql, args)
+                if cursor.description is not None:
+                    return self._rows(cursor, rows or self.rows)
+                lastrowid, rowcount = cursor.lastrowid, cursor.rowcount
+
+            command = _command(sql)
+            if command in ("INSERT", "REPLACE"):
+                return lastrowid if rowcount == 1 else None
+            elif command in ("UPDATE", "DELETE"):
+                return rowcount
+        return True
+
+    def executemany(self, sql, seq_of_args):
+        """Run one statement for every tuple of arguments, returning the rows changed"""
+        with self._write_lock:
+            return self._run(self.writer().executemany, sql, seq_of_args).rowcount
+
+    def stream(self, sql, *args, size=STREAM_BATCH_SIZE):
+        """
+        Run a query and yield its rows as lists of up to `size` tuples.
+
+        The query runs on a read-only connection of its own, which is closed
+        when the generator finishes or is closed, so a long export can be
+        sent while it is read without holding the whole result in memory.
+        """
+        connection = self._connect(readonly=True)
+        with self._lock:
+            self._connections.append(connection)
+        try:
+            cursor = self._run(connection.execute, sql, args)
+            while True:
+                rows = cursor.fetchmany(size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            with self._lock:
+                self._connections.remove(connection)
+            connection.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run the statements in the block atomically on the writer connection.
+
+        The writer stays reserved for this thread until the block ends, so the
+        block's reads see its own uncommitted writes. Nested blocks become
+        savepoints, so helpers can open their own transaction whether or not
+        the caller already has one.
+        """
+        with self._write_lock:
+            connection = self.writer()
+            depth = getattr(self._local, "write_depth", 0)
+            self._local.write_depth = depth + 1
+            try:
+                if depth:
+                    name = f"sp_{depth}"
+                    connection.execute(f"SAVEPOINT {name}")
+                    try:
+                        yield self
+                    except BaseException:
+                        connection.execute(f"ROLLBACK TO {name}")
+                        connection.execute(f"RELEASE {name}")
+                        raise
+                    connection.execute(f"RELEASE {name}")
+                else:
+                    connection.execute("BEGIN IMMEDIATE")
+                    try:
+                        yield self
+                    except BaseException:
+                        connection.execute("ROLLBACK")
+                        raise
+                    connection.execute("COMMIT")
+            finally:
+                self._local.write_depth = depth
+
+    @contextmanager
+    def read_only(self):
+        """Run this thread's statements on a mode=ro connection checked out of its pool for the block"""
+        if getattr(self._local, "readonly_connection", None) is not None:
+            yield self
+            return
+
+        with self._readonly.connection() as connection:
+            self._local.readonly_connection = connection
+            try:
+                yield self
+            finally:
+                self._local.readonly_connection = None
+
+    def close(self):
+        """Close every connection opened by this object"""
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+            self._readers.close()
+            self._readers = ConnectionPool(self._connect, READ_POOL_SIZE)
+            self._readonly.close()
+            self._readonly = ConnectionPool(self._connect_readonly, READONLY_POOL_SIZE)
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = None
+        self._local = threading.local()
+
+    @staticmethod
+    def _run(method, sql, args):
+        """Call a cursor method, translating errors the way cs50 does"""
+        try:
+            return method(sql, args)
+        except sqlite3.IntegrityError as e:
+            raise ValueError(str(e)) from None
+        except (sqlite3.OperationalError, sqlite3.ProgrammingError) as e:
+            raise RuntimeError(str(e)) from None
+
+    @staticmethod
+    def _rows(cursor, kind):
+        """Fetch all rows as dicts, tuples or namedtuples"""
+        results = cursor.fetchall()
+        if kind == "tuple":
+            return results
+
+        columns = tuple(column[0] for column in cursor.description)
+        if kind == "namedtuple":
+            row = _row_class(columns)
+            return [row._make(result) for result in results]
+        return [dict(zip(columns, result)) for result in results]
+
+
+db = SQL(DATABASE_URL)
@@ -1,18 +1,114 @@
-from datetime import datetime, timedelta
-from cs50 import SQL
-from faster_whisper import WhisperModel
-from flask import redirect, render_template, session
+from cache import MISSING, AggregateCache
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from database import db
+from flask import flash, redirect, render_template, session
 from functools import wraps
 
+import base64
+import csv
+import io
+import json
+import re
+import time
+import zlib
+
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'pdf'}
 
-db = SQL("sqlite:///Database/finance.db")
+# Tables and indexes added after the original schema, applied by upgrade_schema()
+SCHEMA_UPGRADES = [
+    """
+    CREATE TABLE IF NOT EXISTS daily_rollups (
+        user_id INTEGER NOT NULL,
+        day DATE NOT NULL,
+        type TEXT NOT NULL CHECK(type IN ('EXPENSE', 'INCOME')),
+        category TEXT NOT NULL,
+        total NUMERIC NOT NULL DEFAULT 0,
+        count INTEGER NOT NULL DEFAULT 0,
+        min_amount NUMERIC,
+        max_amount NUMERIC,
+        PRIMARY KEY (user_id, day, type, category)
+    ) WITHOUT ROWID
+    """,
+    # Keyset pagination of /transactions sorted by amount
+    "CREATE INDEX IF NOT EXISTS idx_transaction_amount ON transactions(user_id, amount)",
+    # Full-text index over transaction names and notes, kept in step with the
+    # transactions table by the triggers below (see rebuild_search_index)
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+        name, notes,
+        content='transactions', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+        INSERT INTO transactions_fts (rowid, name, notes) VALUES (new.id, new.name, new.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, name, notes) VALUES ('delete', old.id, old.name, old.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF name, notes ON transactions BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, name, notes) VALUES ('delete', old.id, old.name, old.notes);
+        INSERT INTO transactions_fts (rowid, name, notes) VALUES (new.id, new.name, new.notes);
+    END
+    """,
+    # Bumped on every write to a user's data, part of the aggregate cache key
+    """
+    CREATE TABLE IF NOT EXISTS user_data_versions (
+        user_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    # One transaction per template and date, so an occurrence can't be created twice
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_recurring_occurrence
+    ON transactions(recurring_template_id, time) WHERE recurring_template_id IS NOT NULL
+    """,
+    # Named leases so only one process at a time runs a background job
+    """
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    """,
+]
+
+# Columns added to existing tables after they were first created: (table, column, definition)
+COLUMN_UPGRADES = [
+    ('daily_rollups', 'min_amount', 'NUMERIC'),
+    ('daily_rollups', 'max_amount', 'NUMERIC'),
+]
+
+# Recurring templates written per database transaction, and the most
+# occurrences one template can catch up on in a single run
+RECURRING_BATCH_SIZE = 500
+RECURRING_CATCH_UP_LIMIT = 5000
+
+# Column each /transactions sort orders by, ties broken by id. FTS5 ranks
+# better matches lower, so relevance is ascending.
+TRANSACTION_SORTS = {
+    'date-desc': ('time', 'DESC'),
+    'date-asc': ('time', 'ASC'),
+    'amount-desc': ('amount', 'DESC'),
+    'amount-asc': ('amount', 'ASC'),
+    'relevance': ('relevance', 'ASC'),
+}
 
-WHISPER_MODEL = "base" 
-USE_FASTER_WHISPER = True
-global whisper_model
-whisper_model = None
+# bm25 column weights for search ranking: a hit in the name counts more than one in the notes
+SEARCH_RANK = "bm25(10.0, 1.0)"
+
+# Memoized per-user aggregates, see per_user_cache()
+AGGREGATE_CACHE_ENTRIES = 4096
+AGGREGATE_CACHE_TTL = 300
+AGGREGATE_CACHE_BYTES = 64 * 1024 * 1024
+aggregate_cache = AggregateCache(AGGREGATE_CACHE_ENTRIES, AGGREGATE_CACHE_TTL, AGGREGATE_CACHE_BYTES)
 
 
 def apg(message, code=400):
@@ -56,6 +152,45 @@ def login_required(f):
     return decorated_function
 
 
+def read_only(f):
+    """
+    Decorate routes that only read, so their queries use the read-only connection pool.
+
+    They never wait behind the writer, and an accidental write fails loudly.
+    """
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with db.read_only():
+            return f(*args, **kwargs)
+
+    return decorated_function
+
+
+def per_user_cache(f):
+    """
+    Memoize f(user_id, *args) in aggregate_cache.
+
+    The key includes the user's data version (so any write makes old results
+    unreachable) and today's date (for functions relative to the current
+    month). Cached results are shared, so callers must not modify them.
+    """
+    @wraps(f)
+    def decorated_function(user_id, *args):
+        key = (
+            f.__name__,
+            tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args),
+            date.today(),
+            get_data_version(user_id)
+        )
+        value = aggregate_cache.get(user_id, key)
+        if value is MISSING:
+            value = f(user_id, *args)
+            aggregate_cache.put(user_id, key, value)
+        return value
+    return decorated_function
+
+
 def usd(value):
     """Format value as USD."""
     return f"${value:,.2f}"
@@ -64,206 +199,448 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def check_budget_warning(category, amount):
-    """Check if transaction exceeds budget and send warning"""
-    user_id = session["user_id"]
-    monthly_budget = db.execute("""
-        SELECT amount, period, start_date
-        FROM budgets
-        WHERE user_id = ?
-        AND period = 'MONTHLY'
-        AND is_active = 1
-    """, user_id)
-    
-    if monthly_budget:
-        budget_amount = monthly_budget[0]['amount']
-        
-        current_spending = db.execute("""
-            SELECT COALESCE(SUM(amount), 0) as total
-            FROM transactions
-            WHERE user_id = ?
-            AND type = 'EXPENSE'
-            AND strftime('%Y-%m', time) = strftime('%Y-%m', 'now')
+def to_day(value):
+    """Format a date/datetime (or ISO string) as a YYYY-MM-DD day key"""
+    if isinstance(value, str):
+        return value[:10]
+    return value.strftime('%Y-%m-%d')
+
+
+def period_bounds(period, reference=None, offset=0):
+    """
+    Return the [start, end) dates of the WEEKLY, MONTHLY or YEARLY period containing `reference`.
+
+    `offset` moves by whole periods, e.g. offset=-1 gives the previous month.
+    Comparing a column against both bounds keeps the filter an index range search.
+    """
+    reference = reference or datetime.now()
+    day = reference.date() if isinstance(reference, datetime) else reference
+
+    if period == 'WEEKLY':
+        start = day - timedelta(days=day.weekday()) + timedelta(weeks=offset)
+        return start, start + timedelta(weeks=1)
+    elif period == 'MONTHLY':
+        months = day.year * 12 + day.month - 1 + offset
+        start = date(months // 12, months % 12 + 1, 1)
+        end = date((months + 1) // 12, (months + 1) % 12 + 1, 1)
+        return start, end
+    elif period == 'YEARLY':
+        return date(day.year + offset, 1, 1), date(day.year + offset + 1, 1, 1)
+
+    raise ValueError(f"Unknown period: {period}")
+
+
+def get_period_spending(user_id, period, bounds=None):
+    """Total expenses in the current week, month or year; pass `bounds` if the caller already has period_bounds(period)"""
+    start, end = bounds or period_bounds(period)
+    return db.execute("""
+        SELECT COALESCE(SUM(total), 0) as total
+        FROM daily_rollups
+        WHERE user_id = ? AND type = 'EXPENSE'
+        AND day >= ? AND day < ?
+    """, user_id, to_day(start), to_day(end))[0]['total']
+
+
+def upgrade_schema():
+    """Create any tables added since the database was first set up"""
+    existing = {row['name'] for row in db.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")}
+
+    if 'idx_recurring_occurrence' not in existing:
+        unlink_duplicate_occurrences()
+
+    for statement in SCHEMA_UPGRADES:
+        db.execute(statement)
+
+    added = set()
+    for table, column, definition in COLUMN_UPGRADES:
+        if column not in {row['name'] for row in db.execute(f"PRAGMA table_info({table})")}:
+            db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            added.add(table)
+
+    if 'daily_rollups' not in existing or 'daily_rollups' in added:
+        rebuild_rollups()
+    if 'transactions_fts' not in existing:
+        rebuild_search_index()
+
+
+def unlink_duplicate_occurrences():
+    """
+    Older versions could create the same recurring occurrence more than once
+    when several workers ran at the same time. Keep the first copy linked to
+    its template and detach the others (they stay in the user's history), so
+    the unique index on (recurring_template_id, time) can be built.
+    """
+    unlinked = db.execute("""
+        UPDATE transactions SET recurring_template_id = NULL
+        WHERE recurring_template_id IS NOT NULL
+        AND id NOT IN (
+            SELECT MIN(id) FROM transactions
+            WHERE recurring_template_id IS NOT NULL
+            GROUP BY recurring_template_id, time
+        )
+    """)
+    if unlinked:
+        print(f"Detached {unlinked} duplicate recurring transactions from their templates")
+
+
+def get_data_version(user_id):
+    """Current version of a user's data; changes whenever bump_data_version() runs"""
+    row = db.execute("SELECT version FROM user_data_versions WHERE user_id = ?", user_id)
+    return row[0]['version'] if row else 0
+
+
+def bump_data_version(user_id=None):
+    """Mark one user's data (or everyone's) as changed, invalidating their cached aggregates"""
+    if user_id is None:
+        db.execute("""
+            INSERT INTO user_data_versions (user_id, version)
+            SELECT id, 1 FROM users WHERE true
+            ON CONFLICT(user_id) DO UPDATE SET version = version + 1
+        """)
+    else:
+        db.execute("""
+            INSERT INTO user_data_versions (user_id, version) VALUES (?, 1)
+            ON CONFLICT(user_id) DO UPDATE SET version = version + 1
         """, user_id)
-        
-        total = current_spending[0]['total'] + amount
-        percentage = (total / budget_amount) * 100
-        remaining = budget_amount - total
-        
-        if percentage >= 100:
-            flash(f"🚨 Budget Alert: You've exceeded your monthly budget by ${abs(remaining):.2f}!", "danger")
-        elif percentage >= 90:
-            flash(f"⚠️ Budget Warning: You've used {percentage:.0f}% of your monthly budget. Only ${remaining:.2f} remaining!", "warning")
-        elif percentage >= 75:
-            flash(f"💡 Budget Notice: You've used {percentage:.0f}% of your monthly budget (${remaining:.2f} left).", "info")
-        
-        return
-    
-    weekly_budget = db.execute("""
-        SELECT amount, period
-        FROM budgets
-        WHERE user_id = ?
-        AND period = 'WEEKLY'
-        AND is_active = 1
-    """, user_id)
-    
-    if weekly_budget:
-        budget_amount = weekly_budget[0]['amount']
-        
-        current_spending = db.execute("""
-            SELECT COALESCE(SUM(amount), 0) as total
+    aggregate_cache.forget(user_id)
+
+
+def acquire_lease(name, holder, seconds):
+    """
+    Take (or renew) the lease `name` for `seconds` if it is free, expired or
+    already held by `holder`. Returns whether `holder` now holds it.
+    """
+    now = time.time()
+    with db.transaction():
+        db.execute("""
+            INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+            WHERE expires_at < ? OR holder = excluded.holder
+        """, name, holder, now + seconds, now)
+        lease = db.execute("SELECT holder FROM leases WHERE name = ?", name)
+    return lease[0]['holder'] == holder
+
+
+def release_lease(name, holder):
+    """Give up the lease `name` if `holder` still holds it"""
+    db.execute("DELETE FROM leases WHERE name = ? AND holder = ?", name, holder)
+
+
+def record_rollup(user_id, time, transaction_type, category, amount, count=1):
+    """
+    Add (or, with a negative amount and count, remove) a transaction from the daily rollups.
+
+    Call it after the transactions table has been changed: a removal
+    recomputes the group's min/max from the rows that are left.
+    """
+    record_rollups([(user_id, time, transaction_type, category, amount, count)])
+
+    if count < 0:
+        refresh_rollup_groups([(user_id, time, transaction_type, category)])
+
+
+def refresh_rollup_groups(groups):
+    """
+    After removals, drop the (user_id, time, type, category) rollup groups left
+    empty and recompute the min/max of the rest from the remaining transactions.
+    """
+    keys = list({(user_id, to_day(time), transaction_type, category) for user_id, time, transaction_type, category in groups})
+    db.executemany("""
+        DELETE FROM daily_rollups
+        WHERE user_id = ? AND day = DATE(?) AND type = ? AND category = ?
+        AND count <= 0
+    """, keys)
+    db.executemany("""
+        UPDATE daily_rollups
+        SET (min_amount, max_amount) = (
+            SELECT MIN(amount), MAX(amount) FROM transactions
+            WHERE user_id = daily_rollups.user_id AND type = daily_rollups.type
+            AND category = daily_rollups.category
+            AND time >= daily_rollups.day AND time < DATE(daily_rollups.day, '+1 day')
+        )
+        WHERE user_id = ? AND day = DATE(?) AND type = ? AND category = ?
+    """, keys)
+
+
+def record_rollups(entries):
+    """
+    Apply many (user_id, time, type, category, amount, count) changes to the daily rollups at once.
+
+    Removals (negative counts) only adjust totals here; record_rollup()
+    also fixes the group's min/max afterwards.
+    """
+    for user_id in {entry[0] for entry in entries}:
+        bump_data_version(user_id)
+
+    db.executemany("""
+        INSERT INTO daily_rollups (user_id, day, type, category, total, count, min_amount, max_amount)
+        VALUES (?, DATE(?), ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, day, type, category) DO UPDATE
+        SET total = total + excluded.total, count = count + excluded.count,
+            min_amount = COALESCE(MIN(min_amount, excluded.min_amount), min_amount),
+            max_amount = COALESCE(MAX(max_amount, excluded.max_amount), max_amount)
+    """, [
+        (user_id, to_day(time), transaction_type, category, amount, count,
+         amount if count > 0 else None, amount if count > 0 else None)
+        for user_id, time, transaction_type, category, amount, count in entries
+    ])
+
+
+def rebuild_rollups(user_id=None):
+    """Recompute the daily rollups (for one user, or everyone) from the transactions table"""
+    user_filter = "" if user_id is None else "WHERE user_id = ?"
+    params = [] if user_id is None else [user_id]
+
+    with db.transaction():
+        bump_data_version(user_id)
+        db.execute(f"DELETE FROM daily_rollups {user_filter}", *params)
+        db.execute(f"""
+            INSERT INTO daily_rollups (user_id, day, type, category, total, count, min_amount, max_amount)
+            SELECT user_id, DATE(time), type, category, SUM(amount), COUNT(*), MIN(amount), MAX(amount)
             FROM transactions
-            WHERE user_id = ?
-            AND type = 'EXPENSE'
-            AND strftime('%Y-%W', time) = strftime('%Y-%W', 'now')
-        """, user_id)
-        
-        total = current_spending[0]['total'] + amount
-        percentage = (total / budget_amount) * 100
-        remaining = budget_amount - total
-        
-        if percentage >= 100:
-            flash(f"🚨 Budget Alert: You've exceeded your weekly budget by ${abs(remaining):.2f}!", "danger")
-        elif percentage >= 90:
-            flash(f"⚠️ Budget Warning: You've used {percentage:.0f}% of your weekly budget. Only ${remaining:.2f} remaining!", "warning")
-        elif percentage >= 75:
-            flash(f"💡 Budget Notice: You've used {percentage:.0f}% of your weekly budget (${remaining:.2f} left).", "info")
-        
-        return
-    
-    yearly_budget = db.execute("""
-        SELECT amount, period
-        FROM budgets
-        WHERE user_id = ?
-        AND period = 'YEARLY'
-        AND is_active = 1
-    """, user_id)
-    
-    if yearly_budget:
-        budget_amount = yearly_budget[0]['amount']
-        
-        current_spending = db.execute("""
-            SELECT COALESCE(SUM(amount), 0) as total
+            {user_filter}
+            GROUP BY user_id, DATE(time), type, category
+        """, *params)
+
+
+def rebuild_search_index():
+    """Re-index every transaction's name and notes in transactions_fts"""
+    with db.transaction():
+        db.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+        db.execute("INSERT INTO transactions_fts (transactions_fts, rank) VALUES ('rank', ?)", SEARCH_RANK)
+        db.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('optimize')")
+
+
+@contextmanager
+def bulk_transactions():
+    """
+    Inside a db.transaction(), for inserting many transactions at once: the
+    rows inserted in the block get their search index entries and daily
+    rollups with one statement each at the end, instead of a trigger call and
+    a record_rollup() per row. Callers must not call record_rollup() for them.
+
+    FTS5 is several times faster fed in bulk. The search index insert trigger
+    is dropped for the block and recreated before it ends; schema changes
+    are part of the transaction, so other connections never see it missing.
+    """
+    trigger = db.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'transactions_fts_insert'")
+    last_id = db.execute("SELECT COALESCE(MAX(id), 0) as id FROM transactions")[0]['id']
+    db.execute("DROP TRIGGER IF EXISTS transactions_fts_insert")
+    try:
+        yield
+    finally:
+        if trigger:
+            db.execute(trigger[0]['sql'])
+
+    db.execute("INSERT INTO transactions_fts (rowid, name, notes) SELECT id, name, notes FROM transactions WHERE id > ?", last_id)
+    db.execute("""
+        INSERT INTO daily_rollups (user_id, day, type, category, total, count, min_amount, max_amount)
+        SELECT user_id, DATE(time), type, category, SUM(amount), COUNT(*), MIN(amount), MAX(amount)
+        FROM transactions
+        WHERE id > ?
+        GROUP BY user_id, DATE(time), type, category
+        ON CONFLICT(user_id, day, type, category) DO UPDATE
+        SET total = total + excluded.total, count = count + excluded.count,
+            min_amount = COALESCE(MIN(min_amount, excluded.min_amount), min_amount),
+            max_amount = COALESCE(MAX(max_amount, excluded.max_amount), max_amount)
+    """, last_id)
+    for row in db.execute("SELECT DISTINCT user_id FROM transactions WHERE id > ?", last_id):
+        bump_data_version(row['user_id'])
+
+
+def search_query(text):
+    """Turn free text into an FTS5 query where every word must match as a prefix"""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+
+def verify_rollups(user_id=None):
+    """Return the rollup rows that disagree with the transactions table"""
+    user_filter = "" if user_id is None else "WHERE user_id = ?"
+    params = [] if user_id is None else [user_id]
+
+    return db.execute(f"""
+        WITH actual AS (
+            SELECT user_id, DATE(time) as day, type, category,
+                   SUM(amount) as total, COUNT(*) as count,
+                   MIN(amount) as min_amount, MAX(amount) as max_amount
             FROM transactions
+            {user_filter}
+            GROUP BY user_id, DATE(time), type, category
+        ),
+        stored AS (
+            SELECT user_id, day, type, category, total, count, min_amount, max_amount
+            FROM daily_rollups
+            {user_filter}
+        )
+        SELECT a.user_id, a.day, a.type, a.category,
+               a.total as expected_total, s.total as stored_total,
+               a.count as expected_count, s.count as stored_count
+        FROM actual a
+        LEFT JOIN stored s
+            ON s.user_id = a.user_id AND s.day = a.day AND s.type = a.type AND s.category = a.category
+        WHERE s.user_id IS NULL OR s.count != a.count OR ABS(s.total - a.total) > 0.005
+        OR s.min_amount IS NOT a.min_amount OR s.max_amount IS NOT a.max_amount
+        UNION ALL
+        SELECT s.user_id, s.day, s.type, s.category,
+               NULL, s.total, NULL, s.count
+        FROM stored s
+        LEFT JOIN actual a
+            ON s.user_id = a.user_id AND s.day = a.day AND s.type = a.type AND s.category = a.category
+        WHERE a.user_id IS NULL
+    """, *params, *params)
+
+
+def csv_chunks(header, batches):
+    """Yield CSV-encoded bytes: the header row, then one chunk per batch of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of byte chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def encode_cursor(sort, direction, row, page):
+    """Opaque /transactions page token pointing just past (or before) `row`"""
+    column = TRANSACTION_SORTS[sort][0]
+    payload = json.dumps([sort, direction, row[column], row['id'], page], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, sort):
+    """Return (direction, key value, id, page) from a cursor, or None if it is missing or made for another sort"""
+    if not token:
+        return None
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        cursor_sort, direction, value, row_id, page = json.loads(payload)
+    except (ValueError, TypeError):
+        return None
+    if cursor_sort != sort or direction not in ('next', 'prev') or not isinstance(row_id, int) or not isinstance(page, int):
+        return None
+    return direction, value, row_id, max(page, 1)
+
+
+@per_user_cache
+def get_transaction_summary(user_id, where_clause, params):
+    """Count and income/expense totals of the transactions matching a /transactions filter set"""
+    summary = db.execute(f"""
+        SELECT
+            COALESCE(SUM(CASE WHEN type = 'INCOME' THEN amount ELSE 0 END), 0) as total_income,
+            COALESCE(SUM(CASE WHEN type = 'EXPENSE' THEN amount ELSE 0 END), 0) as total_expense,
+            COUNT(*) as count
+        FROM transactions
+        WHERE {where_clause}
+    """, *params)[0]
+    summary['net'] = summary['total_income'] - summary['total_expense']
+    return summary
+
+
+def budget_warning(user_id, amount=0):
+    """
+    The alert for the user's active budget once `amount` more is spent, as
+    {'period', 'level', 'percentage', 'message'}, or None below 75%.
+    A monthly budget is checked first, then weekly, then yearly.
+    """
+    for period in ('MONTHLY', 'WEEKLY', 'YEARLY'):
+        budget = db.execute("""
+            SELECT amount
+            FROM budgets
             WHERE user_id = ?
-            AND type = 'EXPENSE'
-            AND strftime('%Y', time) = strftime('%Y', 'now')
-        """, user_id)
-        
-        total = current_spending[0]['total'] + amount
+            AND period = ?
+            AND is_active = 1
+        """, user_id, period)
+        if not budget:
+            continue
+
+        budget_amount = budget[0]['amount']
+        total = get_period_spending(user_id, period) + amount
         percentage = (total / budget_amount) * 100
         remaining = budget_amount - total
-        
+        name = period.lower()
+
         if percentage >= 100:
-            flash(f"🚨 Budget Alert: You've exceeded your yearly budget by ${abs(remaining):.2f}!", "danger")
+            level, message = "danger", f"🚨 Budget Alert: You've exceeded your {name} budget by ${abs(remaining):.2f}!"
         elif percentage >= 90:
-            flash(f"⚠️ Budget Warning: You've used {percentage:.0f}% of your yearly budget. Only ${remaining:.2f} remaining!", "warning")
+            level, message = "warning", f"⚠️ Budget Warning: You've used {percentage:.0f}% of your {name} budget. Only ${remaining:.2f} remaining!"
         elif percentage >= 75:
-            flash(f"💡 Budget Notice: You've used {percentage:.0f}% of your yearly budget (${remaining:.2f} left).", "info")
+            level, message = "info", f"💡 Budget Notice: You've used {percentage:.0f}% of your {name} budget (${remaining:.2f} left)."
+        else:
+            return None
+        return {'period': period, 'level': level, 'percentage': round(percentage, 2), 'message': message}
 
+    return None
+
+
+def check_budget_warning(category, amount):
+    """Check if transaction exceeds budget and send warning"""
+    warning = budget_warning(session["user_id"], amount)
+    if warning:
+        flash(warning['message'], warning['level'])
+
+
+def get_histogram_buckets(view, start_date, labels):
+    """Return the [start, end) date range of every histogram bucket"""
+    first_day = start_date.date() if isinstance(start_date, datetime) else start_date
 
-def get_histogram_data(user_id, view, start_date, end_date, labels):
-    """Generate histogram data based on view type"""
-    user_id = session["user_id"]
-    
     if view == 'daily':
-        income_data = []
-        expense_data = []
-        current = start_date
-        
-        for label in labels:
-            day_end = current + timedelta(days=1)
-            
-            income = db.execute("""
-                SELECT COALESCE(SUM(amount), 0) as total
-                FROM transactions
-                WHERE user_id = ? AND type = 'INCOME'
-                AND time >= ? AND time < ?
-            """, user_id, current, day_end)[0]['total']
-            
-            expense = db.execute("""
-                SELECT COALESCE(SUM(amount), 0) as total
-                FROM transactions
-                WHERE user_id = ? AND type = 'EXPENSE'
-                AND time >= ? AND time < ?
-            """, user_id, current, day_end)[0]['total']
-            
-            income_data.append(float(income))
-            expense_data.append(float(expense))
-            current = day_end
-            
+        return [(first_day + timedelta(days=i), first_day + timedelta(days=i + 1))
+                for i in range(len(labels))]
+
     elif view == 'weekly':
-        income_data = []
-        expense_data = []
-        
-        for week_num in range(len(labels)):
-            week_start = start_date + timedelta(weeks=week_num)
-            week_end = week_start + timedelta(days=7)
-            
-            income = db.execute("""
-                SELECT COALESCE(SUM(amount), 0) as total
-                FROM transactions
-                WHERE user_id = ? AND type = 'INCOME'
-                AND time >= ? AND time < ?
-            """, user_id, week_start, week_end)[0]['total']
-            
-            expense = db.execute("""
-                SELECT COALESCE(SUM(amount), 0) as total
-                FROM transactions
-                WHERE user_id = ? AND type = 'EXPENSE'
-                AND time >= ? AND time < ?
-            """, user_id, week_start, week_end)[0]['total']
-            
-            income_data.append(float(income))
-            expense_data.append(float(expense))
-            
+        return [(first_day + timedelta(weeks=i), first_day + timedelta(weeks=i + 1))
+                for i in range(len(labels))]
+
     elif view == 'monthly':
-        income_data = []
-        expense_data = []
-        
-        for month in range(1, 13):
-            month_start = start_date.replace(month=month, day=1)
-            month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            
-            income = db.execute("""
-                SELECT COALESCE(SUM(amount), 0) as total
-                FROM transactions
-                WHERE user_id = ? AND type = 'INCOME'
-                AND strftime('%Y-%m', time) = ?
-            """, user_id, month_start.strftime('%Y-%m'))[0]['total']
-            
-            expense = db.execute("""
-                SELECT COALESCE(SUM(amount), 0) as total
-                FROM transactions
-                WHERE user_id = ? AND type = 'EXPENSE'
-                AND strftime('%Y-%m', time) = ?
-            """, user_id, month_start.strftime('%Y-%m'))[0]['total']
-            
-            income_data.append(float(income))
-            expense_data.append(float(expense))
-            
+        return [period_bounds('MONTHLY', date(first_day.year, month, 1)) for month in range(1, 13)]
+
     else:  # annual
-        income_data = []
-        expense_data = []
-        
-        for year_label in labels:
-            income = db.execute("""
-                SELECT COALESCE(SUM(amount), 0) as total
-                FROM transactions
-                WHERE user_id = ? AND type = 'INCOME'
-                AND strftime('%Y', time) = ?
-            """, user_id, year_label)[0]['total']
-            
-            expense = db.execute("""
-                SELECT COALESCE(SUM(amount), 0) as total
-                FROM transactions
-                WHERE user_id = ? AND type = 'EXPENSE'
-                AND strftime('%Y', time) = ?
-            """, user_id, year_label)[0]['total']
-            
-            income_data.append(float(income))
-            expense_data.append(float(expense))
-    
+        return [period_bounds('YEARLY', date(int(year), 1, 1)) for year in labels]
+
+
+def get_histogram_data(user_id, view, start_date, end_date, labels):
+    """Generate histogram data based on view type"""
+    buckets = get_histogram_buckets(view, start_date, labels)
+
+    # All buckets are summed in one statement: each bucket is a row of the
+    # VALUES table and is joined against a day range of the user's rollups
+    values = ", ".join(["(?, ?, ?)"] * len(buckets))
+    params = []
+    for i, (bucket_start, bucket_end) in enumerate(buckets):
+        params.extend([i, to_day(bucket_start), to_day(bucket_end)])
+
+    totals = db.execute(f"""
+        WITH buckets(idx, start, stop) AS (VALUES {values})
+        SELECT
+            buckets.idx as idx,
+            COALESCE(SUM(CASE WHEN r.type = 'INCOME' THEN r.total ELSE 0 END), 0) as income,
+            COALESCE(SUM(CASE WHEN r.type = 'EXPENSE' THEN r.total ELSE 0 END), 0) as expenses
+        FROM buckets
+        JOIN daily_rollups r
+            ON r.user_id = ? AND r.day >= buckets.start AND r.day < buckets.stop
+        GROUP BY buckets.idx
+    """, *params, user_id) if buckets else []
+
+    income_data = [0.0] * len(buckets)
+    expense_data = [0.0] * len(buckets)
+    for row in totals:
+        income_data[row['idx']] = float(row['income'])
+        expense_data[row['idx']] = float(row['expenses'])
+
     return {
         'labels': labels,
         'income': income_data,
@@ -271,27 +648,26 @@ def get_histogram_data(user_id, view, start_date, end_date, labels):
     }
 
 
+@per_user_cache
 def calculate_trends(user_id):
     """Calculate spending trends"""
     # Compare this month vs last month
-    today = datetime.now()
-    this_month_start = today.replace(day=1)
-    last_month_end = this_month_start - timedelta(days=1)
-    last_month_start = last_month_end.replace(day=1)
+    this_month_start, this_month_end = period_bounds('MONTHLY')
+    last_month_start, _ = period_bounds('MONTHLY', offset=-1)
 
     this_month = db.execute("""
-        SELECT COALESCE(SUM(amount), 0) as total
-        FROM transactions
+        SELECT COALESCE(SUM(total), 0) as total
+        FROM daily_rollups
         WHERE user_id = ? AND type = 'EXPENSE'
-        AND time >= ?
-    """, user_id, this_month_start)[0]['total']
+        AND day >= ? AND day < ?
+    """, user_id, to_day(this_month_start), to_day(this_month_end))[0]['total']
 
     last_month = db.execute("""
-        SELECT COALESCE(SUM(amount), 0) as total
-        FROM transactions
+        SELECT COALESCE(SUM(total), 0) as total
+        FROM daily_rollups
         WHERE user_id = ? AND type = 'EXPENSE'
-        AND time >= ? AND time < ?
-    """, user_id, last_month_start, this_month_start)[0]['total']
+        AND day >= ? AND day < ?
+    """, user_id, to_day(last_month_start), to_day(this_month_start))[0]['total']
 
     if last_month > 0:
         change = ((this_month - last_month) / last_month) * 100
@@ -300,32 +676,33 @@ def calculate_trends(user_id):
 
     # Top spending category
     top_category = db.execute("""
-        SELECT category, SUM(amount) as total
-        FROM transactions
+        SELECT category, SUM(total) as total
+        FROM daily_rollups
         WHERE user_id = ? AND type = 'EXPENSE'
-        AND time >= ?
+        AND day >= ? AND day < ?
         GROUP BY category
         ORDER BY total DESC
         LIMIT 1
-    """, user_id, this_month_start)
+    """, user_id, to_day(this_month_start), to_day(this_month_end))
 
     return {
         'monthly_change': round(change, 1),
         'top_category': top_category[0] if top_category else None
     }
 
+@per_user_cache
 def get_spending_trends(user_id, start_date, end_date):
     """Get daily spending trends for line chart"""
     trends = db.execute("""
         SELECT 
-            DATE(time) as date,
-            SUM(CASE WHEN type = 'EXPENSE' THEN amount ELSE 0 END) as expenses,
-            SUM(CASE WHEN type = 'INCOME' THEN amount ELSE 0 END) as income
-        FROM transactions
-        WHERE user_id = ? AND time >= ? AND time <= ?
-        GROUP BY DATE(time)
-        ORDER BY date
-    """, user_id, start_date, end_date)
+            day as date,
+            SUM(CASE WHEN type = 'EXPENSE' THEN total ELSE 0 END) as expenses,
+            SUM(CASE WHEN type = 'INCOME' THEN total ELSE 0 END) as income
+        FROM daily_rollups
+        WHERE user_id = ? AND day >= ? AND day <= ?
+        GROUP BY day
+        ORDER BY day
+    """, user_id, to_day(start_date), to_day(end_date))
 
     # Fill in missing dates with 0
     all_dates = []
@@ -343,6 +720,7 @@ def get_spending_trends(user_id, start_date, end_date):
     }
 
 
+@per_user_cache
 def get_category_analysis(user_id, start_date, end_date):
     """Detailed category breakdown with trends"""
     categories = db.execute("""
@@ -355,10 +733,10 @@ def get_category_analysis(user_id, start_date, end_date):
             MIN(amount) as min_amount
         FROM transactions
         WHERE user_id = ? AND type = 'EXPENSE'
-        AND time >= ? AND time <= ?
+        AND time >= ? AND time < ?
         GROUP BY category
         ORDER BY total DESC
-    """, user_id, start_date, end_date)
+    """, user_id, to_day(start_date), to_day(end_date + timedelta(days=1)))
     
     total_spending = sum(c['total'] for c in categories)
     
@@ -372,6 +750,7 @@ def get_category_analysis(user_id, start_date, end_date):
     return categories
 
 
+@per_user_cache
 def get_period_comparison(user_id, start_date, end_date):
     """Compare current period with previous period"""
     period_length = (end_date - start_date).days
@@ -381,20 +760,20 @@ def get_period_comparison(user_id, start_date, end_date):
     # Current period
     current = db.execute("""
         SELECT 
-            COALESCE(SUM(CASE WHEN type = 'INCOME' THEN amount ELSE 0 END), 0) as income,
-            COALESCE(SUM(CASE WHEN type = 'EXPENSE' THEN amount ELSE 0 END), 0) as expense
-        FROM transactions
-        WHERE user_id = ? AND time >= ? AND time <= ?
-    """, user_id, start_date, end_date)[0]
+            COALESCE(SUM(CASE WHEN type = 'INCOME' THEN total ELSE 0 END), 0) as income,
+            COALESCE(SUM(CASE WHEN type = 'EXPENSE' THEN total ELSE 0 END), 0) as expense
+        FROM daily_rollups
+        WHERE user_id = ? AND day >= ? AND day <= ?
+    """, user_id, to_day(start_date), to_day(end_date))[0]
     
     # Previous period
     previous = db.execute("""
         SELECT 
-            COALESCE(SUM(CASE WHEN type = 'INCOME' THEN amount ELSE 0 END), 0) as income,
-            COALESCE(SUM(CASE WHEN type = 'EXPENSE' THEN amount ELSE 0 END), 0) as expense
-        FROM transactions
-        WHERE user_id = ? AND time >= ? AND time <= ?
-    """, user_id, prev_start, prev_end)[0]
+            COALESCE(SUM(CASE WHEN type = 'INCOME' THEN total ELSE 0 END), 0) as income,
+            COALESCE(SUM(CASE WHEN type = 'EXPENSE' THEN total ELSE 0 END), 0) as expense
+        FROM daily_rollups
+        WHERE user_id = ? AND day >= ? AND day <= ?
+    """, user_id, to_day(prev_start), to_day(prev_end))[0]
     
     # Calculate changes
     income_change = ((current['income'] - previous['income']) / previous['income'] * 100) if previous['income'] > 0 else 0
@@ -410,13 +789,14 @@ def get_period_comparison(user_id, start_date, end_date):
     }
 
 
+@per_user_cache
 def get_time_analysis(user_id, start_date, end_date):
     """Analyze spending patterns by day of week and time of day"""
     
     # By day of week
     by_weekday = db.execute("""
         SELECT 
-            CASE CAST(strftime('%w', time) AS INTEGER)
+            CASE CAST(strftime('%w', day) AS INTEGER)
                 WHEN 0 THEN 'Sunday'
                 WHEN 1 THEN 'Monday'
                 WHEN 2 THEN 'Tuesday'
@@ -425,14 +805,14 @@ def get_time_analysis(user_id, start_date, end_date):
                 WHEN 5 THEN 'Friday'
                 WHEN 6 THEN 'Saturday'
             END as weekday,
-            CAST(strftime('%w', time) AS INTEGER) as day_num,
-            COALESCE(SUM(amount), 0) as total
-        FROM transactions
+            CAST(strftime('%w', day) AS INTEGER) as day_num,
+            COALESCE(SUM(total), 0) as total
+        FROM daily_rollups
         WHERE user_id = ? AND type = 'EXPENSE'
-        AND time >= ? AND time <= ?
+        AND day >= ? AND day <= ?
         GROUP BY day_num
         ORDER BY day_num
-    """, user_id, start_date, end_date)
+    """, user_id, to_day(start_date), to_day(end_date))
     
     weekday_map = {day['weekday']: float(day['total']) for day in by_weekday}
     weekdays = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
@@ -443,20 +823,32 @@ def get_time_analysis(user_id, start_date, end_date):
     }
 
 
+@per_user_cache
 def calculate_financial_health(user_id, start_date, end_date):
     """Calculate overall financial health score (0-100)"""
     
     stats = db.execute("""
         SELECT 
-            COALESCE(SUM(CASE WHEN type = 'INCOME' THEN amount ELSE 0 END), 0) as income,
-            COALESCE(SUM(CASE WHEN type = 'EXPENSE' THEN amount ELSE 0 END), 0) as expense
-        FROM transactions
-        WHERE user_id = ? AND time >= ? AND time <= ?
-    """, user_id, start_date, end_date)[0]
+            COALESCE(SUM(CASE WHEN type = 'INCOME' THEN total ELSE 0 END), 0) as income,
+            COALESCE(SUM(CASE WHEN type = 'EXPENSE' THEN total ELSE 0 END), 0) as expense,
+            COALESCE(SUM(CASE WHEN type = 'INCOME' THEN count ELSE 0 END), 0) as income_count
+        FROM daily_rollups
+        WHERE user_id = ? AND day >= ? AND day <= ?
+    """, user_id, to_day(start_date), to_day(end_date))[0]
     
-    income = float(stats['income'])
-    expense = float(stats['expense'])
+    budget = db.execute("""
+        SELECT amount FROM budgets
+        WHERE user_id = ? AND period = 'MONTHLY' AND is_active = 1
+    """, user_id)
     
+    return score_financial_health(
+        float(stats['income']), float(stats['expense']), stats['income_count'],
+        budget[0]['amount'] if budget else None, (end_date - start_date).days
+    )
+
+
+def score_financial_health(income, expense, income_count, budget_amount, days):
+    """Health score (0-100) from a window's totals, its monthly budget (or None) and its length in days"""
     # Score components (out of 100)
     score = 0
     breakdown = {}
@@ -471,14 +863,8 @@ def calculate_financial_health(user_id, start_date, end_date):
         breakdown['savings'] = 0
     
     # 2. Budget Adherence (30 points max)
-    budget = db.execute("""
-        SELECT amount FROM budgets
-        WHERE user_id = ? AND period = 'MONTHLY' AND is_active = 1
-    """, user_id)
-    
-    if budget:
-        budget_amount = budget[0]['amount']
-        monthly_expense = expense / ((end_date - start_date).days / 30)
+    if budget_amount:
+        monthly_expense = expense / (max(days, 1) / 30)
         adherence = 1 - abs(monthly_expense - budget_amount) / budget_amount
         budget_points = max(adherence * 30, 0)
         score += budget_points
@@ -487,12 +873,7 @@ def calculate_financial_health(user_id, start_date, end_date):
         breakdown['budget'] = 0
     
     # 3. Income Consistency (30 points max)
-    income_transactions = db.execute("""
-        SELECT COUNT(*) as count
-        FROM transactions
-        WHERE user_id = ? AND type = 'INCOME'
-        AND time >= ? AND time <= ?
-    """, user_id, start_date, end_date)[0]['count']
+    income_transactions = income_count
     
     if income_transactions >= 3:
         consistency_points = 30
@@ -511,6 +892,7 @@ def calculate_financial_health(user_id, start_date, end_date):
     }
 
 
+@per_user_cache
 def get_recurring_analysis(user_id):
     """Analyze recurring transactions"""
     recurring = db.execute("""
@@ -585,84 +967,126 @@ def calculate_next_date(current_date, frequency):
     else:
         return current_date + timedelta(days=30)
 
-def process_recurring_transactions():
-    """Create transactions from recurring templates that are due"""
-    today = datetime.now().date()
+def expand_occurrences(first, frequency, until, end_date=None):
+    """
+    Occurrence dates of a recurring template from `first` up to `until`
+    (and its end_date), plus the date of the occurrence after them.
+    """
+    last = min(until, end_date) if end_date else until
+    dates = []
+    current = first
+    while current <= last and len(dates) < RECURRING_CATCH_UP_LIMIT:
+        dates.append(current)
+        current = calculate_next_date(current, frequency)
+    return dates, current
+
+
+def process_recurring_transactions(today=None, shard=0, shards=1, renew=None):
+    """
+    Create every missed occurrence of the recurring templates that are due.
+
+    With `shards` > 1 only the templates of users with user_id % shards ==
+    shard are processed, so several workers can split the backlog. `renew`,
+    if given, is called before each batch to extend the caller's lease; if it
+    returns False the lease was lost and processing stops.
+    """
+    today = today or datetime.now().date()
     
-    # Get all active recurring transactions that are due
+    # Get all active recurring transactions that are due and haven't ended
     due_recurring = db.execute("""
-        SELECT id, user_id, name, amount, type, category, notes, frequency, next_occurrence
+        SELECT id, user_id, name, amount, type, category, notes, frequency, next_occurrence, end_date
         FROM recurring_transactions
         WHERE is_active = 1
         AND next_occurrence <= ?
-    """, today)
+        AND (end_date IS NULL OR next_occurrence <= end_date)
+        AND user_id % ? = ?
+    """, today, shards, shard)
     
-    for rt in due_recurring:
+    created = 0
+    for start in range(0, len(due_recurring), RECURRING_BATCH_SIZE):
+        batch = due_recurring[start:start + RECURRING_BATCH_SIZE]
+        if renew is not None and not renew():
+            print(f"Lost the lease on recurring shard {shard}, stopping after {created} transactions")
+            break
         try:
-            # Create the actual transaction
-            db.execute("""
-                INSERT INTO transactions 
-                (user_id, name, amount, type, category, notes, is_recurring, recurring_template_id, time)
-                VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)
-            """, 
-                rt['user_id'],
-                rt['name'],
-                rt['amount'],
-                rt['type'],
-                rt['category'],
-                rt['notes'],
-                rt['id'],
-                rt['next_occurrence']
-            )
-            
-            # Calculate and update next occurrence
-            current_date = datetime.strptime(str(rt['next_occurrence']), '%Y-%m-%d').date()
-            next_date = calculate_next_date(current_date, rt['frequency'])
-            
-            db.execute("""
-                UPDATE recurring_transactions
-                SET next_occurrence = ?
-                WHERE id = ?
-            """, next_date.strftime('%Y-%m-%d'), rt['id'])
-            
-            print(f"Created recurring transaction: {rt['name']} for {rt['next_occurrence']}")
-            
-        except Exception as e:
-            print(f"Error creating recurring transaction {rt['id']}: {e}")
-            continue
+            created += create_occurrences(batch, today)
+        except Exception:
+            # Retry one template at a time so a bad one doesn't hold back the rest
+            for rt in batch:
+                try:
+                    created += create_occurrences([rt], today)
+                except Exception as e:
+                    print(f"Error creating recurring transaction {rt['id']}: {e}")
     
-    return len(due_recurring)
+    if created:
+        print(f"Created {created} recurring transactions from {len(due_recurring)} templates")
+    return created
 
-def load_whisper_model():
-    """Load Whisper model at startup"""
-    global whisper_model
 
-    try:
-        print("Loading Whisper model...")
-        from faster_whisper import WhisperModel
+def create_occurrences(templates, today):
+    """
+    Insert the missed occurrences of some due templates and advance their
+    next_occurrence, all in one database transaction. Returns the number of
+    transactions created.
+
+    The occurrences are worked out before the transaction starts. Inside it
+    (holding the write lock) each template is claimed by checking that its
+    next_occurrence is still the one that was read; templates another worker
+    got to first are skipped. Occurrences that already exist are skipped too,
+    so replaying a run never duplicates a transaction.
+    """
+    plans = {}
+    for rt in templates:
+        first = datetime.strptime(str(rt['next_occurrence'])[:10], '%Y-%m-%d').date()
+        end_date = datetime.strptime(str(rt['end_date'])[:10], '%Y-%m-%d').date() if rt['end_date'] else None
+        dates, following = expand_occurrences(first, rt['frequency'], today, end_date)
+        plans[rt['id']] = (rt, dates, following)
+    
+    placeholders = ", ".join(["?"] * len(plans))
+    with db.transaction():
+        current = db.execute(f"""
+            SELECT id, next_occurrence FROM recurring_transactions WHERE id IN ({placeholders})
+        """, *plans)
+        claimed = [row['id'] for row in current if row['next_occurrence'] == plans[row['id']][0]['next_occurrence']]
+        if not claimed:
+            return 0
         
-        whisper_model = WhisperModel(
-            WHISPER_MODEL,
-            device="cpu",
-            compute_type="int8", 
-            num_workers=2 
-        )
-        print(f"Whisper '{WHISPER_MODEL}' loaded successfully!")
+        placeholders = ", ".join(["?"] * len(claimed))
+        existing = {
+            (row['recurring_template_id'], str(row['time'])) for row in db.execute(f"""
+                SELECT recurring_template_id, time FROM transactions
+                WHERE recurring_template_id IN ({placeholders}) AND time >= ?
+            """, *claimed, min(str(plans[template_id][0]['next_occurrence']) for template_id in claimed))
+        }
         
-        return whisper_model
-            
-    except Exception as e:
-        print(f"Failed to load Whisper: {e}")
-        return None
+        rows = [
+            (rt['user_id'], rt['name'], rt['amount'], rt['type'], rt['category'], rt['notes'], rt['id'], day)
+            for rt, dates, _ in map(plans.get, claimed)
+            for day in dates
+            if (rt['id'], str(day)) not in existing
+        ]
+        db.executemany("""
+            INSERT INTO transactions 
+            (user_id, name, amount, type, category, notes, is_recurring, recurring_template_id, time)
+            VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)
+        """, rows)
+        record_rollups([(row[0], row[7], row[3], row[4], row[2], 1) for row in rows])
+        db.executemany(
+            "UPDATE recurring_transactions SET next_occurrence = ? WHERE id = ?",
+            [(plans[template_id][2], template_id) for template_id in claimed]
+        )
+    
+    return len(rows)
+
 
 def get_user_financial_data(user_id):
     """Fetch user's financial data from YOUR database"""
     
     try:
         now = datetime.now()
-        current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        current_week_start = now - timedelta(days=now.weekday())
-        current_year_start = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        current_month_start, current_month_end = map(to_day, period_bounds('MONTHLY', now))
+        current_week_start, current_week_end = map(to_day, period_bounds('WEEKLY', now))
+        current_year_start, current_year_end = map(to_day, period_bounds('YEARLY', now))
         
         active_budget = db.execute("""
             SELECT amount, period, start_date, end_date
@@ -693,12 +1117,12 @@ def get_user_financial_data(user_id):
             SELECT 
                 type,
                 category,
-                SUM(amount) as total,
-                COUNT(*) as count
-            FROM transactions
-            WHERE user_id = ? AND time >= ?
+                SUM(total) as total,
+                SUM(count) as count
+            FROM daily_rollups
+            WHERE user_id = ? AND day >= ? AND day < ?
             GROUP BY type, category
-        """, user_id, current_month_start.strftime('%Y-%m-%d %H:%M:%S'))
+        """, user_id, current_month_start, current_month_end)
         
         monthly_income = sum(s['total'] for s in monthly_stats if s['type'] == 'INCOME')
         monthly_expenses = sum(s['total'] for s in monthly_stats if s['type'] == 'EXPENSE')
@@ -709,11 +1133,11 @@ def get_user_financial_data(user_id):
         weekly_stats = db.execute("""
             SELECT 
                 type,
-                SUM(amount) as total
-            FROM transactions
-            WHERE user_id = ? AND time >= ?
+                SUM(total) as total
+            FROM daily_rollups
+            WHERE user_id = ? AND day >= ? AND day < ?
             GROUP BY type
-        """, user_id, current_week_start.strftime('%Y-%m-%d %H:%M:%S'))
+        """, user_id, current_week_start, current_week_end)
         
         weekly_income = next((s['total'] for s in weekly_stats if s['type'] == 'INCOME'), 0)
         weekly_expenses = next((s['total'] for s in weekly_stats if s['type'] == 'EXPENSE'), 0)
@@ -721,18 +1145,18 @@ def get_user_financial_data(user_id):
         yearly_stats = db.execute("""
             SELECT 
                 type,
-                SUM(amount) as total
-            FROM transactions
-            WHERE user_id = ? AND time >= ?
+                SUM(total) as total
+            FROM daily_rollups
+            WHERE user_id = ? AND day >= ? AND day < ?
             GROUP BY type
-        """, user_id, current_year_start.strftime('%Y-%m-%d %H:%M:%S'))
+        """, user_id, current_year_start, current_year_end)
         
         yearly_income = next((s['total'] for s in yearly_stats if s['type'] == 'INCOME'), 0)
         yearly_expenses = next((s['total'] for s in yearly_stats if s['type'] == 'EXPENSE'), 0)
         
         all_transactions = db.execute("""
-            SELECT type, SUM(amount) as total
-            FROM transactions
+            SELECT type, SUM(total) as total
+            FROM daily_rollups
             WHERE user_id = ?
             GROUP BY type
         """, user_id)
@@ -756,14 +1180,14 @@ def get_user_financial_data(user_id):
             ORDER BY next_occurrence ASC
         """, user_id)
         
-        three_months_ago = (now - timedelta(days=90)).strftime('%Y-%m-%d %H:%M:%S')
+        three_months_ago = to_day(now - timedelta(days=90))
         monthly_trend = db.execute("""
             SELECT 
-                strftime('%Y-%m', time) as month,
+                strftime('%Y-%m', day) as month,
                 type,
-                SUM(amount) as total
-            FROM transactions
-            WHERE user_id = ? AND time >= ?
+                SUM(total) as total
+            FROM daily_rollups
+            WHERE user_id = ? AND day >= ?
             GROUP BY month, type
             ORDER BY month DESC
         """, user_id, three_months_ago)
@@ -771,14 +1195,14 @@ def get_user_financial_data(user_id):
         top_expenses = db.execute("""
             SELECT 
                 category,
-                SUM(amount) as total,
-                COUNT(*) as count
-            FROM transactions
-            WHERE user_id = ? AND type = 'EXPENSE' AND time >= ?
+                SUM(total) as total,
+                SUM(count) as count
+            FROM daily_rollups
+            WHERE user_id = ? AND type = 'EXPENSE' AND day >= ? AND day < ?
             GROUP BY category
             ORDER BY total DESC
             LIMIT 10
-        """, user_id, current_month_start.strftime('%Y-%m-%d %H:%M:%S'))
+        """, user_id, current_month_start, current_month_end)
         
         budget_spent = monthly_expenses
         budget_status = None
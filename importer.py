@@ -0,0 +1,190 @@
+"""
+Bulk import of transactions from CSV or NDJSON.
+
+CSV files use the columns /analytics/export/csv writes (Date, Name, Type,
+Category, Amount, Notes). NDJSON files have one object per line with the
+same fields in lower case ("time" works for "date"). Records are parsed one
+at a time from the stream and checked against an in-memory map of the
+categories, then inserted IMPORT_BATCH_SIZE at a time with executemany,
+inside one database transaction.
+
+A record is a duplicate when a transaction with the same user, time, amount
+and name already exists, or appeared earlier in the same file. Times are
+compared to the second, so a stored '2026-01-05T09:30:00.250' matches an
+imported '2026-01-05 09:30:00'. Each batch looks up the user's transactions
+at the batch's times (every form they may be stored in, see stored_forms)
+and keeps a set of (time, amount, name) keys; duplicates are skipped and
+counted. Records that fail validation are skipped too, and reported back
+with their line number.
+"""
+
+from datetime import date, datetime
+
+import csv
+import io
+import json
+
+from database import db
+from helpers import bulk_transactions
+
+
+IMPORT_BATCH_SIZE = 5000
+
+# Invalid records listed in the result (all of them are counted)
+IMPORT_MAX_ERRORS = 100
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+
+def import_format(filename, requested=None):
+    """The import format asked for, or the one implied by the file name"""
+    if requested:
+        return requested.lower()
+    return 'ndjson' if filename.lower().endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+
+def read_records(stream, format):
+    """Yield (line number, record) from a binary stream, records as dicts with lower-case keys"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if format == 'csv':
+        reader = csv.DictReader(text)
+        reader.fieldnames = [field.strip().lower() for field in reader.fieldnames or []]
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield number, None
+                continue
+            yield number, {str(key).lower(): value for key, value in record.items()} if isinstance(record, dict) else None
+
+
+def to_second(time):
+    """A time in parse_time's form as strftime('%Y-%m-%d %H:%M:%S') gives it, dates at midnight"""
+    return f"{time} 00:00:00" if len(time) == 10 else time
+
+
+def duplicate_key(time, amount, name):
+    """What makes two of a user's transactions duplicates, hashable for a set"""
+    return to_second(time), round(float(amount) * 100), name
+
+
+def stored_forms(second):
+    """
+    (low, high) bounds of the strings a transaction time in this 'YYYY-MM-DD
+    HH:MM:SS' second may be stored as: with a space or a 'T', with or without
+    a fraction, or (at midnight) as just the date.
+    """
+    forms = [(prefix, prefix + '~') for prefix in (second, second.replace(' ', 'T'))]
+    if second.endswith(' 00:00:00'):
+        forms.append((second[:10], second[:10]))
+    return forms
+
+
+def parse_time(value):
+    """Normalize a date or date-time to how transactions store it"""
+    value = str(value or '').strip()
+    if len(value) == 10:
+        date.fromisoformat(value)
+        return value
+    parsed = datetime.fromisoformat(value)
+    # Already in the stored 'YYYY-MM-DD HH:MM:SS' form: keep the string
+    if len(value) == 19 and value[10] == ' ':
+        return value
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def parse_record(record, categories):
+    """Validate one record and return (time, name, amount, type, category, notes); ValueError says why not"""
+    if record is None:
+        raise ValueError("not a valid JSON object")
+
+    name = str(record.get('name') or '').strip()
+    if not name:
+        raise ValueError("name is required")
+
+    try:
+        amount = round(float(record.get('amount')), 2)
+    except (TypeError, ValueError):
+        raise ValueError("invalid amount") from None
+    if not amount > 0:
+        raise ValueError("amount must be positive")
+
+    category = str(record.get('category') or '').strip()
+    if category not in categories:
+        raise ValueError(f"unknown category {category!r}")
+    transaction_type = str(record.get('type') or categories[category]).strip().upper()
+    if transaction_type != categories[category]:
+        raise ValueError(f"category {category!r} is not for {transaction_type} transactions")
+
+    try:
+        time = parse_time(record.get('date') or record.get('time'))
+    except ValueError:
+        raise ValueError("invalid date") from None
+
+    notes = str(record.get('notes') or '').strip() or None
+    return time, name, amount, transaction_type, category, notes
+
+
+def import_transactions(user_id, records):
+    """
+    Insert the valid, new records for user_id. `records` yields (line
+    number, record) pairs, see read_records(). Returns counts of imported,
+    duplicate and invalid records, plus the first IMPORT_MAX_ERRORS errors.
+    """
+    categories = {row['name']: row['type'] for row in db.execute("SELECT name, type FROM categories")}
+    result = {'imported': 0, 'duplicates': 0, 'invalid': 0, 'errors': []}
+
+    with db.transaction(), bulk_transactions():
+        batch = []
+        for line, record in records:
+            try:
+                batch.append(parse_record(record, categories))
+            except ValueError as e:
+                result['invalid'] += 1
+                if len(result['errors']) < IMPORT_MAX_ERRORS:
+                    result['errors'].append({'line': line, 'error': str(e)})
+                continue
+
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                insert_batch(user_id, batch, result)
+                batch = []
+        if batch:
+            insert_batch(user_id, batch, result)
+
+    return result
+
+
+def insert_batch(user_id, batch, result):
+    """Insert one batch of parsed records, skipping those already in the database or the batch"""
+    # Each second is looked up as index ranges over the ways it may be
+    # stored, and the stored times are normalized the same way as the batch's
+    bounds = sorted({bound for row in batch for bound in stored_forms(to_second(row[0]))})
+    seen = {
+        duplicate_key(*row) for row in db.execute("""
+            SELECT strftime('%Y-%m-%d %H:%M:%S', t.time), t.amount, t.name
+            FROM json_each(?) AS bound
+            CROSS JOIN transactions t
+            WHERE t.user_id = ?
+            AND t.time >= json_extract(bound.value, '$[0]') AND t.time <= json_extract(bound.value, '$[1]')
+        """, json.dumps(bounds), user_id, rows="tuple")
+    }
+
+    rows = []
+    for time, name, amount, transaction_type, category, notes in batch:
+        key = duplicate_key(time, amount, name)
+        if key in seen:
+            result['duplicates'] += 1
+            continue
+        seen.add(key)
+        rows.append((user_id, name, amount, transaction_type, category, notes, time))
+
+    db.executemany("""
+        INSERT INTO transactions (user_id, name, amount, type, category, notes, time)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    result['imported'] += len(rows)
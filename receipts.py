@@ -0,0 +1,152 @@
+"""
+Content-addressed receipt storage.
+
+A receipt is stored once per distinct content, at
+Database/Receipts/ab/cd/abcd...<ext> under the SHA-256 of its bytes, two
+levels of shards keeping every directory small. Uploads are streamed to a
+temporary file in chunks and hashed as they are written, then moved into
+place; if that content is already stored, the copy is dropped and the
+existing file is shared.
+
+A file is referenced by the transactions whose receipt_path points at it.
+Deleting a transaction (or failing to insert one after storing its
+receipt) leaves the file behind; collect_receipts deletes the files no
+transaction references any more, once they are older than
+RECEIPT_GC_GRACE seconds, so an upload whose transaction is still being
+inserted is never collected.
+
+/receipt/<id> serves a receipt with its hash as a strong ETag, cacheable
+privately for a year (a transaction's receipt never changes), and
+answers conditional and range requests. With RECEIPT_SENDFILE set to
+"x-sendfile" or "x-accel-redirect", only the headers come from Flask and a
+front proxy sends the file itself.
+"""
+
+from functools import lru_cache
+from time import time
+
+import hashlib
+import os
+import tempfile
+
+from database import db
+
+
+RECEIPT_FOLDER = "Database/Receipts"
+RECEIPT_CHUNK_SIZE = 64 * 1024
+
+# Unreferenced files younger than this are left alone by collect_receipts
+RECEIPT_GC_GRACE = int(os.environ.get("RECEIPT_GC_GRACE", 3600))
+
+RECEIPT_MAX_AGE = 365 * 24 * 3600
+
+# "", "x-sendfile" (Apache, lighttpd) or "x-accel-redirect" (nginx)
+RECEIPT_SENDFILE = os.environ.get("RECEIPT_SENDFILE", "").lower()
+# nginx internal location that maps onto RECEIPT_FOLDER
+RECEIPT_ACCEL_PREFIX = os.environ.get("RECEIPT_ACCEL_PREFIX", "/internal/receipts/")
+
+
+def receipt_path(digest, extension):
+    """Where the receipt with this SHA-256 hex digest is stored"""
+    return os.path.join(RECEIPT_FOLDER, digest[:2], digest[2:4], digest + extension)
+
+
+def receipt_etag(path):
+    """The SHA-256 hex digest of a stored receipt: its file name, or for older receipts, its content"""
+    digest = os.path.splitext(os.path.basename(path))[0]
+    if len(digest) == 64 and all(c in "0123456789abcdef" for c in digest):
+        return digest
+    stat = os.stat(path)
+    return hash_file(path, stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=1024)
+def hash_file(path, mtime, size):
+    """SHA-256 of a file, cached until it is modified"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(RECEIPT_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def accel_redirect_path(path):
+    """The URL of a receipt under the proxy's internal location"""
+    return RECEIPT_ACCEL_PREFIX.rstrip("/") + "/" + os.path.relpath(path, RECEIPT_FOLDER).replace(os.sep, "/")
+
+
+def store_receipt(stream, filename, max_size):
+    """
+    Save an uploaded file under its content hash and return its path.
+    Raises ValueError, storing nothing, if it is larger than max_size bytes.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    upload_folder = os.path.join(RECEIPT_FOLDER, "tmp")
+    os.makedirs(upload_folder, exist_ok=True)
+
+    digest, size = hashlib.sha256(), 0
+    descriptor, temporary = tempfile.mkstemp(dir=upload_folder)
+    try:
+        with os.fdopen(descriptor, "wb") as out:
+            while chunk := stream.read(RECEIPT_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise ValueError(f"File size must be less than {max_size // (1024 * 1024)}MB")
+                digest.update(chunk)
+                out.write(chunk)
+
+        path = receipt_path(digest.hexdigest(), extension)
+        if os.path.exists(path):
+            # Already stored: share it, and keep it out of collect_receipts' reach for a while
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temporary, path)
+        return path
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def collect_receipts(grace=None):
+    """
+    Delete receipt files (and abandoned uploads) no transaction references,
+    skipping those modified in the last `grace` seconds. Returns counts of
+    files kept and deleted and bytes freed.
+    """
+    grace = RECEIPT_GC_GRACE if grace is None else grace
+    cutoff = time() - grace
+
+    candidates = []
+    for folder, _, files in os.walk(RECEIPT_FOLDER):
+        for name in files:
+            path = os.path.join(folder, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    candidates.append(path)
+            except FileNotFoundError:
+                continue
+
+    referenced = {
+        os.path.normpath(row['receipt_path'])
+        for row in db.execute("SELECT DISTINCT receipt_path FROM transactions WHERE receipt_path IS NOT NULL")
+    }
+
+    result = {'kept': 0, 'deleted': 0, 'freed_bytes': 0}
+    for path in candidates:
+        if os.path.normpath(path) in referenced:
+            result['kept'] += 1
+            continue
+        try:
+            stat = os.stat(path)
+            # Shared again by a new upload since the walk
+            if stat.st_mtime >= cutoff:
+                result['kept'] += 1
+                continue
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        result['deleted'] += 1
+        result['freed_bytes'] += stat.st_size
+
+    return result
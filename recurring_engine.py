@@ -0,0 +1,179 @@
+"""
+Vectorized expansion of recurring templates into occurrence dates.
+
+calculate_next_date in helpers.py steps one occurrence at a time;
+`expand_recurring` works out every occurrence of many templates at once with
+NumPy. DAILY, WEEKLY and BIWEEKLY occurrences are arithmetic progressions
+of days.
+MONTHLY and YEARLY ones step through months, 1 or 12 at a time, and clamp
+the day to the month's length the way calculate_next_date does. A clamped
+day is carried forward (Jan 31 -> Feb 28 -> Mar 28, Feb 29 -> Feb 28 for
+good), so the day of each occurrence is the smallest of the template's day
+and the lengths of the months reached so far.
+
+`forecast` builds on it to project a user's balance day by day.
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+
+from database import db
+from helpers import per_user_cache
+
+
+DAY_STEPS = {'DAILY': 1, 'WEEKLY': 7, 'BIWEEKLY': 14}
+MONTH_STEPS = {'MONTHLY': 1, 'YEARLY': 12}
+
+# calculate_next_date adds 30 days for any other frequency
+OTHER_STEP = 30
+
+# Days of recent spending averaged for the forecast's discretionary estimate
+FORECAST_LOOKBACK_DAYS = 90
+
+
+def expand_recurring(templates, until):
+    """
+    Every occurrence of each template from its next_occurrence through
+    `until` (and its end_date, if it has one).
+
+    Returns two arrays: the position in `templates` and the date
+    (datetime64[D]) of each occurrence, ordered by date and then by template.
+    """
+    until = str(np.datetime64(until, 'D'))
+    first = np.array([str(rt['next_occurrence'])[:10] for rt in templates], dtype='datetime64[D]')
+    last = np.array([min(str(rt['end_date'])[:10], until) if rt['end_date'] else until for rt in templates], dtype='datetime64[D]')
+    frequency = np.array([rt['frequency'] for rt in templates], dtype=object)
+
+    indexes, dates = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype='datetime64[D]')]
+    for name in set(frequency.tolist()):
+        selected = np.flatnonzero(frequency == name)
+        if name in MONTH_STEPS:
+            segment, day = month_steps(first[selected], last[selected], MONTH_STEPS[name])
+        else:
+            segment, day = day_steps(first[selected], last[selected], DAY_STEPS.get(name, OTHER_STEP))
+        indexes.append(selected[segment])
+        dates.append(day)
+
+    index, date = np.concatenate(indexes), np.concatenate(dates)
+    order = np.lexsort((index, date))
+    return index[order], date[order]
+
+
+def monthly_recurring_totals(templates, index, dates):
+    """Income and expense totals of the expanded occurrences per 'YYYY-MM', in month order"""
+    amount = np.array([float(rt['amount']) for rt in templates], dtype=np.float64)[index]
+    income = np.array([rt['type'] == 'INCOME' for rt in templates], dtype=bool)[index]
+    months, codes = np.unique(dates.astype('datetime64[M]'), return_inverse=True)
+    earned = np.bincount(codes, weights=np.where(income, amount, 0), minlength=len(months))
+    spent = np.bincount(codes, weights=np.where(income, 0, amount), minlength=len(months))
+    return {
+        str(month): {'income': float(earned[i]), 'expense': float(spent[i])}
+        for i, month in enumerate(months)
+    }
+
+
+@per_user_cache
+def forecast(user_id, months, discretionary=False):
+    """
+    Projected end-of-day balance for today and the next `months` * 30 - 1 days.
+
+    Starts from the balance of every transaction recorded up to today, then
+    adds transactions already recorded for later days and every occurrence
+    of the user's active recurring templates (overdue ones land on today,
+    since the processor is about to create them). With `discretionary`, the
+    average daily spending per category over the last FORECAST_LOOKBACK_DAYS
+    days, recurring transactions excluded, is also subtracted from tomorrow on.
+    """
+    today = date.today()
+    days = months * 30
+    first = np.datetime64(today, 'D')
+    horizon = today + timedelta(days=days - 1)
+
+    opening = float(db.execute("""
+        SELECT COALESCE(SUM(CASE WHEN type = 'INCOME' THEN total ELSE -total END), 0) as balance
+        FROM daily_rollups
+        WHERE user_id = ? AND day <= ?
+    """, user_id, today)[0]['balance'])
+
+    # Transactions already recorded for later days, then recurring occurrences, per day
+    later = db.execute("""
+        SELECT day, type = 'INCOME', total FROM daily_rollups
+        WHERE user_id = ? AND day > ? AND day <= ?
+    """, user_id, today, horizon, rows="tuple")
+    day_keys, incomes, totals = zip(*later) if later else ((), (), ())
+    offset = (np.asarray(day_keys, dtype='datetime64[D]') - first).astype(np.int64)
+    income = np.asarray(incomes, dtype=bool)
+    amount = np.asarray(totals, dtype=np.float64)
+    earned = np.bincount(offset[income], weights=amount[income], minlength=days).astype(np.float64)
+    spent = np.bincount(offset[~income], weights=amount[~income], minlength=days).astype(np.float64)
+
+    templates = db.execute("""
+        SELECT amount, type, frequency, next_occurrence, end_date
+        FROM recurring_transactions
+        WHERE user_id = ? AND is_active = 1
+    """, user_id)
+    index, dates = expand_recurring(templates, horizon)
+    template_amount = np.array([float(rt['amount']) for rt in templates], dtype=np.float64)[index]
+    template_income = np.array([rt['type'] == 'INCOME' for rt in templates], dtype=bool)[index]
+    occurrence = np.maximum((dates - first).astype(np.int64), 0)
+    earned += np.bincount(occurrence[template_income], weights=template_amount[template_income], minlength=days)
+    spent += np.bincount(occurrence[~template_income], weights=template_amount[~template_income], minlength=days)
+
+    per_category = {}
+    if discretionary:
+        recent = db.execute("""
+            SELECT category, SUM(amount) as total
+            FROM transactions
+            WHERE user_id = ? AND type = 'EXPENSE' AND is_recurring = 0
+            AND time >= ? AND time < ?
+            GROUP BY category
+        """, user_id, today - timedelta(days=FORECAST_LOOKBACK_DAYS), today + timedelta(days=1))
+        per_category = {row['category']: float(row['total']) / FORECAST_LOOKBACK_DAYS for row in recent}
+        spent[1:] += sum(per_category.values())
+
+    balance = opening + np.cumsum(earned - spent)
+    return {
+        'start': str(today),
+        'end': str(horizon),
+        'opening_balance': round(opening, 2),
+        'balance': np.round(balance, 2).tolist(),
+        'income': np.round(earned, 2).tolist(),
+        'expense': np.round(spent, 2).tolist(),
+        'discretionary_per_day': {category: round(daily, 2) for category, daily in per_category.items()}
+    }
+
+
+def segments(counts):
+    """For runs of `counts` elements: the run each element belongs to and its position in the run"""
+    segment = np.repeat(np.arange(len(counts)), counts)
+    position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return segment, position
+
+
+def day_steps(first, last, step):
+    """Occurrences every `step` days from each first date through its last date"""
+    counts = np.where(last >= first, (last - first).astype(np.int64) // step + 1, 0)
+    segment, position = segments(counts)
+    return segment, first[segment] + position * step
+
+
+def month_steps(first, last, step):
+    """Occurrences every `step` months from each first date through its last date, clamped like calculate_next_date"""
+    start_month = first.astype('datetime64[M]')
+    start_day = (first - start_month.astype('datetime64[D]')).astype(np.int64) + 1
+    # Enough steps to reach the month of the last date; any past it are dropped below
+    counts = np.where(last >= first, (last.astype('datetime64[M]') - start_month).astype(np.int64) // step + 1, 0)
+    segment, position = segments(counts)
+
+    month = start_month[segment] + position * step
+    length = ((month + 1).astype('datetime64[D]') - month.astype('datetime64[D]')).astype(np.int64)
+    day = np.where(position == 0, start_day[segment], np.minimum(start_day[segment], length))
+    # Running minimum within each template's run: shifting every run below
+    # the previous one (days are at most 31) restarts the minimum at each run
+    shift = segment * 64
+    day = np.minimum.accumulate(day - shift) + shift
+
+    date = month.astype('datetime64[D]') + (day - 1)
+    keep = date <= last[segment]
+    return segment[keep], date[keep]
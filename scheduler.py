@@ -0,0 +1,151 @@
+"""
+Background processing of recurring transactions.
+
+Every serving process starts an APScheduler job that calls
+process_recurring_transactions every RECURRING_INTERVAL seconds (and once
+right after startup), off the request path.
+
+The templates are split into RECURRING_SHARDS shards by user. A run walks
+the shards and processes each one whose lease it can take in the database,
+so when several workers share the database each shard is processed by one
+of them at a time and workers that fire together split the backlog between
+them. The lease is renewed before each batch of templates, so a long run
+keeps its shard; one left behind by a crashed worker expires after
+RECURRING_LEASE seconds. Set RECURRING_INTERVAL=0 to turn the job off.
+
+Nothing starts on import: app.init_app calls start_scheduler in the
+processes that serve requests.
+
+A second job deletes unreferenced receipt files (see receipts.py) every
+RECEIPT_GC_INTERVAL seconds, under a lease of its own so one worker does
+it at a time; RECEIPT_GC_INTERVAL=0 turns it off.
+"""
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from datetime import datetime
+from time import perf_counter
+
+import atexit
+import multiprocessing
+import os
+import socket
+import threading
+
+from helpers import acquire_lease, process_recurring_transactions, release_lease
+from receipts import collect_receipts
+
+
+RECURRING_INTERVAL = int(os.environ.get("RECURRING_INTERVAL", 3600))
+RECURRING_LEASE = int(os.environ.get("RECURRING_LEASE", 900))
+RECURRING_SHARDS = int(os.environ.get("RECURRING_SHARDS", 1))
+RECEIPT_GC_INTERVAL = int(os.environ.get("RECEIPT_GC_INTERVAL", 86400))
+
+scheduler = BackgroundScheduler(daemon=True)
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    'runs': 0,
+    'skipped': 0,
+    'failures': 0,
+    'created': 0,
+    'last_started': None,
+    'last_duration_ms': None,
+    'last_created': None,
+    'last_shards': None,
+    'last_error': None,
+    'max_duration_ms': 0.0,
+    'total_duration_ms': 0.0
+}
+
+
+def holder():
+    """Identifies this process as a lease holder (worked out per call, so forked workers differ)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_recurring():
+    """One scheduled run: process the due templates of every shard this process can lease"""
+    started = datetime.now()
+    began = perf_counter()
+    created, error, processed = 0, None, 0
+    for shard in range(RECURRING_SHARDS):
+        lease = f"recurring:{shard}"
+        if not acquire_lease(lease, holder(), RECURRING_LEASE):
+            continue
+        processed += 1
+        try:
+            created += process_recurring_transactions(
+                shard=shard, shards=RECURRING_SHARDS,
+                renew=lambda: acquire_lease(lease, holder(), RECURRING_LEASE)
+            )
+        except Exception as e:
+            error = str(e)
+            print(f"Error processing recurring transactions (shard {shard}): {e}")
+        finally:
+            release_lease(lease, holder())
+
+    if not processed:
+        with _metrics_lock:
+            _metrics['skipped'] += 1
+        return
+
+    duration = (perf_counter() - began) * 1000
+    with _metrics_lock:
+        _metrics['runs'] += 1
+        _metrics['created'] += created
+        _metrics['last_started'] = started.isoformat(timespec='seconds')
+        _metrics['last_duration_ms'] = round(duration, 2)
+        _metrics['last_created'] = created
+        _metrics['last_shards'] = processed
+        _metrics['max_duration_ms'] = max(_metrics['max_duration_ms'], round(duration, 2))
+        _metrics['total_duration_ms'] += duration
+        if error:
+            _metrics['failures'] += 1
+            _metrics['last_error'] = error
+
+
+def run_receipt_gc():
+    """One scheduled collection of unreferenced receipt files, if no other process is doing it"""
+    if not acquire_lease("receipts", holder(), RECURRING_LEASE):
+        return
+    try:
+        result = collect_receipts()
+        print(f"Receipt GC: {result['deleted']} files deleted ({result['freed_bytes']} bytes), {result['kept']} kept")
+    except Exception as e:
+        print(f"Error collecting receipts: {e}")
+    finally:
+        release_lease("receipts", holder())
+
+
+def scheduler_stats():
+    """Timing and outcome counters of this process's recurring job"""
+    with _metrics_lock:
+        stats = dict(_metrics)
+    job = scheduler.get_job('recurring') if scheduler.running else None
+    stats['avg_duration_ms'] = round(stats.pop('total_duration_ms') / stats['runs'], 2) if stats['runs'] else None
+    stats['next_run'] = job.next_run_time.isoformat(timespec='seconds') if job and job.next_run_time else None
+    stats['interval_seconds'] = RECURRING_INTERVAL
+    stats['shards'] = RECURRING_SHARDS
+    stats['holder'] = holder()
+    return stats
+
+
+def start_scheduler():
+    """Start the background jobs in this process, the recurring one running immediately"""
+    if scheduler.running or (RECURRING_INTERVAL <= 0 and RECEIPT_GC_INTERVAL <= 0):
+        return
+    # Not in helper processes (the transcription pool) that re-import the app's main module
+    if multiprocessing.parent_process() is not None:
+        return
+    if RECURRING_INTERVAL > 0:
+        scheduler.add_job(
+            run_recurring, 'interval', seconds=RECURRING_INTERVAL, id='recurring',
+            next_run_time=datetime.now(), max_instances=1, coalesce=True, replace_existing=True
+        )
+    if RECEIPT_GC_INTERVAL > 0:
+        scheduler.add_job(
+            run_receipt_gc, 'interval', seconds=RECEIPT_GC_INTERVAL, id='receipts',
+            max_instances=1, coalesce=True, replace_existing=True
+        )
+    scheduler.start()
+    atexit.register(scheduler.shutdown, wait=False)
@@ -0,0 +1,122 @@
+"""
+Audio decoding for /api/speech-to-text, entirely in memory.
+
+SpeechRequest keeps the upload in a BytesIO (Werkzeug would otherwise
+spool uploads over 500 KB to a temporary file) and rejects requests over
+SPEECH_MAX_BYTES. decode_audio then decodes it with PyAV straight into
+the 16 kHz mono float32 NumPy buffer WhisperModel.transcribe takes, giving
+up as soon as the audio runs past SPEECH_MAX_SECONDS, so a long or
+malicious upload never gets fully decoded. Packets are decoded one at a
+time, so a damaged one is skipped on its own; decode_audio also reports
+whether any audio was lost, for the response to say the transcription may
+be incomplete.
+"""
+
+from flask import Request
+
+import io
+import os
+
+import av
+import numpy as np
+
+
+SPEECH_ENDPOINT = "speech_to_text"
+SPEECH_SAMPLE_RATE = 16000
+SPEECH_MAX_SECONDS = int(os.environ.get("SPEECH_MAX_SECONDS", 30))
+SPEECH_MAX_BYTES = int(os.environ.get("SPEECH_MAX_BYTES", 10 * 1024 * 1024))
+# Seconds decoded audio may end short of a file's declared duration (which
+# some formats only estimate) before it counts as cut off
+SPEECH_TRUNCATION_SLACK = 0.25
+
+
+class SpeechRequest(Request):
+    """Request class that keeps speech uploads in memory and caps their size"""
+
+    @property
+    def max_content_length(self):
+        if self.endpoint == SPEECH_ENDPOINT:
+            return SPEECH_MAX_BYTES
+        return super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint == SPEECH_ENDPOINT:
+            return io.BytesIO()
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
+def decode_audio(stream, max_seconds=None):
+    """
+    Decode an audio file-like object to 16 kHz mono float32 samples. Returns
+    the samples and whether any audio was lost to damage (see
+    decoded_frames). Raises ValueError if it can't be decoded or lasts over
+    max_seconds.
+    """
+    max_seconds = SPEECH_MAX_SECONDS if max_seconds is None else max_seconds
+    max_samples = max_seconds * SPEECH_SAMPLE_RATE
+    resampler = av.AudioResampler(format="flt", layout="mono", rate=SPEECH_SAMPLE_RATE)
+
+    chunks, samples, damaged = [], 0, False
+    try:
+        with av.open(stream, mode="r", metadata_errors="ignore") as container:
+            if not container.streams.audio:
+                raise ValueError("No audio stream found")
+            for frame in decoded_frames(container):
+                if frame is None:
+                    damaged = True
+                    continue
+                for resampled in resampler.resample(frame):
+                    chunk = resampled.to_ndarray().reshape(-1)
+                    samples += len(chunk)
+                    if samples > max_samples:
+                        raise ValueError(f"Audio is longer than {max_seconds} seconds")
+                    chunks.append(chunk)
+            for resampled in resampler.resample(None):
+                chunks.append(resampled.to_ndarray().reshape(-1))
+    except av.error.FFmpegError as e:
+        raise ValueError(f"Could not decode audio: {e}") from None
+
+    if not chunks:
+        if damaged:
+            raise ValueError("Could not decode audio: the file is damaged")
+        return np.zeros(0, dtype=np.float32), False
+    return np.concatenate(chunks)[:max_samples], damaged
+
+
+def decoded_frames(container):
+    """
+    The first audio stream's frames, decoded packet by packet so a damaged
+    packet loses only its own audio. None is yielded where audio was lost:
+    for a packet that fails to decode, for a jump in the timestamps (some
+    demuxers skip damaged data without an error), if the rest of the file
+    can't be read, and if the audio comes up more than
+    SPEECH_TRUNCATION_SLACK short of the duration the file declares.
+    """
+    packets = container.demux(container.streams.audio[0])
+    decoded, end = 0, None
+    while True:
+        try:
+            packet = next(packets)
+        except StopIteration:
+            break
+        except av.error.InvalidDataError:
+            yield None
+            return
+        try:
+            frames = packet.decode()
+        except av.error.InvalidDataError:
+            yield None
+            continue
+        for frame in frames:
+            duration = frame.samples / frame.sample_rate
+            decoded += duration
+            if frame.pts is not None and frame.time_base is not None:
+                start = float(frame.pts * frame.time_base)
+                # More than half a frame past the previous one's end
+                if end is not None and start - end > duration / 2:
+                    yield None
+                end = start + duration
+            yield frame
+
+    if container.duration is not None and container.duration / av.time_base - decoded > SPEECH_TRUNCATION_SLACK:
+        yield None
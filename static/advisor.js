@@ -1,3 +1,6 @@
+// Fingerprinted avatar URL, passed in by the template that loads this script
+const ADVISOR_AVATAR = document.currentScript.dataset.avatar;
+
 // ============================================================================
 // VOICE RECORDING (MediaRecorder - works in ALL browsers including Firefox)
 // ============================================================================
@@ -155,6 +158,16 @@ async function transcribeAudio(audioBlob) {
             
             // Put transcription in input field
             document.getElementById('aiMessageInput').value = data.transcription;
+            
+            if (data.warning) {
+                // Part of the audio was lost: let the user check the text before sending it
+                voiceStatusText.textContent = data.warning;
+                setTimeout(() => {
+                    voiceStatus.style.display = 'none';
+                }, 5000);
+                return;
+            }
+            
             voiceStatusText.textContent = 'Got it! Sending...';
             
             // IMPORTANT: Call sendAIMessage directly, don't dispatch event
@@ -288,7 +301,7 @@ function addMessageToChat(message, sender) {
         messageDiv.innerHTML = `
             <div class="d-flex align-items-start gap-2">
                 <div class="ai-avatar d-flex align-items-center justify-content-center">
-                    <img src="/static/advisor.png" alt="AI" style="width: 50px; height: 50px; object-fit: contain;">
+                    <img src="${ADVISOR_AVATAR}" alt="AI" style="width: 50px; height: 50px; object-fit: contain;">
                 </div>
                 <div class="ai-message-content p-3">
                     <p class="mb-0">${escapeHtml(message)}</p>
@@ -313,7 +326,7 @@ function showTypingIndicator() {
     typingDiv.innerHTML = `
         <div class="d-flex align-items-start gap-2">
             <div class="ai-avatar d-flex align-items-center justify-content-center">
-                <img src="/static/advisor.png" alt="AI" style="width: 50px; height: 50px; object-fit: contain;">
+                <img src="${ADVISOR_AVATAR}" alt="AI" style="width: 50px; height: 50px; object-fit: contain;">
             </div>
             <div class="ai-message-content p-3">
                 <div class="typing-indicator">
@@ -0,0 +1,69 @@
+"""
+Fingerprinted static assets and the response caching policy.
+
+Templates link static files with static_url('styles.css'), which adds a
+hash of the file's content to the URL (/static/styles.css?v=1a2b3c4d5e6f).
+A request carrying the current fingerprint can be cached for a year
+without revalidation: when the file changes, so does its URL. Static files
+requested without it (or with a stale one) are sent with `no-cache`, so the
+browser revalidates them with their ETag and usually gets a 304.
+
+Everything else, the authenticated pages and JSON, stays out of caches
+unless the view set its own Cache-Control (receipts do).
+"""
+
+from flask import current_app, request, url_for
+from functools import lru_cache
+
+import hashlib
+import os
+
+
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+# Hex digits of the content hash used in static URLs
+FINGERPRINT_LENGTH = 12
+
+
+def static_fingerprint(filename):
+    """Short content hash of a file in the static folder, or None if there is no such file"""
+    path = os.path.join(current_app.static_folder, filename)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return hash_static_file(path, stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=256)
+def hash_static_file(path, mtime, size):
+    """Fingerprint of a static file, cached until it is modified"""
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def static_url(filename):
+    """URL of a static file with its fingerprint, for use in templates"""
+    fingerprint = static_fingerprint(filename)
+    if fingerprint is None:
+        return url_for("static", filename=filename)
+    return url_for("static", filename=filename, v=fingerprint)
+
+
+def apply_cache_policy(response):
+    """Set the Cache-Control of a response, see the module docstring"""
+    if request.endpoint == "static" and response.status_code in (200, 206, 304):
+        fingerprint = request.args.get("v")
+        if fingerprint and fingerprint == static_fingerprint(request.view_args["filename"]):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+        return response
+
+    if "Cache-Control" in response.headers:
+        return response
+    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+    response.headers["Expires"] = 0
+    response.headers["Pragma"] = "no-cache"
+    return response
@@ -0,0 +1,62 @@
+"""
+Shared fixtures. Every test gets its own database in a temporary directory
+(the README schema from benchmarks/common.py, upgraded with
+upgrade_schema()), and the app's modules are pointed at it.
+"""
+
+import os
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.common import make_database, seed_transactions  # noqa: E402
+
+
+USER_ID = 1
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Path of an empty, upgraded database; the current directory is its temporary directory"""
+    from database import db
+    import helpers
+
+    monkeypatch.chdir(tmp_path)
+    db.close()
+    helpers.aggregate_cache.forget()
+    path = make_database(str(tmp_path))
+    db.execute("INSERT INTO users (id, username, hash) VALUES (?, 'test', 'x')", USER_ID)
+    helpers.upgrade_schema()
+    yield path
+    db.close()
+    helpers.aggregate_cache.forget()
+
+
+@pytest.fixture
+def seeded(database):
+    """The database with three years of random transactions and a monthly budget for USER_ID, rollups included"""
+    import helpers
+
+    seed_transactions(database, USER_ID, 500)
+    helpers.db.execute(
+        "INSERT INTO budgets (user_id, amount, period, start_date) VALUES (?, 3000, 'MONTHLY', '2020-01-01')", USER_ID
+    )
+    helpers.rebuild_rollups()
+    helpers.rebuild_search_index()
+    return database
+
+
+@pytest.fixture
+def client(database):
+    """A test client logged in as USER_ID"""
+    from app import app
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = USER_ID
+    return client
@@ -0,0 +1,31 @@
+"""AggregateCache keeps its per-user index in step with its entries."""
+
+from cache import MISSING, AggregateCache
+
+
+def test_forget_drops_only_that_users_entries():
+    cache = AggregateCache()
+    cache.put(1, 'a', [1])
+    cache.put(1, 'b', [2])
+    cache.put(2, 'a', [3])
+
+    cache.forget(1)
+    assert cache.get(1, 'a') is MISSING and cache.get(1, 'b') is MISSING
+    assert cache.get(2, 'a') == [3]
+    assert cache.stats()['entries'] == 1 and 1 not in cache._users
+
+    cache.forget()
+    assert cache.stats()['entries'] == 0 and cache.bytes == 0 and not cache._users
+
+
+def test_evicted_and_replaced_entries_leave_the_index():
+    cache = AggregateCache(max_entries=2)
+    cache.put(1, 'a', 1)
+    cache.put(1, 'a', 2)
+    cache.put(2, 'a', 3)
+    cache.put(3, 'a', 4)
+
+    assert cache.get(1, 'a') is MISSING and cache.stats()['evictions'] == 1
+    assert cache._users == {2: {(2, 'a')}, 3: {(3, 'a')}}
+    cache.forget(1)
+    assert cache.get(2, 'a') == 3 and cache.get(3, 'a') == 4
@@ -0,0 +1,215 @@
+"""db.execute keeps cs50.SQL's return values, inside transactions and savepoints too."""
+
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from database import READ_POOL_SIZE, READONLY_POOL_SIZE, SQL
+
+
+INSERT = "INSERT INTO transactions (user_id, name, amount, type, category, time) VALUES (?, ?, ?, 'EXPENSE', 'Food', '2026-01-02 12:00:00')"
+
+
+@pytest.fixture
+def sql(database):
+    sql = SQL("sqlite:///" + database)
+    yield sql
+    sql.close()
+
+
+def names(sql):
+    return [row['name'] for row in sql.execute("SELECT name FROM transactions ORDER BY id")]
+
+
+def committed_names(path):
+    """What another process would see"""
+    connection = sqlite3.connect(path)
+    try:
+        return [row[0] for row in connection.execute("SELECT name FROM transactions ORDER BY id")]
+    finally:
+        connection.close()
+
+
+def test_return_values(sql):
+    first = sql.execute(INSERT, 1, "a", 5)
+    second = sql.execute(INSERT, 1, "b", 7)
+    assert isinstance(first, int) and second == first + 1
+
+    assert sql.execute("SELECT id, name, amount FROM transactions ORDER BY id") == [
+        {'id': first, 'name': 'a', 'amount': 5},
+        {'id': second, 'name': 'b', 'amount': 7},
+    ]
+    assert sql.execute("SELECT name FROM transactions WHERE id = ?", -1) == []
+    assert sql.execute("UPDATE transactions SET amount = amount + 1 WHERE user_id = ?", 1) == 2
+    assert sql.execute("UPDATE transactions SET amount = 1 WHERE id = ?", -1) == 0
+    assert sql.execute("DELETE FROM transactions WHERE id = ?", first) == 1
+    assert sql.execute("CREATE TABLE IF NOT EXISTS scratch (x)") is True
+
+
+def test_insert_without_exactly_one_row_returns_none(sql):
+    assert sql.execute("INSERT INTO categories (name, type) SELECT name || '2', type FROM categories") is None
+    assert sql.execute("INSERT OR IGNORE INTO categories (name, type) VALUES ('Food', 'EXPENSE')") is None
+
+
+def test_errors(sql):
+    with pytest.raises(ValueError):
+        sql.execute(INSERT, 1, "negative", -5)
+    with pytest.raises(RuntimeError):
+        sql.execute("SELECT * FROM no_such_table")
+
+
+def test_row_kinds(database):
+    sql = SQL("sqlite:///" + database, rows="tuple")
+    try:
+        sql.execute(INSERT, 1, "a", 5)
+        assert sql.execute("SELECT name, amount FROM transactions") == [('a', 5)]
+        row, = sql.execute("SELECT name, amount FROM transactions", rows="namedtuple")
+        assert (row.name, row.amount) == ('a', 5)
+        assert sql.execute("SELECT name FROM transactions", rows="dict") == [{'name': 'a'}]
+    finally:
+        sql.close()
+
+
+def test_transaction_returns_and_commits(sql, database):
+    with sql.transaction():
+        new_id = sql.execute(INSERT, 1, "a", 5)
+        assert isinstance(new_id, int)
+        # Reads inside the block see its own writes; nothing is committed yet
+        assert sql.execute("SELECT name FROM transactions WHERE id = ?", new_id) == [{'name': 'a'}]
+        assert sql.execute("UPDATE transactions SET amount = 6 WHERE id = ?", new_id) == 1
+        assert committed_names(database) == []
+    assert committed_names(database) == ['a']
+
+
+def test_transaction_rolls_back_on_error(sql, database):
+    with pytest.raises(ZeroDivisionError):
+        with sql.transaction():
+            sql.execute(INSERT, 1, "a", 5)
+            1 / 0
+    assert names(sql) == [] and committed_names(database) == []
+
+
+def test_nested_blocks_are_savepoints(sql, database):
+    with sql.transaction():
+        outer = sql.execute(INSERT, 1, "outer", 5)
+        with pytest.raises(ValueError):
+            with sql.transaction():
+                inner = sql.execute(INSERT, 1, "inner", 5)
+                assert inner == outer + 1
+                assert sql.execute("DELETE FROM transactions WHERE id = ?", outer) == 1
+                sql.execute(INSERT, 1, "invalid", -1)
+        # Only the inner block was undone
+        assert names(sql) == ['outer']
+
+        with sql.transaction():
+            kept = sql.execute(INSERT, 1, "kept", 5)
+            assert isinstance(kept, int)
+            assert sql.execute("UPDATE transactions SET amount = 9 WHERE id IN (?, ?)", outer, kept) == 2
+    assert committed_names(database) == ['outer', 'kept']
+
+
+def test_other_threads_wait_for_the_transaction(sql, database):
+    done = []
+
+    def write():
+        done.append(sql.execute(INSERT, 2, "other", 5))
+
+    with sql.transaction():
+        sql.execute(INSERT, 1, "a", 5)
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join(0.2)
+        # The writer connection is reserved for this thread until the block ends
+        assert thread.is_alive() and not done
+    thread.join(5)
+    assert isinstance(done[0], int)
+    assert committed_names(database) == ['a', 'other']
+
+
+def open_files(path):
+    """File descriptors this process has open on the database and its WAL"""
+    directory = "/proc/self/fd"
+    if not os.path.isdir(directory):
+        pytest.skip("needs /proc")
+    names = []
+    for fd in os.listdir(directory):
+        try:
+            names.append(os.readlink(os.path.join(directory, fd)))
+        except OSError:
+            continue
+    return sum(1 for name in names if name.startswith(os.path.realpath(path)))
+
+
+def test_short_lived_threads_share_a_bounded_pool(sql, database):
+    sql.execute(INSERT, 1, "a", 5)
+
+    def read():
+        assert names(sql) == ['a']
+
+    read()
+    before = open_files(database)
+    for _ in range(100):
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+    # One thread at a time, so the reader the first read opened was enough
+    assert sql._readers._open == 1
+    assert open_files(database) == before
+
+    threads = [threading.Thread(target=read) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sql._readers._open <= READ_POOL_SIZE
+
+
+def test_read_only_blocks_return_their_connection(sql, database):
+    sql.execute(INSERT, 1, "a", 5)
+
+    def read():
+        with sql.read_only():
+            connection = sql._local.readonly_connection
+            assert names(sql) == ['a']
+            # Nested blocks keep the outer block's connection
+            with sql.read_only():
+                assert sql._local.readonly_connection is connection
+            with pytest.raises(RuntimeError):
+                sql.execute(INSERT, 2, "b", 5)
+        assert sql._local.readonly_connection is None
+
+    read()
+    before = open_files(database)
+    for _ in range(100):
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+    assert sql._readonly._open == 1
+    assert open_files(database) == before
+
+    threads = [threading.Thread(target=read) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sql._readonly._open <= READONLY_POOL_SIZE
+
+
+def test_pool_waits_for_a_free_connection(database):
+    from database import ConnectionPool
+
+    pool = ConnectionPool(lambda: sqlite3.connect(database, check_same_thread=False), size=1, timeout=0.1)
+    first = pool.checkout()
+    with pytest.raises(RuntimeError):
+        pool.checkout()
+
+    threading.Timer(0.05, pool.checkin, [first]).start()
+    pool.timeout = 5
+    assert pool.checkout() is first
+
+    pool.close()
+    pool.checkin(first)
+    with pytest.raises(sqlite3.ProgrammingError):
+        first.execute("SELECT 1")
@@ -0,0 +1,72 @@
+"""An exported CSV imports back as duplicates, however the stored times are written."""
+
+import io
+import sqlite3
+
+import pytest
+
+from conftest import USER_ID
+
+
+OTHER_USER = 2
+
+# Times as older code and other tools stored them
+ODD_TIMES = [
+    ("T separator", "2021-06-01T09:30:00"),
+    ("fraction", "2021-06-02 09:30:00.250"),
+    ("both", "2021-06-03T09:30:00.999"),
+    ("date only", "2021-06-04"),
+]
+
+
+@pytest.fixture
+def exported(seeded, client):
+    """The CSV export of USER_ID's transactions, including rows with odd stored times"""
+    connection = sqlite3.connect(seeded)
+    connection.executemany(
+        "INSERT INTO transactions (user_id, name, amount, type, category, time) VALUES (?, ?, 12.5, 'EXPENSE', 'Food', ?)",
+        [(USER_ID, name, time) for name, time in ODD_TIMES]
+    )
+    connection.commit()
+    connection.close()
+
+    response = client.get("/analytics/export/csv?start_date=2000-01-01&end_date=2100-01-01")
+    assert response.status_code == 200
+    return response.get_data()
+
+
+def upload(client, data):
+    response = client.post("/api/transactions/import", data={'file': (io.BytesIO(data), "export.csv")})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def count(user_id):
+    from database import db
+
+    return db.execute("SELECT COUNT(*) AS n FROM transactions WHERE user_id = ?", user_id)[0]['n']
+
+
+def test_reimporting_an_export_adds_nothing(exported, client):
+    before = count(USER_ID)
+    result = upload(client, exported)
+    assert result['invalid'] == 0
+    assert result['imported'] == 0 and result['duplicates'] == before
+    assert count(USER_ID) == before
+
+
+def test_import_then_import_again(exported, client):
+    from database import db
+    from helpers import verify_rollups
+
+    db.execute("INSERT INTO users (id, username, hash) VALUES (?, 'other', 'x')", OTHER_USER)
+    with client.session_transaction() as session:
+        session["user_id"] = OTHER_USER
+
+    expected = count(USER_ID)
+    first = upload(client, exported)
+    assert first['imported'] == expected and first['invalid'] == 0
+    second = upload(client, exported)
+    assert second['imported'] == 0 and second['duplicates'] == expected
+    assert count(OTHER_USER) == expected
+    assert verify_rollups(OTHER_USER) == []
@@ -0,0 +1,116 @@
+"""
+Every period, keyset and rollup query must be an index range search.
+
+The statements are recorded as the pages and helpers run them (through the
+shared db object, so analytics_engine's are included), then each one that
+filters on a date is run again under EXPLAIN QUERY PLAN.
+"""
+
+import re
+import sqlite3
+
+import pytest
+
+from conftest import USER_ID
+
+
+# A date bound, or a keyset bound on (time, id)
+DATE_FILTER = re.compile(r"\b(time|day)(, id\))?\s*(>=|<=|<|>)")
+
+# transactions through idx_user_transactions, daily_rollups through its primary key
+RANGE_SEARCH = re.compile(
+    r"^SEARCH \w+ USING (COVERING )?(INDEX idx_user_transactions|PRIMARY KEY) \(user_id=\? AND (time|day)[<>]"
+)
+
+# Searches start from the full-text index and look rows up by id
+FTS_LOOKUP = re.compile(r"^SEARCH transactions USING INTEGER PRIMARY KEY \(rowid=\?\)")
+
+FULL_SCAN = re.compile(r"^SCAN (transactions|daily_rollups|t|r)\b(?! VIRTUAL)")
+
+PAGES = [
+    "/",
+    "/budget/status",
+    "/analytics",
+    "/transactions",
+    "/transactions?sort=amount-desc",
+    "/transactions?search=rent",
+    "/statistics?view=daily",
+    "/statistics?view=weekly",
+    "/statistics?view=monthly",
+    "/statistics?view=annual&period=all",
+    "/api/forecast",
+]
+
+
+@pytest.fixture
+def statements(monkeypatch):
+    """Every (sql, args) run through db.execute while the test runs"""
+    from database import db
+
+    recorded = []
+    execute = db.execute
+
+    def recording_execute(sql, *args, **kwargs):
+        recorded.append((sql, args))
+        return execute(sql, *args, **kwargs)
+
+    monkeypatch.setattr(db, "execute", recording_execute)
+    return recorded
+
+
+def check_plans(statements):
+    """Assert each date-filtered statement is a range search; returns how many were checked"""
+    from database import db
+
+    # A connection of its own: EXPLAIN doesn't notice schema changes made
+    # through other connections after this one loaded the schema
+    connection = sqlite3.connect(f"file:{db.path}?mode=ro", uri=True)
+    checked = {}
+    try:
+        for sql, args in statements:
+            if sql in checked or not DATE_FILTER.search(sql.split("FROM", 1)[-1]):
+                continue
+            checked[sql] = [row[3] for row in connection.execute("EXPLAIN QUERY PLAN " + sql, args)]
+    finally:
+        connection.close()
+
+    for sql, plan in checked.items():
+        query = " ".join(sql.split())[:120]
+        assert not any(FULL_SCAN.match(line) for line in plan), f"full scan in {query}: {plan}"
+        assert any(RANGE_SEARCH.match(line) or FTS_LOOKUP.match(line) for line in plan), f"no index range in {query}: {plan}"
+    return len(checked)
+
+
+@pytest.mark.parametrize("url", PAGES)
+def test_page_queries_use_index_ranges(seeded, client, statements, url):
+    assert client.get(url).status_code == 200
+    assert check_plans(statements) > 0
+
+
+def test_keyset_pages_use_index_ranges(seeded, client, statements):
+    html = client.get("/transactions?range=all").get_data(as_text=True)
+    cursor = re.search(r'\?cursor=([^&"]+)&', html)
+    assert cursor, "no next page link"
+
+    statements.clear()
+    assert client.get(f"/transactions?cursor={cursor.group(1)}&range=all").status_code == 200
+    keyset = [sql for sql, _ in statements if "(time, id) <" in sql]
+    assert keyset, "the next page did not run a keyset query"
+    assert check_plans(statements) > 0
+
+
+@pytest.mark.parametrize("period", ["WEEKLY", "MONTHLY", "YEARLY"])
+def test_period_spending_uses_rollup_range(seeded, statements, period):
+    from helpers import get_period_spending
+
+    get_period_spending(USER_ID, period)
+    assert check_plans(statements) == 1
+
+
+def test_analytics_engine_queries_use_index_ranges(seeded, statements):
+    from datetime import datetime, timedelta
+    from analytics_engine import analyze
+
+    end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    analyze(USER_ID, end - timedelta(days=365), end)
+    assert check_plans(statements) >= 2
@@ -0,0 +1,59 @@
+"""Receipts are cached by ETag and, in proxy mode, handed to the proxy without affecting other files."""
+
+import io
+
+import pytest
+
+from conftest import USER_ID
+
+
+CONTENT = b"%PDF-1.4 receipt " * 64
+
+
+@pytest.fixture
+def receipt(database):
+    """(transaction id, stored path) of a transaction with a receipt"""
+    from database import db
+    from receipts import store_receipt
+
+    path = store_receipt(io.BytesIO(CONTENT), "receipt.pdf", 1024 * 1024)
+    transaction_id = db.execute("""
+        INSERT INTO transactions (user_id, name, amount, type, category, receipt_path, time)
+        VALUES (?, 'Printer', 120, 'EXPENSE', 'Shopping', ?, '2026-01-05 10:00:00')
+    """, USER_ID, path)
+    return transaction_id, path
+
+
+def test_served_by_flask(receipt, client):
+    transaction_id, path = receipt
+    response = client.get(f"/receipt/{transaction_id}")
+    assert response.status_code == 200 and response.get_data() == CONTENT
+    assert "private" in response.headers["Cache-Control"] and "immutable" in response.headers["Cache-Control"]
+
+    etag = response.headers["ETag"]
+    assert client.get(f"/receipt/{transaction_id}", headers={'If-None-Match': etag}).status_code == 304
+    partial = client.get(f"/receipt/{transaction_id}", headers={'Range': "bytes=0-7"})
+    assert partial.status_code == 206 and partial.get_data() == CONTENT[:8]
+
+
+@pytest.mark.parametrize("mode, header", [("x-sendfile", "X-Sendfile"), ("x-accel-redirect", "X-Accel-Redirect")])
+def test_sent_by_the_proxy(receipt, client, monkeypatch, mode, header):
+    import app
+
+    monkeypatch.setattr(app, "RECEIPT_SENDFILE", mode)
+    transaction_id, path = receipt
+
+    response = client.get(f"/receipt/{transaction_id}")
+    assert response.status_code == 200 and response.get_data() == b""
+    assert response.headers[header].endswith(path.split("Receipts", 1)[-1].replace("\\", "/"))
+    other, = {"X-Sendfile", "X-Accel-Redirect"} - {header}
+    assert other not in response.headers
+    assert "private" in response.headers["Cache-Control"] and response.headers["ETag"]
+
+    # Nothing for the proxy to send with a 304
+    revalidated = client.get(f"/receipt/{transaction_id}", headers={'If-None-Match': response.headers["ETag"]})
+    assert revalidated.status_code == 304 and header not in revalidated.headers
+
+    # Only receipts go through the proxy: static files keep their bodies
+    static = client.get("/static/advisor.js")
+    assert static.status_code == 200 and static.get_data() and "X-Sendfile" not in static.headers
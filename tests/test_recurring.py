@@ -0,0 +1,116 @@
+"""Creating recurring occurrences is idempotent: overlapping runs never duplicate a transaction."""
+
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import USER_ID
+
+
+TODAY = date(2026, 3, 15)
+
+USERS = [USER_ID, 2, 3, 4]
+
+# (frequency, next_occurrence) of each user's templates
+TEMPLATES = [('MONTHLY', '2026-01-31'), ('WEEKLY', '2026-02-01'), ('YEARLY', '2025-03-15'), ('DAILY', '2026-03-10')]
+
+
+@pytest.fixture
+def templates(database):
+    """Due templates for several users, so both shards have work; returns {id: (frequency, next_occurrence)}"""
+    from helpers import db
+
+    templates = {}
+    for user_id in USERS:
+        db.execute("INSERT OR IGNORE INTO users (id, username, hash) VALUES (?, ?, 'x')", user_id, f"user{user_id}")
+        for frequency, first in TEMPLATES:
+            template_id = db.execute("""
+                INSERT INTO recurring_transactions
+                (user_id, name, amount, type, category, frequency, start_date, next_occurrence)
+                VALUES (?, ?, 10, 'EXPENSE', 'Bills', ?, ?, ?)
+            """, user_id, f"{frequency} bill", frequency, first, first)
+            templates[template_id] = (frequency, first)
+    return templates
+
+
+def check_occurrences(templates, today=TODAY):
+    """
+    Assert each template has exactly its occurrences through today, its
+    next_occurrence is the one after and the rollups agree; returns how many
+    occurrences there are.
+    """
+    from helpers import calculate_next_date, db, verify_rollups
+
+    expected = {}
+    for template_id, (frequency, first) in templates.items():
+        day, dates = date.fromisoformat(first), []
+        while day <= today:
+            dates.append(str(day))
+            day = calculate_next_date(day, frequency)
+        expected[template_id] = (dates, str(day))
+
+    occurrences = {template_id: [] for template_id in expected}
+    for row in db.execute("SELECT recurring_template_id, time FROM transactions ORDER BY time"):
+        occurrences[row['recurring_template_id']].append(str(row['time'])[:10])
+    assert occurrences == {template_id: dates for template_id, (dates, _) in expected.items()}
+
+    next_occurrences = {
+        row['id']: str(row['next_occurrence'])[:10]
+        for row in db.execute("SELECT id, next_occurrence FROM recurring_transactions")
+    }
+    assert next_occurrences == {template_id: following for template_id, (_, following) in expected.items()}
+    assert verify_rollups() == []
+    return sum(len(dates) for dates, _ in expected.values())
+
+
+def test_same_shard_twice(templates):
+    from helpers import process_recurring_transactions
+
+    created = process_recurring_transactions(TODAY)
+    assert process_recurring_transactions(TODAY) == 0
+    assert check_occurrences(templates) == created
+
+
+def test_shards_at_once(templates):
+    from helpers import process_recurring_transactions
+
+    # Two workers on each of two shards, all starting together
+    runs = [0, 0, 1, 1]
+    barrier = threading.Barrier(len(runs))
+    created = []
+
+    def run(shard):
+        barrier.wait()
+        created.append(process_recurring_transactions(TODAY, shard=shard, shards=2))
+
+    threads = [threading.Thread(target=run, args=(shard,)) for shard in runs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert len(created) == len(runs)
+    assert check_occurrences(templates) == sum(created)
+
+
+def test_stale_claim_is_skipped(templates):
+    """A worker that read the templates before another one processed them creates nothing and doesn't move next_occurrence"""
+    from helpers import create_occurrences, db, process_recurring_transactions
+
+    stale = db.execute("SELECT * FROM recurring_transactions")
+    later = TODAY + timedelta(days=10)
+    created = process_recurring_transactions(later)
+    assert create_occurrences(stale, TODAY) == 0
+    assert check_occurrences(templates, later) == created
+
+
+def test_replay_skips_existing_occurrences(templates):
+    """Rewinding next_occurrence (a crash after inserting, say) doesn't insert the occurrences again"""
+    from helpers import db, process_recurring_transactions
+
+    created = process_recurring_transactions(TODAY)
+    for frequency, first in TEMPLATES:
+        db.execute("UPDATE recurring_transactions SET next_occurrence = ? WHERE frequency = ?", first, frequency)
+    assert process_recurring_transactions(TODAY) == 0
+    assert check_occurrences(templates) == created
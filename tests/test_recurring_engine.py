@@ -0,0 +1,61 @@
+"""The vectorized occurrence dates agree with stepping through calculate_next_date."""
+
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from helpers import calculate_next_date
+from recurring_engine import DAY_STEPS, MONTH_STEPS, expand_recurring, month_steps
+
+
+# Month ends (31, 30, 29 and 28), a leap day, and days that only some months have
+STARTS = [
+    date(2023, 1, 31), date(2023, 3, 31), date(2023, 4, 30), date(2023, 8, 31), date(2023, 12, 31),
+    date(2024, 1, 29), date(2024, 1, 30), date(2024, 2, 28), date(2024, 2, 29), date(2023, 2, 28),
+    date(2025, 5, 31), date(2023, 11, 30), date(2024, 6, 15), date(2024, 1, 1),
+]
+
+LAST = date(2029, 3, 1)
+
+
+def stepped(first, last, frequency):
+    """Occurrences from first through last, one calculate_next_date at a time"""
+    dates = []
+    while first <= last:
+        dates.append(first)
+        first = calculate_next_date(first, frequency)
+    return dates
+
+
+@pytest.mark.parametrize("frequency", list(MONTH_STEPS))
+def test_month_steps_match_calculate_next_date(frequency):
+    # All starts at once, so each run's clamping must not leak into the next
+    lasts = [LAST - timedelta(days=offset * 37) for offset in range(len(STARTS))]
+    segment, day = month_steps(
+        np.array(STARTS, dtype='datetime64[D]'), np.array(lasts, dtype='datetime64[D]'), MONTH_STEPS[frequency]
+    )
+    for position, (first, last) in enumerate(zip(STARTS, lasts)):
+        assert day[segment == position].astype(object).tolist() == stepped(first, last, frequency), first
+
+
+@pytest.mark.parametrize("frequency", list(MONTH_STEPS) + list(DAY_STEPS))
+def test_expand_recurring_matches_calculate_next_date(frequency):
+    templates = [
+        {'next_occurrence': f"{first} 00:00:00", 'end_date': str(date(2026, 2, 28)) if position % 3 == 0 else None,
+         'frequency': frequency}
+        for position, first in enumerate(STARTS)
+    ]
+    until = date(2027, 1, 31)
+    index, days = expand_recurring(templates, until)
+
+    for position, template in enumerate(templates):
+        last = min(until, date.fromisoformat(template['end_date'])) if template['end_date'] else until
+        assert days[index == position].astype(object).tolist() == stepped(STARTS[position], last, frequency), template
+
+
+def test_nothing_before_the_first_date():
+    segment, day = month_steps(
+        np.array(['2024-01-31'], dtype='datetime64[D]'), np.array(['2024-01-30'], dtype='datetime64[D]'), 1
+    )
+    assert len(segment) == len(day) == 0
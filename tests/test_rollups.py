@@ -0,0 +1,120 @@
+"""The daily rollups stay equal to a rebuild from transactions through every kind of change."""
+
+import pytest
+
+from conftest import USER_ID
+
+
+# Before the seeded transactions, so the day holds only what a test adds
+DAY = "2015-01-05"
+
+
+def rollups():
+    from database import db
+
+    return db.execute("""
+        SELECT user_id, day, type, category, total, count, min_amount, max_amount
+        FROM daily_rollups ORDER BY user_id, day, type, category
+    """)
+
+
+def assert_consistent():
+    """verify_rollups finds nothing, and rebuild_rollups would not change a row"""
+    from helpers import rebuild_rollups, verify_rollups
+
+    assert verify_rollups() == []
+    before = rollups()
+    rebuild_rollups()
+    after = rollups()
+    assert [{**row, 'total': pytest.approx(row['total'], abs=0.005)} for row in before] == after
+
+
+def add(client, name, amount, category="Food", date=DAY, transaction_type="EXPENSE"):
+    response = client.post("/add", data={
+        'name': name, 'amount': amount, 'type': transaction_type, 'category': category, 'date': date
+    })
+    assert response.status_code == 302
+
+
+def transaction_ids():
+    from database import db
+
+    return [row['id'] for row in db.execute("SELECT id FROM transactions WHERE name IN ('Lunch', 'Dinner') ORDER BY amount")]
+
+
+def test_seeded_rollups_match(seeded):
+    assert rollups()
+    assert_consistent()
+
+
+def test_insert(seeded, client):
+    add(client, "Lunch", "12.50")
+    add(client, "Dinner", "30")
+    add(client, "Pay", "1000", category="Salary", transaction_type="INCOME")
+    assert_consistent()
+
+    day = [row for row in rollups() if row['day'] == DAY and row['category'] == 'Food']
+    assert day == [{'user_id': USER_ID, 'day': DAY, 'type': 'EXPENSE', 'category': 'Food',
+                    'total': 42.5, 'count': 2, 'min_amount': 12.5, 'max_amount': 30}]
+
+
+def test_edit(seeded, client):
+    add(client, "Lunch", "12.50")
+    add(client, "Dinner", "30")
+    cheapest, dearest = transaction_ids()
+
+    # Moving the group's minimum out recomputes the min from the rows left
+    response = client.post(f"/transaction/edit/{cheapest}", data={'name': "Taxi", 'amount': "8", 'category': "Transport"})
+    assert response.status_code == 302
+    response = client.post(f"/transaction/edit/{dearest}", data={'name': "Dinner", 'amount': "45", 'category': "Food"})
+    assert response.status_code == 302
+    assert_consistent()
+
+
+def test_delete(seeded, client):
+    add(client, "Lunch", "12.50")
+    add(client, "Dinner", "30")
+    cheapest, dearest = transaction_ids()
+
+    assert client.post(f"/transaction/delete/{cheapest}").status_code == 302
+    assert_consistent()
+    # Deleting the last row of a group removes the group
+    assert client.post(f"/transaction/delete/{dearest}").status_code == 302
+    assert_consistent()
+    assert not [row for row in rollups() if row['day'] == DAY]
+
+
+def test_batch(seeded):
+    from batch import apply_operations
+
+    created = apply_operations(USER_ID, [
+        {'op': 'create', 'name': "Lunch", 'amount': 12.5, 'category': "Food", 'date': DAY},
+        {'op': 'create', 'name': "Dinner", 'amount': 30, 'category': "Food", 'date': DAY},
+        {'op': 'create', 'name': "Bus", 'amount': 2, 'category': "Transport", 'date': DAY},
+    ])
+    assert created['committed']
+    assert_consistent()
+    lunch, dinner, bus = [result['id'] for result in created['results']]
+
+    result = apply_operations(USER_ID, [
+        {'op': 'update', 'id': lunch, 'amount': 50},
+        {'op': 'update', 'id': dinner, 'category': "Entertainment", 'date': "2015-01-06"},
+        {'op': 'delete', 'id': bus},
+        {'op': 'create', 'name': "Broken", 'amount': -1, 'category': "Food", 'date': DAY},
+        {'op': 'create', 'name': "Snack", 'amount': 3, 'category': "Food", 'date': DAY},
+    ])
+    assert result['committed'] and [r['status'] for r in result['results']].count('error') == 1
+    assert_consistent()
+
+
+def test_aborted_batch_leaves_rollups_alone(seeded):
+    from batch import apply_operations
+
+    before = rollups()
+    result = apply_operations(USER_ID, [
+        {'op': 'create', 'name': "Lunch", 'amount': 12.5, 'category': "Food", 'date': DAY},
+        {'op': 'delete', 'id': -1},
+    ], atomic=True)
+    assert not result['committed']
+    assert rollups() == before
+    assert_consistent()
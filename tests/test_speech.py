@@ -0,0 +1,80 @@
+"""Damaged recordings decode as far as they can, and the response says audio was lost."""
+
+import io
+
+import av
+import numpy as np
+import pytest
+
+from speech import SPEECH_SAMPLE_RATE, decode_audio
+
+
+SECONDS = 3
+
+
+def encode(format, codec, seconds=SECONDS):
+    """A tone encoded in memory"""
+    buffer = io.BytesIO()
+    with av.open(buffer, "w", format=format) as container:
+        stream = container.add_stream(codec, rate=SPEECH_SAMPLE_RATE)
+        stream.layout = "mono"
+        sample_format = stream.codec_context.codec.audio_formats[0].name
+        tone = 0.3 * np.sin(2 * np.pi * 440 * np.arange(seconds * SPEECH_SAMPLE_RATE) / SPEECH_SAMPLE_RATE)
+        for start in range(0, len(tone), 1024):
+            chunk = tone[start:start + 1024]
+            chunk = (chunk * 32767).astype(np.int16) if sample_format.startswith("s16") else chunk.astype(np.float32)
+            frame = av.AudioFrame.from_ndarray(chunk[None], format=sample_format, layout="mono")
+            frame.sample_rate, frame.pts = SPEECH_SAMPLE_RATE, start
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buffer.getvalue()
+
+
+def damage(data, at, length=400):
+    """Flip `length` bytes from `at` (a fraction of the file) on"""
+    data = bytearray(data)
+    start = int(len(data) * at)
+    data[start:start + length] = bytes(byte ^ 0xFF for byte in data[start:start + length])
+    return bytes(data)
+
+
+def seconds(audio):
+    return len(audio) / SPEECH_SAMPLE_RATE
+
+
+@pytest.mark.parametrize("format, codec", [("webm", "libopus"), ("ogg", "libopus"), ("mp2", "mp2"), ("flac", "flac")])
+def test_intact(format, codec):
+    audio, damaged = decode_audio(io.BytesIO(encode(format, codec)))
+    assert not damaged and seconds(audio) == pytest.approx(SECONDS, abs=0.05)
+
+
+def test_bad_packet_is_skipped_alone():
+    audio, damaged = decode_audio(io.BytesIO(damage(encode("mp2", "mp2"), 0.5)))
+    # Decoding carried on past the bad packet
+    assert damaged and SECONDS - 0.5 < seconds(audio) < SECONDS
+
+
+@pytest.mark.parametrize("format", ["webm", "ogg"])
+def test_silently_dropped_audio_is_reported(format):
+    """The demuxer skips the damage without an error: the timestamps or the declared duration give it away"""
+    for at in (0.2, 0.5, 0.7):
+        audio, damaged = decode_audio(io.BytesIO(damage(encode(format, "libopus"), at)))
+        assert damaged and seconds(audio) < SECONDS - 0.5, at
+
+
+def test_response_warns_of_lost_audio(client, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "transcribe", lambda user_id, audio: "coffee five dollars")
+
+    def post(data):
+        response = client.post("/api/speech-to-text", data={'audio': (io.BytesIO(data), "clip.webm")})
+        assert response.status_code == 200
+        return response.get_json()
+
+    intact = post(encode("webm", "libopus"))
+    assert intact['transcription'] == "coffee five dollars" and 'warning' not in intact
+    damaged = post(damage(encode("webm", "libopus"), 0.5))
+    assert damaged['transcription'] == "coffee five dollars" and "incomplete" in damaged['warning']
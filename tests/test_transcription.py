@@ -0,0 +1,136 @@
+"""
+transcribe_batch_in_worker hands each segment of a batched pass back to
+the clip it came from, and clips too long to batch still wait for a free
+worker. The VAD, the Whisper pipeline and the pool are stubbed: the tests
+are about the bookkeeping around them, not about recognising speech.
+"""
+
+from concurrent.futures import Future
+from time import perf_counter, sleep
+from types import SimpleNamespace
+
+import queue
+import threading
+
+import numpy as np
+import pytest
+
+from transcription import SAMPLE_RATE, ModelUnavailable, transcribe_batch_in_worker
+
+
+class StubPipeline:
+    """Answers transcribe() with fixed segments, recording what it was given"""
+
+    def __init__(self, segments):
+        self.segments = segments
+        self.calls = []
+
+    def transcribe(self, audio, **options):
+        self.calls.append((audio, options))
+        return iter([SimpleNamespace(start=start, text=text) for start, text in self.segments]), None
+
+
+def clip(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Install a VAD answering from {clip length in seconds: [(start, end) seconds]} and a pipeline; returns a setup function"""
+    import faster_whisper.vad
+    import whisper_models
+
+    def setup(speech, segments):
+        def get_speech_timestamps(audio, options):
+            return [
+                {'start': int(start * SAMPLE_RATE), 'end': int(end * SAMPLE_RATE)}
+                for start, end in speech[len(audio) / SAMPLE_RATE]
+            ]
+
+        pipeline = StubPipeline(segments)
+        monkeypatch.setattr(faster_whisper.vad, "get_speech_timestamps", get_speech_timestamps)
+        monkeypatch.setattr(whisper_models, "get_batched_pipeline", lambda: pipeline)
+        return pipeline
+
+    return setup
+
+
+def test_segments_go_to_their_clips(stub):
+    # Laid end to end: the first clip is 0-2 s, the silent one 2-3 s and the last 3-6 s
+    clips = [clip(2), clip(1), clip(3)]
+    pipeline = stub(
+        speech={2: [(0.2, 1.0), (1.2, 1.9)], 1: [], 3: [(0.0, 2.5)]},
+        segments=[
+            (0.2, " coffee"),        # at the first span's start
+            (1.195, " five"),        # just before the second span, rounded down
+            (1.8, " dollars"),       # just before the clip ends
+            (2.995, " lunch"),       # just before the last clip's first span, right after the silent clip
+            (3.0, " with"),          # at that span's start
+            (5.4, " Sam"),
+        ],
+    )
+
+    texts, started, seconds = transcribe_batch_in_worker(clips, beam_size=1, batch_size=8)
+    assert texts == ["coffee five dollars", "", "lunch with Sam"]
+    assert seconds >= 0
+
+    (audio, options), = pipeline.calls
+    assert len(audio) == sum(len(c) for c in clips)
+    assert options['clip_timestamps'] == [
+        {'start': 0.2, 'end': 1.0}, {'start': 1.2, 'end': 1.9}, {'start': 3.0, 'end': 5.5}
+    ]
+    assert options['beam_size'] == 1 and options['batch_size'] == 8
+
+
+def test_no_speech(stub):
+    pipeline = stub(speech={1: [], 2: []}, segments=[(0.0, " never")])
+
+    texts, _, _ = transcribe_batch_in_worker([clip(1), clip(2)], beam_size=1, batch_size=8)
+    assert texts == ["", ""]
+    # Nothing to transcribe, so the pipeline isn't run at all
+    assert pipeline.calls == []
+
+
+def test_model_unavailable(monkeypatch):
+    import whisper_models
+
+    monkeypatch.setattr(whisper_models, "get_batched_pipeline", lambda: None)
+    with pytest.raises(ModelUnavailable):
+        transcribe_batch_in_worker([clip(1)], beam_size=1, batch_size=8)
+
+
+def test_long_clips_wait_for_a_free_worker(monkeypatch):
+    import transcription
+
+    submitted = []
+
+    class Pool:
+        def submit(self, function, *args):
+            future = Future()
+            submitted.append((function, future))
+            return future
+
+    def wait_for(count):
+        deadline = perf_counter() + 5
+        while len(submitted) < count and perf_counter() < deadline:
+            sleep(0.01)
+        return len(submitted)
+
+    monkeypatch.setattr(transcription, "transcription_pool", lambda: Pool())
+    monkeypatch.setattr(transcription, "_free_workers", threading.Semaphore(1))
+    monkeypatch.setattr(transcription, "_batch_queue", queue.Queue())
+    monkeypatch.setattr(transcription, "_held", [])
+    monkeypatch.setattr(transcription, "_batcher", None)
+
+    short = transcription.queue_clip(clip(2))
+    long = transcription.queue_clip(clip(40))
+    assert wait_for(1) == 1 and submitted[0][0] is transcribe_batch_in_worker
+    # The only worker is busy with the short clip, so the long one waits
+    sleep(0.2)
+    assert len(submitted) == 1 and not long.done()
+
+    submitted[0][1].set_result((["coffee"], 1.0, 0.5))
+    assert short.result(timeout=5) == ("coffee", 1.0, 0.5)
+    assert wait_for(2) == 2 and submitted[1][0] is transcription.transcribe_in_worker
+    submitted[1][1].set_result(("a long note", 2.0, 3.0))
+    assert long.result(timeout=5) == ("a long note", 2.0, 3.0)
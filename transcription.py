@@ -0,0 +1,357 @@
+"""
+Speech-to-text off the request threads, in a pool of worker processes.
+
+Each of the TRANSCRIBE_WORKERS processes loads and warms up its own
+WhisperModel when it starts (see whisper_models.py) and transcribes one
+clip at a time, so voice requests no longer tie up Flask's threads or
+stall other pages on the GIL.
+
+Clips arriving together are micro-batched. A batcher thread waits for a
+free worker and a first clip, collects whatever else arrives within
+TRANSCRIBE_BATCH_WAIT_MS (up to TRANSCRIBE_BATCH_SIZE clips), and sends
+them to the worker as one job. There they are laid end to end and run
+through faster-whisper's BatchedInferencePipeline, one window per stretch
+of speech, so the encoder and decoder process them together rather than
+one after another. Each waiting request gets its own clip's text back.
+While the workers are busy, clips keep piling up for the next batch, so
+batches grow with the load. TRANSCRIBE_BATCH_SIZE=1 turns batching off.
+Clips longer than Whisper's 30 second window, and every clip when batching
+is off, still wait their turn in the batcher but go to a worker alone.
+
+Admission is bounded: at most TRANSCRIBE_WORKERS + TRANSCRIBE_QUEUE_SIZE
+clips are running or queued at once, and each user can have at most
+TRANSCRIBE_USER_LIMIT of them. A clip that doesn't fit is refused at once
+with TranscriptionBusy, which the route turns into a 503 with Retry-After.
+An admitted clip is waited on for up to TRANSCRIBE_TIMEOUT seconds; its
+slot is only given back when the worker is actually done with it.
+"""
+
+from bisect import bisect_right
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from time import perf_counter, time
+
+import multiprocessing
+import os
+import queue
+import threading
+
+import numpy as np
+
+
+TRANSCRIBE_WORKERS = int(os.environ.get("TRANSCRIBE_WORKERS", 1))
+TRANSCRIBE_QUEUE_SIZE = int(os.environ.get("TRANSCRIBE_QUEUE_SIZE", 4))
+TRANSCRIBE_USER_LIMIT = int(os.environ.get("TRANSCRIBE_USER_LIMIT", 1))
+TRANSCRIBE_TIMEOUT = float(os.environ.get("TRANSCRIBE_TIMEOUT", 60))
+TRANSCRIBE_RETRY_AFTER = int(os.environ.get("TRANSCRIBE_RETRY_AFTER", 5))
+TRANSCRIBE_BEAM_SIZE = int(os.environ.get("TRANSCRIBE_BEAM_SIZE", 5))
+TRANSCRIBE_BATCH_SIZE = int(os.environ.get("TRANSCRIBE_BATCH_SIZE", 8))
+TRANSCRIBE_BATCH_WAIT_MS = float(os.environ.get("TRANSCRIBE_BATCH_WAIT_MS", 50))
+
+# Whisper's input rate; clips longer than its 30 second window aren't batched
+SAMPLE_RATE = 16000
+BATCH_MAX_SAMPLES = 30 * SAMPLE_RATE
+
+# Recent clips kept for the latency percentiles
+LATENCY_WINDOW = 200
+
+_lock = threading.Lock()
+_pool = None
+_pending = 0
+_per_user = Counter()
+_metrics = {
+    'submitted': 0,
+    'completed': 0,
+    'failed': 0,
+    'timeouts': 0,
+    'rejected_queue_full': 0,
+    'rejected_user_limit': 0,
+    'max_queue_depth': 0,
+    'batches': 0,
+    'batched_clips': 0
+}
+_worker_models = []
+_batch_queue = queue.Queue()
+_batcher = None
+# A clip that had to go alone, kept for the batcher's next round
+_held = []
+_free_workers = threading.Semaphore(TRANSCRIBE_WORKERS)
+_queue_ms = deque(maxlen=LATENCY_WINDOW)
+_total_ms = deque(maxlen=LATENCY_WINDOW)
+
+
+class TranscriptionBusy(Exception):
+    """No room for the clip right now; retry after `retry_after` seconds"""
+
+    def __init__(self, message, retry_after=TRANSCRIBE_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ModelUnavailable(RuntimeError):
+    """The worker process has no Whisper model (it failed to load)"""
+
+
+def start_worker():
+    """Pool process initializer: load this process's Whisper model, unless WHISPER_WARMUP=0 leaves it to the first clip"""
+    from whisper_models import WHISPER_WARMUP, warmup_model
+    if WHISPER_WARMUP:
+        warmup_model()
+
+
+def transcribe_in_worker(audio, beam_size):
+    """Runs in a pool process: (text, wall time the work started, seconds it took)"""
+    from whisper_models import get_model
+    started = time()
+    model = get_model()
+    if model is None:
+        raise ModelUnavailable("Whisper model not loaded")
+    segments, info = model.transcribe(
+        audio,
+        language="en",
+        beam_size=beam_size,
+        vad_filter=True,
+        vad_parameters=dict(min_silence_duration_ms=500)
+    )
+    return " ".join(segment.text.strip() for segment in segments).strip(), started, time() - started
+
+
+def transcribe_batch_in_worker(clips, beam_size, batch_size):
+    """Runs in a pool process: transcribe several clips in one batched pass; (texts, wall time the work started, seconds it took)"""
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    from whisper_models import get_batched_pipeline
+    started = time()
+    pipeline = get_batched_pipeline()
+    if pipeline is None:
+        raise ModelUnavailable("Whisper model not loaded")
+
+    # The stretches of speech in each clip, as seconds into the clips laid end to end
+    vad = VadOptions(min_silence_duration_ms=500, max_speech_duration_s=30)
+    owners, spans, offset = [], [], 0
+    for index, clip in enumerate(clips):
+        for speech in get_speech_timestamps(clip, vad):
+            owners.append(index)
+            spans.append({'start': (offset + speech['start']) / SAMPLE_RATE, 'end': (offset + speech['end']) / SAMPLE_RATE})
+        offset += len(clip)
+
+    texts = [[] for _ in clips]
+    if spans:
+        segments, info = pipeline.transcribe(
+            np.concatenate(clips),
+            language="en",
+            beam_size=beam_size,
+            batch_size=batch_size,
+            clip_timestamps=spans
+        )
+        starts = [span['start'] for span in spans]
+        for segment in segments:
+            # Segment times are rounded to the millisecond, so allow for one that starts just before its span
+            texts[owners[bisect_right(starts, segment.start + 0.01) - 1]].append(segment.text.strip())
+    return [" ".join(parts).strip() for parts in texts], started, time() - started
+
+
+def worker_ready():
+    """Runs in a pool process: its model's settings and load costs, loading it if it isn't yet"""
+    from whisper_models import get_model, model_stats
+    get_model()
+    return model_stats()
+
+
+def transcription_pool():
+    """The worker pool, started on first use (spawned, so workers don't inherit the server's threads)"""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=TRANSCRIBE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=start_worker
+            )
+        return _pool
+
+
+def goes_alone(audio):
+    """Whether a clip is sent to a worker by itself: it's too long for a batch, or batching is off"""
+    return TRANSCRIBE_BATCH_SIZE == 1 or len(audio) > BATCH_MAX_SAMPLES
+
+
+def gather_batch():
+    """Wait for a clip, then for up to TRANSCRIBE_BATCH_WAIT_MS more of them; [(audio, future)] of at most TRANSCRIBE_BATCH_SIZE, or one clip that goes alone"""
+    batch = []
+    deadline = None
+    while len(batch) < TRANSCRIBE_BATCH_SIZE:
+        if _held:
+            audio, clip = _held.pop()
+        else:
+            try:
+                audio, clip = _batch_queue.get(timeout=None if deadline is None else max(deadline - perf_counter(), 0))
+            except queue.Empty:
+                break
+        if batch and goes_alone(audio):
+            _held.append((audio, clip))
+            break
+        # Skip clips whose request gave up waiting before the batch went out
+        if clip.set_running_or_notify_cancel():
+            batch.append((audio, clip))
+            if goes_alone(audio):
+                break
+            if deadline is None:
+                deadline = perf_counter() + TRANSCRIBE_BATCH_WAIT_MS / 1000
+    return batch
+
+
+def deliver(future, batch, alone):
+    """Hand each clip of a finished batch its text, or the batch's error"""
+    _free_workers.release()
+    try:
+        texts, started, seconds = future.result()
+    except Exception as e:
+        for _, clip in batch:
+            clip.set_exception(e)
+        return
+    if alone:
+        texts = [texts]
+    for (_, clip), text in zip(batch, texts):
+        clip.set_result((text, started, seconds))
+
+
+def run_batcher():
+    """Send batches of queued clips to the pool, one per free worker (runs on its own thread)"""
+    global _pool
+    while True:
+        _free_workers.acquire()
+        batch = gather_batch()
+        alone = goes_alone(batch[0][0])
+        try:
+            if alone:
+                future = transcription_pool().submit(transcribe_in_worker, batch[0][0], TRANSCRIBE_BEAM_SIZE)
+            else:
+                future = transcription_pool().submit(
+                    transcribe_batch_in_worker, [audio for audio, _ in batch], TRANSCRIBE_BEAM_SIZE, TRANSCRIBE_BATCH_SIZE
+                )
+        except Exception as e:
+            _free_workers.release()
+            with _lock:
+                _pool = None
+            for _, clip in batch:
+                clip.set_exception(e)
+            continue
+        if not alone:
+            with _lock:
+                _metrics['batches'] += 1
+                _metrics['batched_clips'] += len(batch)
+        future.add_done_callback(lambda done, batch=batch, alone=alone: deliver(done, batch, alone))
+
+
+def queue_clip(audio):
+    """Queue a clip for the batcher, starting it if needed; a Future for (text, started, seconds)"""
+    global _batcher
+    with _lock:
+        if _batcher is None:
+            _batcher = threading.Thread(target=run_batcher, name="transcription-batcher", daemon=True)
+            _batcher.start()
+    clip = Future()
+    _batch_queue.put((audio, clip))
+    return clip
+
+
+def start_transcription_pool():
+    """Start the workers and load their models now rather than on the first voice request; True if they loaded"""
+    pool = transcription_pool()
+    models = [future.result() for future in [pool.submit(worker_ready) for _ in range(TRANSCRIBE_WORKERS)]]
+    with _lock:
+        _worker_models[:] = models
+    return all(model['loaded'] for model in models)
+
+
+def transcribe(user_id, audio, timeout=None):
+    """
+    Transcribe 16 kHz float32 audio (see speech.decode_audio) in the pool.
+    Raises TranscriptionBusy if the queue or the user's limit is full, or if
+    the result takes longer than `timeout` seconds.
+    """
+    global _pending, _pool
+    timeout = TRANSCRIBE_TIMEOUT if timeout is None else timeout
+
+    with _lock:
+        if _pending >= TRANSCRIBE_WORKERS + TRANSCRIBE_QUEUE_SIZE:
+            _metrics['rejected_queue_full'] += 1
+            raise TranscriptionBusy("Transcription queue is full")
+        if _per_user[user_id] >= TRANSCRIBE_USER_LIMIT:
+            _metrics['rejected_user_limit'] += 1
+            raise TranscriptionBusy("Too many voice requests in progress", retry_after=1)
+        _pending += 1
+        _per_user[user_id] += 1
+        _metrics['submitted'] += 1
+        _metrics['max_queue_depth'] = max(_metrics['max_queue_depth'], _pending)
+
+    submitted, began = time(), perf_counter()
+
+    def release(future):
+        """The clip's slot is free once the worker is done with it, even if nobody waits any more"""
+        global _pending
+        with _lock:
+            _pending -= 1
+            _per_user[user_id] -= 1
+            if not _per_user[user_id]:
+                del _per_user[user_id]
+
+    # Every clip waits for a free worker in the batcher, so the workers are never handed more than they can run
+    future = queue_clip(audio)
+    future.add_done_callback(release)
+
+    try:
+        text, started, _ = future.result(timeout=timeout)
+    except TimeoutError:
+        future.cancel()
+        with _lock:
+            _metrics['timeouts'] += 1
+        raise TranscriptionBusy(f"Transcription took longer than {timeout:g} seconds") from None
+    except BrokenProcessPool:
+        # A worker died (out of memory, say); start a fresh pool next time
+        with _lock:
+            _metrics['failed'] += 1
+            _pool = None
+        raise
+    except Exception:
+        with _lock:
+            _metrics['failed'] += 1
+        raise
+
+    with _lock:
+        _metrics['completed'] += 1
+        _queue_ms.append(max(started - submitted, 0) * 1000)
+        _total_ms.append((perf_counter() - began) * 1000)
+    return text
+
+
+def percentile(samples, pct):
+    """The `pct` percentile of some numbers, None if there are none"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 2)
+
+
+def transcription_stats():
+    """Queue depth, outcome counters and recent latencies of this process's transcription pool"""
+    with _lock:
+        stats = dict(_metrics)
+        stats['queue_depth'] = _pending
+        stats['users_waiting'] = len(_per_user)
+        queue_ms, total_ms = list(_queue_ms), list(_total_ms)
+        stats['models'] = list(_worker_models)
+    stats.update({
+        'workers': TRANSCRIBE_WORKERS,
+        'queue_size': TRANSCRIBE_QUEUE_SIZE,
+        'user_limit': TRANSCRIBE_USER_LIMIT,
+        'batch_size': TRANSCRIBE_BATCH_SIZE,
+        'batch_wait_ms': TRANSCRIBE_BATCH_WAIT_MS,
+        'mean_batch_size': round(stats['batched_clips'] / stats['batches'], 2) if stats['batches'] else None,
+        'queue_ms_p50': percentile(queue_ms, 50),
+        'queue_ms_p95': percentile(queue_ms, 95),
+        'total_ms_p50': percentile(total_ms, 50),
+        'total_ms_p95': percentile(total_ms, 95)
+    })
+    return stats
@@ -0,0 +1,157 @@
+"""
+Loading the Whisper model, once per process and only when it's needed.
+
+faster_whisper is imported inside load_model rather than at module top, so
+processes that never transcribe (the web workers, CLI commands) don't pay
+for it. get_model loads the model on first use; warmup_model loads it and
+runs a second of silence through it, for processes that should be ready
+before the first request (the transcription workers do this when they
+start, unless WHISPER_WARMUP=0). Each load is reported with the time it
+took and how much the process's memory grew.
+
+WHISPER_PRELOAD=1 fetches the model files once in the process that imports
+the app (a gunicorn master with --preload, say) before any worker exists.
+Forked and spawned workers then load from that local copy (passed on in
+WHISPER_MODEL_PATH) instead of each going to the Hugging Face hub. The
+loaded model itself can't be inherited across fork, because CTranslate2
+runs it on native threads that don't exist in the child.
+"""
+
+from time import perf_counter, time
+
+import os
+import threading
+
+
+WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "base")
+WHISPER_DEVICE = os.environ.get("WHISPER_DEVICE", "cpu")
+WHISPER_COMPUTE_TYPE = os.environ.get("WHISPER_COMPUTE_TYPE", "int8")
+# 0 lets CTranslate2 decide
+WHISPER_CPU_THREADS = int(os.environ.get("WHISPER_CPU_THREADS", 0))
+WHISPER_NUM_WORKERS = int(os.environ.get("WHISPER_NUM_WORKERS", 2))
+WHISPER_DOWNLOAD_ROOT = os.environ.get("WHISPER_DOWNLOAD_ROOT") or None
+WHISPER_PRELOAD = os.environ.get("WHISPER_PRELOAD", "0") == "1"
+WHISPER_WARMUP = os.environ.get("WHISPER_WARMUP", "1") == "1"
+
+# After a failed load, get_model waits this long before trying again
+WHISPER_RETRY_SECONDS = 60
+
+_lock = threading.Lock()
+_model = None
+_pipeline = None
+_stats = {
+    'model': WHISPER_MODEL,
+    'device': WHISPER_DEVICE,
+    'compute_type': WHISPER_COMPUTE_TYPE,
+    'cpu_threads': WHISPER_CPU_THREADS,
+    'loaded': False,
+    'load_seconds': None,
+    'memory_mb': None,
+    'warmup_seconds': None,
+    'last_error': None,
+    'last_attempt': None
+}
+
+
+def rss_mb():
+    """This process's resident memory in MB"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def preload_model():
+    """
+    Fetch the model files now (see WHISPER_PRELOAD) and point this process's
+    future workers at them through WHISPER_MODEL_PATH, which they inherit.
+    True if the files are available locally.
+    """
+    if os.path.isdir(WHISPER_MODEL):
+        return True
+    from faster_whisper.utils import download_model
+
+    try:
+        path = download_model(WHISPER_MODEL, cache_dir=WHISPER_DOWNLOAD_ROOT)
+    except Exception as e:
+        print(f"Could not preload Whisper '{WHISPER_MODEL}': {e}")
+        return False
+    os.environ["WHISPER_MODEL_PATH"] = path
+    print(f"Whisper '{WHISPER_MODEL}' files ready at {path}")
+    return True
+
+
+def load_model():
+    """Load the model with the configured settings and report the cost; None if it fails"""
+    global _model
+    _stats['last_attempt'] = time()
+    try:
+        print(f"Loading Whisper '{WHISPER_MODEL}' ({WHISPER_COMPUTE_TYPE} on {WHISPER_DEVICE})...")
+        began, memory = perf_counter(), rss_mb()
+        from faster_whisper import WhisperModel
+
+        _model = WhisperModel(
+            os.environ.get("WHISPER_MODEL_PATH") or WHISPER_MODEL,
+            device=WHISPER_DEVICE,
+            compute_type=WHISPER_COMPUTE_TYPE,
+            cpu_threads=WHISPER_CPU_THREADS,
+            num_workers=WHISPER_NUM_WORKERS,
+            download_root=WHISPER_DOWNLOAD_ROOT
+        )
+    except Exception as e:
+        _stats['last_error'] = str(e)
+        print(f"Failed to load Whisper: {e}")
+        return None
+
+    _stats.update({
+        'loaded': True,
+        'load_seconds': round(perf_counter() - began, 2),
+        'memory_mb': round(rss_mb() - memory, 1),
+        'last_error': None
+    })
+    print(f"Whisper '{WHISPER_MODEL}' loaded in {_stats['load_seconds']}s (+{_stats['memory_mb']} MB) in process {os.getpid()}")
+    return _model
+
+
+def get_model():
+    """This process's model, loaded on first use; None if it can't be loaded (retried after WHISPER_RETRY_SECONDS)"""
+    if _model is not None:
+        return _model
+    with _lock:
+        if _model is None and (_stats['last_attempt'] is None or time() - _stats['last_attempt'] >= WHISPER_RETRY_SECONDS):
+            load_model()
+        return _model
+
+
+def get_batched_pipeline():
+    """A BatchedInferencePipeline over this process's model; None if the model can't be loaded"""
+    global _pipeline
+    model = get_model()
+    if model is None:
+        return None
+    if _pipeline is None:
+        from faster_whisper import BatchedInferencePipeline
+        _pipeline = BatchedInferencePipeline(model)
+    return _pipeline
+
+
+def warmup_model():
+    """Load the model and run a second of silence through it, so the first real clip isn't slowed down"""
+    model = get_model()
+    if model is None:
+        return None
+
+    import numpy as np
+
+    began = perf_counter()
+    segments, info = model.transcribe(np.zeros(16000, dtype=np.float32), language="en", beam_size=1)
+    list(segments)
+    _stats['warmup_seconds'] = round(perf_counter() - began, 2)
+    return model
+
+
+def model_stats():
+    """Settings and load costs of this process's model"""
+    return dict(_stats, pid=os.getpid())